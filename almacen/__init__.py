@@ -0,0 +1,10 @@
+"""Inventory storage and business logic that does not depend on Tkinter."""
+from almacen.almacenamiento import StorageBackend
+from almacen.backend_excel import ExcelManager, crear_libro
+from almacen.backend_sqlite import SQLiteManager
+from almacen.cliente import ClienteInventario
+from almacen.control import ControlInventarioManager
+from almacen.inventario import Inventario, crear_almacenamiento
+from almacen.metricas import Metricas, metricas
+from almacen.movimientos import MovimientoManager
+from almacen.servidor import ServidorInventario
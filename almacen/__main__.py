@@ -0,0 +1,5 @@
+import sys
+
+from almacen.cli import main
+
+sys.exit(main())
@@ -0,0 +1,312 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from almacen.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+# --- Sheet layout shared by every storage backend ---
+SHEET_INGRESOS = 'Ingresos de almacén'
+SHEET_SALIDAS = 'Salidas de almacén'
+SHEET_CONTROL = 'Control de inventarios'
+
+COLUMN_MAPPING = {
+    SHEET_INGRESOS: {
+        'Fecha': 'A', 'N° de parte': 'B', 'Nombre': 'C',
+        'Descripción': 'D', 'Unidad': 'F', 'Cantidad': 'G',
+        'Almacén': 'H', 'Ubicación': 'I', 'Encargado': 'J',
+        'Comentarios': 'K'
+    },
+    SHEET_SALIDAS: {
+        'Fecha': 'A', 'N° de parte': 'B', 'Nombre': 'C',
+        'Descripción': 'D', 'Unidad': 'F', 'Cantidad': 'G',
+        'Almacén': 'H', 'Ubicación': 'I', 'Encargado': 'J',
+        'Comentarios': 'K'
+    },
+    SHEET_CONTROL: {
+        'N° de parte': 'A', 'Nombre': 'B', 'Stock actual': 'C',
+        'Stock mínimo': 'D', 'Stock máximo': 'E', 'Estado': 'F'
+    }
+}
+
+# Title (row 1) and headers (row 2) of each sheet, as created for a new workbook
+SHEET_TITLES = {
+    SHEET_INGRESOS: "REGISTRO DE INGRESOS EN ALMACÉN",
+    SHEET_SALIDAS: "REGISTRO DE SALIDAS EN ALMACÉN",
+    SHEET_CONTROL: "CONTROL DE INVENTARIOS",
+}
+SHEET_HEADERS = {
+    SHEET_INGRESOS: ["Fecha", "N° de parte", "Nombre", "Descripción", " ", "Unidad",
+                     "Cantidad", "Almacén", "Ubicación", "Encargado", "Comentarios"],
+    SHEET_SALIDAS: ["Fecha", "N° de parte", "Nombre", "Descripción", " ", "Unidad",
+                    "Cantidad", "Almacén", "Ubicación", "Encargado", "Comentarios"],
+    SHEET_CONTROL: ["N° de parte", "Nombre", "Stock actual", "Stock mínimo", "Stock máximo", "Estado"],
+}
+
+FIRST_DATA_ROW = 3 # Row 1 is the title and row 2 the headers
+
+
+def column_index(column_letter: str) -> int:
+    """Converts a column letter (A-Z) into a 1-based index."""
+    return ord(column_letter) - ord('A') + 1
+
+
+# --- StorageBackend Class ---
+class StorageBackend:
+    """Base class for the inventory storage backends (xlsx workbook, SQLite database).
+
+    Backends expose the three sheets in the same row/column layout, so the managers
+    work with any of them. Rows are addressed by their sheet row number (data starts
+    at row 3) and columns by their letter. Writes are grouped with transaction()."""
+
+    column_mapping = COLUMN_MAPPING
+
+    def __init__(self):
+        self._tx_depth = 0 # Nesting level of the current transaction
+        self._tx_generation = 0 # Generation when the outermost transaction started
+        self._dirty = False # True when there are changes not yet saved
+        self._lock = threading.RLock() # Serializes access from background threads
+        self._generation = 0 # Bumped on every change of the data; keys the DataFrame cache
+        self._replacements = 0 # Bumped when the data is replaced instead of written to
+        self._frames = {} # {sheet_name: (cache key, DataFrame)} built by read_dataframe
+
+    # --- Interface implemented by each backend ---
+    def find_part(self, sheet_name: str, part_number: str) -> Optional[int]:
+        """Returns the first row where a part number exists, or None."""
+        raise NotImplementedError
+
+    def find_part_rows(self, sheet_name: str, part_number: str) -> List[int]:
+        """Returns every row (ascending) where a part number appears in a sheet."""
+        raise NotImplementedError
+
+    def part_numbers(self, sheet_name: str) -> List[str]:
+        """Returns the distinct part numbers of a sheet (normalized as for find_part)."""
+        raise NotImplementedError
+
+    def get_cell_value(self, sheet_name: str, row: int, column_letter: str):
+        """Gets the value of a specific cell."""
+        raise NotImplementedError
+
+    def update_cell(self, sheet_name: str, row: int, column_letter: str, value):
+        """Updates the value of a specific cell."""
+        raise NotImplementedError
+
+    def get_max_row(self, sheet_name: str) -> int:
+        """Returns the last row with data in column A (2 when the sheet has no data)."""
+        raise NotImplementedError
+
+    def append_row(self, sheet_name: str, record: Dict) -> int:
+        """Writes a record {column name: value} in the next free row and returns the row."""
+        raise NotImplementedError
+
+    def iter_records(self, sheet_name: str) -> Iterator[Tuple[int, tuple]]:
+        """Yields (row, values) for every non-empty data row; values go from column A
+        to the last column of the sheet layout (K for movements, F for control)."""
+        raise NotImplementedError
+
+    def iter_values(self, sheet_name: str, columns: Optional[List[str]] = None) -> Iterator[tuple]:
+        """Streams the data rows of a sheet as tuples with only the requested columns
+        (letters, in that order; every column of the layout by default), skipping rows
+        where all of them are empty. Meant for reports and aggregations that only read."""
+        yield from self._project((values for _, values in self.iter_records(sheet_name)),
+                                 self._column_positions(sheet_name, columns))
+
+    def column_values(self, sheet_name: str, columns: List[str]) -> List[list]:
+        """The requested columns (letters) as one list of values each; entry i of every
+        list is row FIRST_DATA_ROW + i (None in empty cells). Meant for aggregations over
+        every row: backends read whole columns at once instead of a tuple per row."""
+        positions = self._column_positions(sheet_name, columns)
+        result = [[] for _ in columns]
+        for row, values in self.iter_records(sheet_name):
+            for values_list, position in zip(result, positions):
+                values_list.extend([None] * (row - FIRST_DATA_ROW - len(values_list)))
+                values_list.append(values[position])
+        return result
+
+    def row_values(self, sheet_name: str, rows: List[int]) -> List[tuple]:
+        """Values from column A to the last column of the layout of the given rows, in
+        the order given. Meant for the rows found by an index: the cost depends on the
+        number of rows asked for, not on the size of the sheet."""
+        columns = [chr(ord('A') + i) for i in range(len(SHEET_HEADERS[sheet_name]))]
+        return [tuple(self.get_cell_value(sheet_name, row, column) for column in columns) for row in rows]
+
+    @staticmethod
+    def _column_positions(sheet_name: str, columns: Optional[List[str]]) -> List[int]:
+        if not columns:
+            return list(range(len(SHEET_HEADERS[sheet_name])))
+        return [column_index(c) - 1 for c in columns]
+
+    @staticmethod
+    def _project(rows, positions: List[int]) -> Iterator[tuple]:
+        """Keeps the values at `positions` of each row and drops rows left empty."""
+        for values in rows:
+            projected = tuple(values[i] for i in positions)
+            if any(v is not None for v in projected):
+                yield projected
+
+    def replace_rows(self, sheet_name: str, rows: List[tuple]) -> int:
+        """Replaces all data rows of a sheet with `rows` (values from column A), starting
+        at the first data row. Returns the number of cells that changed."""
+        raise NotImplementedError
+
+    def reload(self):
+        """Discards in-memory state and loads it again from storage."""
+        raise NotImplementedError
+
+    def _storage_file(self) -> Optional[str]:
+        """Path of the file that holds the data, used to notice changes made on disk."""
+        return None
+
+    def _commit(self):
+        """Makes the changes of the outermost transaction durable."""
+        raise NotImplementedError
+
+    def _rollback(self):
+        """Discards the changes of a failed transaction."""
+        raise NotImplementedError
+
+    def _begin(self):
+        """Called when an outermost transaction starts, before any change."""
+
+    # --- Shared behaviour ---
+    def mark_dirty(self):
+        """Flags the storage as modified so the next save is not skipped."""
+        self._dirty = True
+        self._generation += 1
+
+    def _data_replaced(self):
+        """Invalidates data derived from the storage after a rollback or a reload."""
+        self._generation += 1
+        self._replacements += 1
+
+    @property
+    def generation(self) -> int:
+        """Counter bumped on every change of the data (write, rollback or reload)."""
+        return self._generation
+
+    @property
+    def replacements(self) -> int:
+        """Counter bumped on rollbacks and reloads only. While it does not change, rows
+        of the movement sheets are only ever appended, so structures derived from them
+        can be extended with the new rows instead of rebuilt."""
+        return self._replacements
+
+    @property
+    def dirty(self) -> bool:
+        """True when there are changes not yet written to disk."""
+        return self._dirty
+
+    def save(self):
+        """Makes pending changes durable. Inside a transaction it is deferred to the commit."""
+        if self._tx_depth > 0:
+            logger.debug("Save deferred to the end of the current transaction.")
+            return
+        self._commit()
+
+    def save_async(self) -> Future:
+        """Requests a save and returns a Future that resolves once it is durable.
+        Backends without a background writer save synchronously."""
+        future = Future()
+        try:
+            self.save()
+            future.set_result(True)
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    @contextmanager
+    def transaction(self):
+        """Groups several operations into one unit of work with a single save.
+
+        Nested transactions join the outermost one, and only the outermost commit
+        saves. If the block raises or the commit fails, the changes are rolled back.
+        _begin() runs first (the xlsx backend merges other stations' rows there), so
+        checks made inside the block see the latest data."""
+        with self._lock:
+            if self._tx_depth == 0:
+                self._begin()
+                self._tx_generation = self._generation
+            self._tx_depth += 1
+            try:
+                yield self
+            except Exception:
+                self._tx_depth -= 1
+                if self._tx_depth == 0 and self._generation != self._tx_generation:
+                    self._rollback() # A transaction that changed nothing (a rejected movement) has nothing to undo
+                raise
+            self._tx_depth -= 1
+            if self._tx_depth == 0:
+                self._commit()
+
+    def get_headers(self, sheet_name: str) -> List[str]:
+        """Returns the column headers (row 2) of a sheet."""
+        return list(SHEET_HEADERS[sheet_name])
+
+    def read_dataframe(self, sheet_name: str):
+        """Returns the sheet data as a pandas DataFrame for the query tab, built from
+        the records already in memory. The frame is cached until the data changes
+        (write generation) or the file on disk changes (mtime); it is shared between
+        callers, so it must not be modified in place."""
+        with self._lock:
+            key = (self._generation, self._storage_mtime())
+            cached = self._frames.get(sheet_name)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+
+            with metricas.span('read_dataframe'):
+                import pandas as pd
+                headers = self.get_headers(sheet_name)
+                data = [values for _, values in self.iter_records(sheet_name)]
+                df = pd.DataFrame(data, columns=headers)
+            self._frames[sheet_name] = (key, df)
+            return df
+
+    def _storage_mtime(self) -> Optional[float]:
+        path = self._storage_file()
+        try:
+            return os.path.getmtime(path) if path else None
+        except OSError:
+            return None
+
+    def get_current_quantity(self, sheet_name: str, row: int) -> int:
+        """Gets the current quantity of an item.
+        Assumes quantity is in column G for Ingresos/Salidas and C for Control."""
+        if sheet_name in [SHEET_INGRESOS, SHEET_SALIDAS]:
+            quantity_col = 'G'
+        elif sheet_name == SHEET_CONTROL:
+            quantity_col = 'C'
+        else:
+            raise ValueError(f"Unknown sheet_name for quantity: {sheet_name}")
+
+        quantity = self.get_cell_value(sheet_name, row, quantity_col)
+        return quantity if quantity is not None else 0
+
+    def journal_movement(self, tipo: str, datos: Dict) -> Optional[int]:
+        """Durably records a movement before it is applied. Backends whose commits are
+        already durable and atomic do not need a journal and return None."""
+        return None
+
+    def journal_movements(self, tipo: str, movimientos: List[Dict]) -> Optional[int]:
+        """Durably records a batch of movements; returns the sequence number of the last."""
+        return None
+
+    def journal_applied(self, seq: Optional[int]):
+        """Records that journal entry `seq` is now contained in the storage."""
+
+    def load_async(self) -> Future:
+        """Prepares the storage on a background thread; the Future resolves when it is ready.
+        Backends that open instantly return a completed Future."""
+        future = Future()
+        future.set_result(True)
+        return future
+
+    def start_background_writer(self):
+        """Starts a background writer if the backend uses one; returns it or None."""
+        return None
+
+    def close(self, timeout: Optional[float] = None):
+        """Waits for pending saves and releases resources."""
@@ -0,0 +1,903 @@
+import bisect
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from itertools import repeat
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.packaging.custom import IntProperty
+
+from almacen.almacenamiento import (
+    StorageBackend, SHEET_TITLES, SHEET_HEADERS, FIRST_DATA_ROW, column_index
+)
+from almacen.metricas import metricas
+from almacen.movimientos import MovimientoManager
+
+logger = logging.getLogger(__name__)
+
+
+def crear_libro(archivo_excel: str):
+    """Writes a new empty workbook with the three sheets (title in row 1, headers in row 2)."""
+    wb = Workbook()
+    del wb[wb.active.title]
+    for sheet_name in SHEET_HEADERS:
+        _crear_hoja(wb, sheet_name)
+    wb.save(archivo_excel)
+    logger.info(f"Created new blank Excel file at: {archivo_excel}")
+
+
+def _crear_hoja(wb, sheet_name: str):
+    """Adds a sheet with its title and headers to a workbook."""
+    ws = wb.create_sheet(sheet_name)
+    ws['A1'] = SHEET_TITLES[sheet_name]
+    for col_idx, header in enumerate(SHEET_HEADERS[sheet_name], start=1):
+        ws.cell(row=2, column=col_idx, value=header)
+    return ws
+
+
+# --- MovementJournal Class ---
+class MovementJournal:
+    """Append-only journal (JSON lines) of movements not yet saved in the workbook.
+
+    Each movement is appended and fsynced before it touches the workbook, so a submit
+    survives a crash or a locked file. The workbook stores the sequence number of the
+    last entry it contains, and compaction drops entries up to that number."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._last_seq = None # Loaded lazily from the file
+
+    def _read_entries(self) -> List[Dict]:
+        """Reads every valid entry; a line cut by a crash mid-write is skipped."""
+        entries = []
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable journal line {line_no} in {self.path}.")
+        return entries
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the newest entry ever written."""
+        if self._last_seq is None:
+            self._last_seq = max((entry['seq'] for entry in self._read_entries()), default=0)
+        return self._last_seq
+
+    def ensure_seq_above(self, seq: int):
+        """Makes new entries number after `seq` (the workbook checkpoint), even if the
+        journal was fully compacted and is empty."""
+        if seq > self.last_seq:
+            self._last_seq = seq
+
+    def append(self, tipo: str, datos: Dict) -> int:
+        """Appends a movement and forces it to disk. Returns its sequence number."""
+        return self.append_many(tipo, [datos])
+
+    def append_many(self, tipo: str, movimientos: List[Dict]) -> int:
+        """Appends several movements with a single write and fsync (bulk imports).
+        Returns the sequence number of the last one."""
+        seq = self.last_seq
+        registrado = datetime.now().isoformat(timespec='seconds')
+        lineas = []
+        for datos in movimientos:
+            seq += 1
+            entry = {'seq': seq, 'tipo': tipo, 'datos': datos, 'registrado': registrado}
+            lineas.append(json.dumps(entry, ensure_ascii=False) + '\n')
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(lineas))
+            f.flush()
+            os.fsync(f.fileno())
+        self._last_seq = seq
+        logger.debug(f"{len(lineas)} movements ({tipo}) appended to journal, up to {seq}.")
+        return seq
+
+    def pending(self, after_seq: int) -> List[Dict]:
+        """Returns the entries with a sequence number above `after_seq`, in order."""
+        return sorted((e for e in self._read_entries() if e['seq'] > after_seq), key=lambda e: e['seq'])
+
+    def compact(self, up_to_seq: int):
+        """Drops the entries already contained in the saved workbook."""
+        remaining = self.pending(up_to_seq)
+        if not remaining:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        else:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in remaining:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        logger.debug(f"Journal compacted up to movement {up_to_seq}; {len(remaining)} entries remain.")
+
+
+def _nombre_estacion(nombre: Optional[str] = None) -> str:
+    """Station name usable in file and property names; this PC's name by default.
+    It tells apart the stations (and processes) that share a workbook."""
+    return re.sub(r'[^A-Za-z0-9_-]', '_', nombre or socket.gethostname()) or 'estacion'
+
+
+def _hash_archivo(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def _mapa_celdas(ws) -> Optional[Dict]:
+    """The {(row, column): cell} map of a worksheet, the cells that exist. It is private
+    to openpyxl (the version pinned in requirements.txt, checked by
+    tests/test_backend_excel.py), so readers fall back to the public iter_rows() when a
+    version lays sheets out differently."""
+    celdas = getattr(ws, '_cells', None)
+    return celdas if isinstance(celdas, dict) else None
+
+
+# --- FileLock Class ---
+class FileLock:
+    """Advisory lock shared by the stations that write the same workbook on a shared
+    folder: a file created exclusively next to the workbook, holding its owner.
+
+    A station waits up to `timeout` seconds for the lock and then raises TimeoutError,
+    so contention costs a short retry. A lock older than `stale_after` seconds is
+    considered left behind by a crashed station and removed."""
+
+    def __init__(self, path: str, timeout: float = 30.0, stale_after: float = 300.0, poll_interval: float = 0.1):
+        self.path = path
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.poll_interval = poll_interval
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self._break_if_stale():
+                    continue
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Workbook locked by {self._owner()} for more than {self.timeout:g}s.") from None
+                time.sleep(self.poll_interval)
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'estacion': _nombre_estacion(), 'pid': os.getpid(),
+                           'desde': datetime.now().isoformat(timespec='seconds')}, f)
+            return
+
+    def release(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            logger.warning(f"Lock file {self.path} was already removed.")
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def _owner(self) -> str:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                owner = json.load(f)
+            return f"{owner['estacion']} (pid {owner['pid']}, since {owner['desde']})"
+        except (OSError, ValueError, KeyError):
+            return "another station"
+
+    def _break_if_stale(self) -> bool:
+        try:
+            age = time.time() - os.path.getmtime(self.path)
+        except FileNotFoundError:
+            return True # Released meanwhile
+        if age < self.stale_after:
+            return False
+        logger.warning(f"Removing stale lock held by {self._owner()} ({age:.0f}s old).")
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return True
+
+
+# --- ExcelManager Class ---
+class ExcelManager(StorageBackend):
+    """Class to handle all optimized Excel operations (xlsx storage backend).
+
+    Several stations may share the workbook on a network folder. Each station journals
+    its own movements (`<archivo>.<estacion>.journal`) and keeps its own checkpoint in
+    the workbook. Saves take the shared FileLock, and if another station wrote the file
+    since it was loaded (size/mtime, then content hash), the file is read again and this
+    station's pending movements are replayed on top of it before writing. The new file
+    replaces the old one atomically, so other stations never read a half-written file."""
+
+    def __init__(self, archivo_excel: str, cargar: bool = True, estacion: Optional[str] = None,
+                 lock_timeout: float = 30.0):
+        super().__init__()
+        self.archivo_excel = archivo_excel
+        self.estacion = _nombre_estacion(estacion)
+        self._wb = None
+        self._cache = {}
+        self._part_index = {} # {sheet_name: {part_number: [rows]}}
+        self._next_row = {} # {sheet_name: first free row}
+        self._writer = None # Optional SaveWorker that performs saves off the caller's thread
+        self._save_lock = threading.Lock() # One save at a time; taken before self._lock
+        self._escritura = threading.RLock() # Held while the workbook is serialized; changes take it after self._lock
+        self.journal = MovementJournal(f"{archivo_excel}.{self.estacion}.journal")
+        self._migrate_shared_journal()
+        self._journal_seq = 0 # Last journal entry contained in the in-memory workbook
+        self.file_lock = FileLock(f"{archivo_excel}.lock", timeout=lock_timeout)
+        self._firma = None # (mtime_ns, size, sha256) of the file as last loaded or saved
+        self._cambios_derivados = False # Unsaved control changes not made by movements
+        if cargar: # Otherwise the caller loads it, e.g. in the background with load_async()
+            self.load() # Ensure sheets are present on initialization
+
+    @property
+    def workbook(self):
+        """Property that handles lazy loading of the workbook."""
+        if self._wb is None:
+            with self._lock: # A background load in progress finishes first
+                if self._wb is None:
+                    self._load_workbook()
+        return self._wb
+
+    def _migrate_shared_journal(self):
+        """Adopts the journal of a single-station version (`<archivo>.journal`)."""
+        compartido = f"{self.archivo_excel}.journal"
+        if os.path.exists(compartido) and not os.path.exists(self.journal.path):
+            os.replace(compartido, self.journal.path)
+            logger.info(f"Journal {compartido} adopted as {self.journal.path}.")
+
+    @metricas.medido('load')
+    def _load_workbook(self):
+        try:
+            inicio = time.perf_counter()
+            firma = self._firma_disco() # Before reading: a change made meanwhile is seen as external
+            self._wb = load_workbook(self.archivo_excel)
+            self._firma = firma
+            logger.info(f"Workbook loaded successfully in {time.perf_counter() - inicio:.2f}s.")
+            self._journal_seq = self._read_checkpoint()
+            self.journal.ensure_seq_above(self._journal_seq)
+            if all(name in self._wb.sheetnames for name in self.column_mapping):
+                self._replay_journal()
+        except FileNotFoundError:
+            logger.error(f"Error: Excel file not found at {self.archivo_excel}")
+            raise
+        except Exception as e:
+            logger.error(f"Error loading workbook: {str(e)}")
+            raise
+
+    def load_async(self) -> Future:
+        """Loads the workbook on a background thread; the Future resolves when it is ready
+        (or holds the error). Accesses from other threads wait for it to finish."""
+        future = Future()
+
+        def cargar():
+            try:
+                self.load()
+                future.set_result(True)
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=cargar, name="ExcelLoader", daemon=True).start()
+        return future
+
+    def load(self):
+        """Loads the workbook, creates missing sheets, replays the journal and indexes the
+        part numbers. Raises on failure, so it can also run on a background thread.
+        The file is only written when sheets were created or movements were replayed."""
+        with self._lock:
+            wb = self.workbook # This will load the workbook
+            for sheet_name in self.column_mapping.keys():
+                if sheet_name not in wb.sheetnames:
+                    _crear_hoja(wb, sheet_name)
+                    logger.warning(f"Sheet '{sheet_name}' was missing and has been created.")
+                    self.mark_dirty()
+            self._replay_journal() # Movements waiting for sheets that were just created
+            self._build_part_indexes() # Index part numbers once the workbook is loaded
+            if self._dirty:
+                self._save_at_startup()
+
+    def _save_at_startup(self):
+        """Writes created sheets or replayed movements. A failure (e.g. the file is open in
+        Excel) is not fatal: the changes stay in memory, covered by the journal, and the
+        next save writes them."""
+        if self._writer is not None and self._writer.is_alive():
+            self._writer.request_save()
+            return
+        try:
+            self._write_to_disk()
+        except Exception as e:
+            logger.warning(f"Could not save the workbook at startup: {str(e)}. Changes will be saved with the next save.")
+
+    def get_sheet(self, sheet_name: str):
+        """Obtains a specific sheet with caching."""
+        if sheet_name not in self._cache:
+            try:
+                self._cache[sheet_name] = self.workbook[sheet_name]
+                logger.debug(f"Sheet '{sheet_name}' loaded into cache.")
+            except KeyError:
+                logger.error(f"Sheet '{sheet_name}' not found.")
+                raise
+        return self._cache[sheet_name]
+
+    @property
+    def _checkpoint_name(self) -> str:
+        return f"journal_seq_{self.estacion}"
+
+    def _read_checkpoint(self) -> int:
+        """Returns this station's last journal sequence number stored in the workbook
+        properties ('journal_seq' for workbooks saved by the single-station version)."""
+        for name in (self._checkpoint_name, 'journal_seq'):
+            try:
+                return int(self._wb.custom_doc_props[name].value)
+            except (KeyError, TypeError, ValueError):
+                continue
+        return 0
+
+    def _write_checkpoint(self):
+        """Stores the last applied journal sequence number in the workbook properties,
+        so it is saved atomically with the movements it covers."""
+        try:
+            self._wb.custom_doc_props[self._checkpoint_name].value = self._journal_seq
+        except KeyError:
+            self._wb.custom_doc_props.append(IntProperty(name=self._checkpoint_name, value=self._journal_seq))
+
+    def _firma_disco(self) -> Optional[Tuple[int, int, str]]:
+        try:
+            st = os.stat(self.archivo_excel)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, _hash_archivo(self.archivo_excel)
+
+    def _cambio_externo(self) -> bool:
+        """True if another station wrote the file since this one loaded or saved it.
+        The size and mtime are checked first; the content hash only when they differ."""
+        if self._firma is None:
+            return False
+        try:
+            st = os.stat(self.archivo_excel)
+        except FileNotFoundError:
+            return False
+        if (st.st_mtime_ns, st.st_size) == self._firma[:2]:
+            return False
+        hash_actual = _hash_archivo(self.archivo_excel)
+        if hash_actual == self._firma[2]:
+            self._firma = (st.st_mtime_ns, st.st_size, hash_actual) # Touched, same content
+            return False
+        return True
+
+    @metricas.medido('merge')
+    def _merge_from_disk(self):
+        """Reads the workbook written by another station and replays this station's
+        journaled movements not yet saved on top of it."""
+        pendientes = len(self.journal.pending(self._read_checkpoint()))
+        if self._cambios_derivados:
+            logger.warning("Control sheet changes from a recompute or forecast were discarded by the merge; run them again.")
+        self._discard_state()
+        self._build_part_indexes() # Loads the file and replays the journal
+        logger.warning(f"Workbook changed by another station: reloaded and {pendientes} pending movements replayed.")
+
+    def sincronizar(self):
+        """Merges the changes written by other stations, if any, before new work starts,
+        so validations see their movements. Nothing is read when the file did not change."""
+        with self._lock:
+            if self._wb is not None and self._tx_depth == 0 and self._cambio_externo():
+                self._merge_from_disk()
+
+    def _begin(self):
+        self.sincronizar()
+
+    def _replay_journal(self):
+        """Applies the journal entries not yet contained in the workbook (crash recovery).
+        Entries are applied in memory only; the next save folds them into the file."""
+        for entry in self.journal.pending(self._journal_seq):
+            try:
+                MovimientoManager(self).aplicar(entry['tipo'], entry['datos'])
+                logger.info(f"Journal movement {entry['seq']} ({entry['tipo']}) replayed.")
+            except Exception as e:
+                logger.error(f"Could not replay journal movement {entry['seq']}: {str(e)}")
+            self._journal_seq = entry['seq']
+            self.mark_dirty()
+
+    def journal_movement(self, tipo: str, datos: Dict) -> int:
+        """Appends a movement to the journal (fsynced) before it touches the workbook."""
+        return self.journal.append(tipo, datos)
+
+    def journal_movements(self, tipo: str, movimientos: List[Dict]) -> int:
+        """Appends a batch of movements to the journal with a single fsync."""
+        return self.journal.append_many(tipo, movimientos)
+
+    def journal_applied(self, seq: int):
+        """Records that the in-memory workbook now contains journal entry `seq`."""
+        self._journal_seq = max(self._journal_seq, seq)
+
+    def _write_to_disk(self):
+        """Writes the in-memory workbook to the Excel file, without any dialog.
+
+        Safe to call from the writer thread. The storage lock is held only to merge
+        other stations' changes; the openpyxl serialization, the slow part, runs without
+        it, so the GUI and the server keep reading during a save. Changes of the
+        workbook (append_row, update_cell, replace_rows) take the write lock, which the
+        save holds while it serializes, so no cell changes while it is written. Saves
+        are serialized by their own lock, taken before the storage lock."""
+        with self._save_lock:
+            with self._lock:
+                if self._wb is None:
+                    logger.warning("Attempted to save but workbook was not loaded.")
+                    return
+                if not self._dirty:
+                    logger.debug("Save skipped: no changes since the last save.")
+                    return
+            with metricas.span('save'), self.file_lock:
+                with self._lock:
+                    if self._cambio_externo():
+                        self._merge_from_disk()
+                    self._write_checkpoint()
+                    wb = self.workbook
+                    seq = self._journal_seq
+                    cambios_derivados = self._cambios_derivados
+                    self._dirty = False # Changes made from now on need another save
+                    self._cambios_derivados = False
+                    self._escritura.acquire() # Before the storage lock is released
+                try:
+                    try:
+                        tmp_path, firma = self._serializar(wb)
+                    finally:
+                        self._escritura.release()
+                    self._replace_file(tmp_path, firma)
+                except Exception:
+                    with self._lock:
+                        self._dirty = True
+                        self._cambios_derivados = self._cambios_derivados or cambios_derivados
+                    raise
+            logger.info("Changes saved successfully.")
+            with self._lock:
+                # The saved file now holds every journaled movement up to the checkpoint
+                self.journal.compact(seq)
+
+    def _serializar(self, wb) -> Tuple[str, Tuple[int, int, str]]:
+        """Writes a workbook to this station's temporary file; returns its path and
+        signature (a rename keeps the mtime and size)."""
+        tmp_path = f"{self.archivo_excel}.{self.estacion}.tmp"
+        try:
+            wb.save(tmp_path)
+            st = os.stat(tmp_path)
+            return tmp_path, (st.st_mtime_ns, st.st_size, _hash_archivo(tmp_path))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _replace_file(self, tmp_path: str, firma: Tuple[int, int, str]):
+        """Moves the written file over the workbook, retrying while the file is
+        momentarily in use (e.g. being read by another station). The move takes the
+        storage lock, so the new signature is recorded with it and sincronizar() never
+        mistakes this station's own save for another's."""
+        deadline = time.monotonic() + self.file_lock.timeout
+        while True:
+            try:
+                with self._lock:
+                    os.replace(tmp_path, self.archivo_excel)
+                    self._firma = firma
+                break
+            except PermissionError:
+                if time.monotonic() >= deadline:
+                    os.remove(tmp_path)
+                    raise
+                time.sleep(self.file_lock.poll_interval)
+
+    def save(self):
+        """Saves changes to the Excel file synchronously.
+        Inside a transaction the save is deferred to the commit, and it is skipped
+        when nothing changed since the last save."""
+        if self._tx_depth > 0:
+            logger.debug("Save deferred to the end of the current transaction.")
+            return
+        try:
+            self._write_to_disk()
+        except Exception as e:
+            logger.error(f"Error saving: {str(e)}")
+            raise
+
+    def save_async(self) -> Future:
+        """Requests a save and returns a Future that resolves once it is on disk.
+        Uses the background writer when it is running, otherwise saves synchronously."""
+        if self._writer is None or not self._writer.is_alive():
+            return super().save_async()
+        if not self._dirty:
+            future = Future()
+            future.set_result(True)
+            return future
+        return self._writer.request_save()
+
+    def start_background_writer(self) -> 'SaveWorker':
+        """Starts the writer thread; from then on transaction commits only queue the save."""
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = SaveWorker(self)
+            self._writer.start()
+            if self._dirty:
+                self._writer.request_save() # e.g. replayed movements the startup save could not write
+        return self._writer
+
+    def close(self, timeout: Optional[float] = None):
+        """Waits for pending saves and stops the background writer, if any."""
+        if self._writer is not None:
+            self._writer.stop(timeout)
+            self._writer = None
+
+    def _commit(self):
+        """Commits a transaction: queues the save when the background writer runs
+        (a failed background save leaves the changes in memory for the next save),
+        otherwise saves now and rolls back to the last saved workbook if that fails."""
+        if self._writer is not None and self._writer.is_alive():
+            self.save_async()
+            return
+        try:
+            self.save()
+        except Exception:
+            self._rollback()
+            raise
+
+    def _discard_state(self):
+        """Drops the in-memory workbook together with every cache derived from it."""
+        self._wb = None
+        self._cache.clear()
+        self._part_index.clear()
+        self._next_row.clear()
+        self._dirty = False
+        self._data_replaced()
+
+    def _rollback(self):
+        """Discards uncommitted changes; the workbook is lazily reloaded from disk on next use."""
+        if self._dirty:
+            self._discard_state()
+            logger.warning("Transaction rolled back: unsaved changes were discarded.")
+
+    @staticmethod
+    def _normalize_part(value) -> str:
+        """Normalizes a part number the same way for indexing and lookups."""
+        return str(value).strip()
+
+    def _part_col_idx(self, sheet_name: str) -> int:
+        """Returns the 1-based column index holding the part number of a sheet."""
+        return column_index(self.column_mapping[sheet_name]['N° de parte'])
+
+    def _build_part_index(self, sheet_name: str) -> Dict[str, List[int]]:
+        """Scans a sheet once and maps each part number to its data rows (ascending)."""
+        ws = self.get_sheet(sheet_name)
+        col_idx = self._part_col_idx(sheet_name)
+        index = {}
+        # Data starts at row 3 (after headers)
+        for row_idx, (cell_val,) in enumerate(
+                ws.iter_rows(min_row=3, min_col=col_idx, max_col=col_idx, values_only=True), start=3):
+            if cell_val is not None:
+                index.setdefault(self._normalize_part(cell_val), []).append(row_idx)
+        self._part_index[sheet_name] = index
+        logger.debug(f"Part index built for '{sheet_name}' with {len(index)} parts.")
+        return index
+
+    def _build_part_indexes(self):
+        """Builds the part number index of every mapped sheet after the workbook loads."""
+        for sheet_name in self.column_mapping:
+            if sheet_name in self.workbook.sheetnames:
+                self._build_part_index(sheet_name)
+
+    def _get_part_index(self, sheet_name: str) -> Dict[str, List[int]]:
+        """Returns the part index of a sheet, building it if it was discarded."""
+        index = self._part_index.get(sheet_name)
+        if index is None:
+            index = self._build_part_index(sheet_name)
+        return index
+
+    def invalidate_sheet_indexes(self, sheet_name: Optional[str] = None):
+        """Discards the part index and append cursor of one sheet (or all) so they are
+        rebuilt on next use. Must be called after writing rows directly through the worksheet."""
+        if sheet_name is None:
+            self._part_index.clear()
+            self._next_row.clear()
+        else:
+            self._part_index.pop(sheet_name, None)
+            self._next_row.pop(sheet_name, None)
+
+    def reload(self):
+        """Discards the in-memory workbook, sheet cache and indexes, and loads them again from disk."""
+        self._discard_state()
+        self._build_part_indexes()
+        logger.info("Workbook reloaded from disk.")
+
+    @metricas.medido('find_part')
+    def find_part(self, sheet_name: str, part_number: str) -> Optional[int]:
+        """Searches for a part number and returns the first row where it exists.
+        Uses the per-sheet part index, so the lookup does not scan the sheet."""
+        rows = self._get_part_index(sheet_name).get(self._normalize_part(part_number))
+        if rows:
+            logger.debug(f"Part '{part_number}' found in row {rows[0]} of '{sheet_name}'.")
+            return rows[0]
+        logger.debug(f"Part '{part_number}' not found in '{sheet_name}'.")
+        return None
+
+    def part_numbers(self, sheet_name: str) -> List[str]:
+        """Keys of the part index of the sheet."""
+        return list(self._get_part_index(sheet_name))
+
+    def get_cell_value(self, sheet_name: str, row: int, column_letter: str):
+        """Gets the value of a specific cell."""
+        ws = self.get_sheet(sheet_name)
+        return ws[f'{column_letter}{row}'].value
+
+    def update_cell(self, sheet_name: str, row: int, column_letter: str, value):
+        """Updates the value of a specific cell."""
+        with self._lock, self._escritura:
+            ws = self.get_sheet(sheet_name)
+            old_value = ws[f'{column_letter}{row}'].value
+            if old_value == value:
+                return # Nothing changes, so the workbook does not become dirty
+            mapping = self.column_mapping.get(sheet_name, {})
+            if mapping.get('N° de parte') == column_letter and sheet_name in self._part_index:
+                self._reindex_part_cell(sheet_name, row, old_value, value)
+            ws[f'{column_letter}{row}'] = value
+            self.mark_dirty()
+            if column_letter == 'A' and value is not None and row >= self._next_row.get(sheet_name, row + 1):
+                self._next_row[sheet_name] = row + 1 # Writing past the cursor moves it forward
+        logger.debug(f"Cell '{column_letter}{row}' in '{sheet_name}' updated to: {value}")
+
+    def _reindex_part_cell(self, sheet_name: str, row: int, old_value, new_value):
+        """Moves a row between part index entries when its part number cell changes."""
+        index = self._part_index[sheet_name]
+        if old_value is not None:
+            old_key = self._normalize_part(old_value)
+            rows = index.get(old_key)
+            if rows and row in rows:
+                rows.remove(row)
+                if not rows:
+                    del index[old_key]
+        if new_value is not None:
+            bisect.insort(index.setdefault(self._normalize_part(new_value), []), row)
+
+    def find_part_rows(self, sheet_name: str, part_number: str) -> List[int]:
+        """Returns every row (ascending) where a part number appears in a sheet."""
+        return list(self._get_part_index(sheet_name).get(self._normalize_part(part_number), []))
+
+    def _get_next_row(self, sheet_name: str) -> int:
+        """Returns the first free row of a sheet, scanning column A only the first time."""
+        if sheet_name not in self._next_row:
+            ws = self.get_sheet(sheet_name)
+            max_r = 2 # Start checking from row 3 (after headers)
+            for row_idx, (cell_val,) in enumerate(
+                    ws.iter_rows(min_row=3, max_col=1, values_only=True), start=3):
+                if cell_val is not None: # Check if column A has data
+                    max_r = row_idx
+            self._next_row[sheet_name] = max_r + 1
+        return self._next_row[sheet_name]
+
+    def get_max_row(self, sheet_name: str) -> int:
+        """Returns the maximum row with data in a given sheet, considering column A."""
+        return self._get_next_row(sheet_name) - 1
+
+    @metricas.medido('append')
+    def append_row(self, sheet_name: str, record: Dict) -> int:
+        """Writes a record {column name: value} in the next free row of a sheet.
+        Returns the row written; the append cursor and part index are kept up to date."""
+        mapping = self.column_mapping[sheet_name]
+        unknown = [field for field in record if field not in mapping]
+        if unknown:
+            raise ValueError(f"Unknown columns for '{sheet_name}': {unknown}")
+
+        with self._lock, self._escritura:
+            ws = self.get_sheet(sheet_name)
+            row = self._get_next_row(sheet_name)
+            for field, value in record.items():
+                ws[f"{mapping[field]}{row}"] = value
+
+            part = record.get('N° de parte')
+            if part is not None and sheet_name in self._part_index:
+                # Appended rows are always the highest, so the row list stays sorted
+                self._part_index[sheet_name].setdefault(self._normalize_part(part), []).append(row)
+            self._next_row[sheet_name] = row + 1
+            self.mark_dirty()
+        logger.debug(f"Row {row} appended to '{sheet_name}'.")
+        return row
+
+    def iter_records(self, sheet_name: str):
+        """Yields (row, values) for every non-empty data row, values from column A to
+        the last column of the sheet layout."""
+        ws = self.get_sheet(sheet_name)
+        width = len(SHEET_HEADERS[sheet_name])
+        for row_idx, values in enumerate(
+                ws.iter_rows(min_row=FIRST_DATA_ROW, max_col=width, values_only=True), start=FIRST_DATA_ROW):
+            if any(v is not None for v in values):
+                yield row_idx, values
+
+    def iter_values(self, sheet_name: str, columns: Optional[List[str]] = None):
+        """Streams the data rows of a sheet as tuples of the requested columns.
+
+        While the workbook is not loaded, the file is read in openpyxl read-only mode
+        one row at a time, so memory stays flat and no editable workbook is built.
+        Once loaded (or with journal entries not saved yet) the in-memory workbook holds
+        the current data and is read instead."""
+        positions = self._column_positions(sheet_name, columns)
+        max_col = max(positions) + 1
+        if self._wb is None and os.path.exists(self.archivo_excel) and not os.path.exists(self.journal.path):
+            wb = load_workbook(self.archivo_excel, read_only=True)
+            try:
+                if sheet_name in wb.sheetnames:
+                    rows = wb[sheet_name].iter_rows(min_row=FIRST_DATA_ROW, max_col=max_col, values_only=True)
+                    yield from self._project(rows, positions)
+                    return
+            finally:
+                wb.close()
+        # In memory, only the requested columns are read from the sheet's cell map:
+        # iter_rows would build (and keep) a cell for every column in its range
+        ws = self.get_sheet(sheet_name)
+        celdas = _mapa_celdas(ws)
+        if celdas is None:
+            desde = min(positions)
+            rows = ws.iter_rows(min_row=FIRST_DATA_ROW, min_col=desde + 1, max_col=max_col, values_only=True)
+            yield from self._project(rows, [position - desde for position in positions])
+            return
+        columnas = [position + 1 for position in positions]
+        for row in range(FIRST_DATA_ROW, ws.max_row + 1):
+            values = tuple(celdas[(row, c)].value if (row, c) in celdas else None for c in columnas)
+            if any(v is not None for v in values):
+                yield values
+
+    def column_values(self, sheet_name: str, columns: List[str]) -> List[list]:
+        """Reads each column straight from the sheet's cell map once the workbook is loaded
+        (with iter_rows where openpyxl has no cell map, see _mapa_celdas)."""
+        if self._wb is None:
+            return super().column_values(sheet_name, columns)
+        with self._lock:
+            ws = self.get_sheet(sheet_name)
+            celdas = _mapa_celdas(ws)
+            filas = range(FIRST_DATA_ROW, ws.max_row + 1)
+            resultado = []
+            for c in (column_index(column) for column in columns):
+                if celdas is None:
+                    valores = ws.iter_rows(min_row=FIRST_DATA_ROW, min_col=c, max_col=c, values_only=True)
+                    resultado.append([value for (value,) in valores])
+                else:
+                    resultado.append([cell.value if cell is not None else None
+                                      for cell in map(celdas.get, zip(filas, repeat(c)))])
+            return resultado
+
+    def row_values(self, sheet_name: str, rows: List[int]) -> List[tuple]:
+        """Reads the cells straight from the sheet's cell map (or with iter_rows)."""
+        with self._lock:
+            ws = self.get_sheet(sheet_name)
+            columnas = range(1, len(SHEET_HEADERS[sheet_name]) + 1)
+            if _mapa_celdas(ws) is None:
+                return [next(ws.iter_rows(min_row=row, max_row=row, max_col=len(columnas), values_only=True))
+                        for row in rows]
+            celdas = _mapa_celdas(ws).get
+            resultado = []
+            for row in rows:
+                valores = (celdas((row, c)) for c in columnas)
+                resultado.append(tuple(cell.value if cell is not None else None for cell in valores))
+            return resultado
+
+    def replace_rows(self, sheet_name: str, rows: List[tuple]) -> int:
+        """Replaces all data rows of a sheet, touching only the cells whose value
+        changes so an identical rewrite does not make the workbook dirty."""
+        with self._lock, self._escritura:
+            ws = self.get_sheet(sheet_name)
+            width = len(SHEET_HEADERS[sheet_name])
+            # Find the last actual row by checking for data in column A
+            last_data_row = max(self.get_max_row(sheet_name), len(rows) + FIRST_DATA_ROW - 1)
+
+            cambios = 0
+            for row in range(FIRST_DATA_ROW, last_data_row + 1):
+                i = row - FIRST_DATA_ROW
+                valores = rows[i] if i < len(rows) else (None,) * width # Clear leftover rows
+                for col_idx, valor in enumerate(valores, start=1):
+                    cell = ws.cell(row=row, column=col_idx)
+                    if cell.value != valor:
+                        cell.value = valor
+                        cambios += 1
+
+            if cambios:
+                self.mark_dirty()
+                self._cambios_derivados = True
+                # Rows were rewritten directly, so the index and cursor must be rebuilt
+                self.invalidate_sheet_indexes(sheet_name)
+        return cambios
+
+    def get_headers(self, sheet_name: str) -> List[str]:
+        """Returns the headers of row 2, using the default name for empty cells."""
+        width = len(SHEET_HEADERS[sheet_name])
+        ws = self.get_sheet(sheet_name)
+        fila = next(ws.iter_rows(min_row=2, max_row=2, max_col=width, values_only=True), ())
+        fila = tuple(fila) + (None,) * (width - len(fila))
+        return [
+            str(valor) if valor is not None else defecto
+            for valor, defecto in zip(fila, SHEET_HEADERS[sheet_name])
+        ]
+
+    def _storage_file(self) -> Optional[str]:
+        return self.archivo_excel
+
+
+# --- SaveWorker Class ---
+class SaveWorker(threading.Thread):
+    """Writer thread that takes save requests from a queue and writes the workbook
+    off the caller's thread (e.g. the Tk main loop). A burst of requests collapses into one
+    save of the latest state. Status changes are put in `status_queue` for a GUI to poll."""
+
+    def __init__(self, excel_manager: ExcelManager, coalesce_delay: float = 0.2, retry_interval: float = 10.0):
+        super().__init__(name="SaveWorker", daemon=True)
+        self.excel_manager = excel_manager
+        self.coalesce_delay = coalesce_delay # Seconds to wait for more requests before saving
+        self.retry_interval = retry_interval # Seconds between attempts while the file is not writable
+        self._requests = queue.Queue()
+        self.status_queue = queue.Queue() # (status, detail) with status in 'pendiente', 'guardado', 'error'
+        self._stop_requested = False
+
+    def request_save(self) -> Future:
+        """Queues a save request and returns a Future resolved when it is written."""
+        future = Future()
+        self._requests.put(future)
+        self.status_queue.put(('pendiente', None))
+        return future
+
+    def stop(self, timeout: Optional[float] = None):
+        """Finishes pending saves and ends the thread."""
+        self._requests.put(None)
+        self.join(timeout)
+
+    def run(self):
+        retrying = False
+        while not self._stop_requested:
+            try:
+                # After a failed save, wake up periodically to compact the journal
+                # into the workbook as soon as it becomes writable again
+                future = self._requests.get(timeout=self.retry_interval if retrying else None)
+            except queue.Empty:
+                future = Future()
+            if future is None:
+                break
+            futures = [future]
+
+            # Collapse a burst of requests into a single save of the latest state
+            time.sleep(self.coalesce_delay)
+            while True:
+                try:
+                    future = self._requests.get_nowait()
+                except queue.Empty:
+                    break
+                if future is None:
+                    self._stop_requested = True
+                    break
+                futures.append(future)
+
+            try:
+                self.excel_manager._write_to_disk()
+                for future in futures:
+                    future.set_result(True)
+                retrying = False
+                self.status_queue.put(('guardado', None))
+            except Exception as e:
+                logger.error(f"Error saving in background: {str(e)}")
+                for future in futures:
+                    future.set_exception(e)
+                # Movements stay safe in the journal; keep retrying while changes are pending
+                retrying = self.excel_manager.dirty
+                self.status_queue.put(('error', str(e)))
@@ -0,0 +1,485 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from concurrent.futures import Future
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from openpyxl import Workbook, load_workbook
+
+from almacen.almacenamiento import (
+    StorageBackend, SHEET_INGRESOS, SHEET_SALIDAS, SHEET_CONTROL,
+    SHEET_TITLES, SHEET_HEADERS, FIRST_DATA_ROW, column_index
+)
+from almacen.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+# Table and column (A, B, C...) of every sheet. Movements keep column E, which the
+# forms do not use but existing workbooks may fill in, so the import is lossless.
+MOVEMENT_COLUMNS = ['fecha', 'parte', 'nombre', 'descripcion', 'estado', 'unidad',
+                    'cantidad', 'almacen', 'ubicacion', 'encargado', 'comentarios']
+CONTROL_COLUMNS = ['parte', 'nombre', 'stock_actual', 'stock_minimo', 'stock_maximo', 'estado']
+
+TABLES = {
+    SHEET_INGRESOS: ('ingresos', MOVEMENT_COLUMNS),
+    SHEET_SALIDAS: ('salidas', MOVEMENT_COLUMNS),
+    SHEET_CONTROL: ('control', CONTROL_COLUMNS),
+}
+
+# Cell values SQLite has no type for are stored as text or numbers, and the row's
+# `tipos` column keeps one tag per column ('-' for values stored as they are; NULL when
+# the whole row is), so they come back with the type the workbook had
+_A_DB = [
+    (bool, 'b', int), # Before int-like checks: bool is an int
+    (datetime, 'd', lambda value: value.isoformat(sep=' ')), # Before date: datetime is a date
+    (date, 'f', date.isoformat),
+    (time, 'h', time.isoformat),
+    (timedelta, 'r', timedelta.total_seconds),
+]
+_DESDE_DB = {
+    'b': bool,
+    'd': datetime.fromisoformat,
+    'f': date.fromisoformat,
+    'h': time.fromisoformat,
+    'r': lambda segundos: timedelta(seconds=segundos),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingresos (
+    fila INTEGER PRIMARY KEY, -- Row number in the sheet layout (data starts at 3)
+    fecha, parte, parte_clave TEXT,
+    nombre, descripcion, estado, unidad, cantidad, almacen, ubicacion, encargado, comentarios,
+    tipos TEXT -- Type tag of each column (see _A_DB), NULL if no value needs one
+);
+CREATE INDEX IF NOT EXISTS idx_ingresos_parte ON ingresos(parte_clave, fila);
+CREATE INDEX IF NOT EXISTS idx_ingresos_fecha ON ingresos(fecha);
+
+CREATE TABLE IF NOT EXISTS salidas (
+    fila INTEGER PRIMARY KEY,
+    fecha, parte, parte_clave TEXT,
+    nombre, descripcion, estado, unidad, cantidad, almacen, ubicacion, encargado, comentarios,
+    tipos TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_salidas_parte ON salidas(parte_clave, fila);
+CREATE INDEX IF NOT EXISTS idx_salidas_fecha ON salidas(fecha);
+
+CREATE TABLE IF NOT EXISTS control (
+    fila INTEGER PRIMARY KEY,
+    parte, parte_clave TEXT, nombre, stock_actual, stock_minimo, stock_maximo, estado,
+    tipos TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_control_parte ON control(parte_clave, fila);
+
+-- Title (row 1) and headers (row 2) of each sheet, kept for the export
+CREATE TABLE IF NOT EXISTS hojas (
+    hoja TEXT PRIMARY KEY, titulo TEXT, encabezados TEXT
+);
+"""
+
+
+# --- SQLiteManager Class ---
+class SQLiteManager(StorageBackend):
+    """SQLite storage backend (stdlib sqlite3) with the same interface as ExcelManager.
+
+    Each sheet is a table indexed by part number (and date for movements). The row
+    number of the sheet layout is kept in `fila`, so row-based code works unchanged
+    and the export rebuilds the same three-sheet workbook. Commits are atomic and
+    durable, so this backend needs neither a journal nor a background writer."""
+
+    FETCH_BATCH = 1000 # Rows fetched at a time by iter_values
+    ROW_VALUES_BATCH = 500 # Rows looked up per query by row_values (SQLite limits bound parameters)
+
+    def __init__(self, archivo_db: str, importar_de: Optional[str] = None):
+        super().__init__()
+        self.archivo_db = archivo_db
+        self._importar_de = importar_de # Workbook load() imports into a new database
+        self._conn = sqlite3.connect(archivo_db, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._migrar_tipos()
+        self._conn.commit()
+        logger.info(f"SQLite database opened at {archivo_db}.")
+
+    def load(self):
+        """Imports the workbook given as `importar_de`, if any and not imported yet.
+        Raises on failure, so it can also run on a background thread."""
+        with self._lock:
+            if self._importar_de:
+                self.import_from_excel(self._importar_de)
+                self._importar_de = None
+
+    def load_async(self) -> Future:
+        """Runs load() on a background thread when there is a workbook to import; the
+        Future resolves when it is done (or holds the error)."""
+        if not self._importar_de:
+            return super().load_async()
+        future = Future()
+
+        def cargar():
+            try:
+                self.load()
+                future.set_result(True)
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=cargar, name="SQLiteLoader", daemon=True).start()
+        return future
+
+    # --- Value conversion ---
+    @staticmethod
+    def _normalize_part(value) -> str:
+        """Normalizes a part number the same way as the xlsx backend."""
+        return str(value).strip()
+
+    def _table(self, sheet_name: str) -> Tuple[str, List[str]]:
+        try:
+            return TABLES[sheet_name]
+        except KeyError:
+            raise KeyError(f"Sheet '{sheet_name}' not found.")
+
+    def _column_name(self, sheet_name: str, column_letter: str) -> str:
+        table, columns = self._table(sheet_name)
+        idx = column_index(column_letter) - 1
+        if not 0 <= idx < len(columns):
+            raise ValueError(f"Column {column_letter} is outside the layout of '{sheet_name}'.")
+        return columns[idx]
+
+    def _migrar_tipos(self):
+        """Adds the `tipos` column to databases created before it. Their fecha_es_fecha
+        flag, which tagged datetimes of column fecha only, becomes the tag of column A."""
+        for table, columns in TABLES.values():
+            existentes = [info[1] for info in self._conn.execute(f"PRAGMA table_info({table})")]
+            if 'tipos' in existentes:
+                continue
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN tipos TEXT")
+            if 'fecha_es_fecha' in existentes:
+                self._conn.execute(f"UPDATE {table} SET tipos = ? WHERE fecha_es_fecha = 1",
+                                   ('d' + '-' * (len(columns) - 1),))
+            logger.info(f"Column 'tipos' added to table '{table}'.")
+
+    @staticmethod
+    def _valor_a_db(value) -> Tuple[str, object]:
+        """Type tag and stored form of one cell value."""
+        for tipo, etiqueta, convertir in _A_DB:
+            if isinstance(value, tipo):
+                return etiqueta, convertir(value)
+        return '-', value
+
+    @staticmethod
+    def _valor_desde_db(value, etiqueta: str):
+        return value if etiqueta == '-' or value is None else _DESDE_DB[etiqueta](value)
+
+    def _to_db(self, columns: List[str], record: Dict[str, object]) -> Dict:
+        """Returns the table columns to store for the cells of one row, given as
+        {column: value}; columns of the table missing from `record` are left empty."""
+        valores, etiquetas = {}, []
+        for column in columns:
+            etiqueta, valor = self._valor_a_db(record.get(column))
+            etiquetas.append(etiqueta)
+            if column in record:
+                valores[column] = valor
+        if 'parte' in record:
+            valores['parte_clave'] = None if record['parte'] is None else self._normalize_part(record['parte'])
+        tipos = ''.join(etiquetas)
+        valores['tipos'] = tipos if tipos.strip('-') else None
+        return valores
+
+    def _select_columns(self, sheet_name: str) -> str:
+        table, columns = self._table(sheet_name)
+        return ', '.join(columns) + ', tipos'
+
+    def _from_db(self, values: list, tipos: Optional[str], positions: Optional[List[int]] = None) -> tuple:
+        """Converts stored values back into cell values. `positions` are the table
+        column of each value when only some columns were selected."""
+        if tipos:
+            for i, position in enumerate(range(len(values)) if positions is None else positions):
+                values[i] = self._valor_desde_db(values[i], tipos[position])
+        return tuple(values)
+
+    def _row_values(self, sheet_name: str, db_row) -> tuple:
+        """Converts a selected row (_select_columns) back into cell values from column A."""
+        table, columns = self._table(sheet_name)
+        return self._from_db(list(db_row[:len(columns)]), db_row[len(columns)])
+
+    # --- Interface ---
+    @metricas.medido('find_part')
+    def find_part(self, sheet_name: str, part_number: str) -> Optional[int]:
+        """Returns the first row where a part number exists (indexed lookup)."""
+        table, _ = self._table(sheet_name)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT MIN(fila) FROM {table} WHERE parte_clave = ?",
+                (self._normalize_part(part_number),)
+            ).fetchone()
+        return row[0] if row and row[0] is not None else None
+
+    def find_part_rows(self, sheet_name: str, part_number: str) -> List[int]:
+        table, _ = self._table(sheet_name)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT fila FROM {table} WHERE parte_clave = ? ORDER BY fila",
+                (self._normalize_part(part_number),)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def part_numbers(self, sheet_name: str) -> List[str]:
+        table, _ = self._table(sheet_name)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT parte_clave FROM {table} WHERE parte_clave IS NOT NULL"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def get_cell_value(self, sheet_name: str, row: int, column_letter: str):
+        table, _ = self._table(sheet_name)
+        column = self._column_name(sheet_name, column_letter)
+        with self._lock:
+            result = self._conn.execute(f"SELECT {column}, tipos FROM {table} WHERE fila = ?", (row,)).fetchone()
+        if result is None:
+            return None
+        return self._from_db([result[0]], result[1], [column_index(column_letter) - 1])[0]
+
+    def update_cell(self, sheet_name: str, row: int, column_letter: str, value):
+        table, columns = self._table(sheet_name)
+        column = self._column_name(sheet_name, column_letter)
+        with self._lock:
+            fila = self._conn.execute(
+                f"SELECT {self._select_columns(sheet_name)} FROM {table} WHERE fila = ?", (row,)).fetchone()
+            actual = self._row_values(sheet_name, fila) if fila else (None,) * len(columns)
+            if actual[column_index(column_letter) - 1] == value:
+                return # Nothing changes
+            record = dict(zip(columns, actual))
+            record[column] = value
+            valores = self._to_db(columns, record) # The whole row, so its type tags stay right
+            assignments = ', '.join(f"{c} = :{c}" for c in valores)
+            cursor = self._conn.execute(f"UPDATE {table} SET {assignments} WHERE fila = :fila", {**valores, 'fila': row})
+            if cursor.rowcount == 0:
+                names = ', '.join(valores)
+                self._conn.execute(
+                    f"INSERT INTO {table} (fila, {names}) VALUES (:fila, {', '.join(':' + c for c in valores)})",
+                    {**valores, 'fila': row}
+                )
+            self.mark_dirty()
+        logger.debug(f"Cell '{column_letter}{row}' in '{sheet_name}' updated to: {value}")
+
+    def get_max_row(self, sheet_name: str) -> int:
+        table, columns = self._table(sheet_name)
+        with self._lock:
+            result = self._conn.execute(f"SELECT MAX(fila) FROM {table} WHERE {columns[0]} IS NOT NULL").fetchone()
+        return result[0] if result and result[0] is not None else FIRST_DATA_ROW - 1
+
+    def _next_row(self, sheet_name: str) -> int:
+        table, _ = self._table(sheet_name)
+        result = self._conn.execute(f"SELECT MAX(fila) FROM {table}").fetchone()
+        return max(result[0] + 1 if result[0] is not None else FIRST_DATA_ROW, self.get_max_row(sheet_name) + 1)
+
+    @metricas.medido('append')
+    def append_row(self, sheet_name: str, record: Dict) -> int:
+        mapping = self.column_mapping[sheet_name]
+        unknown = [field for field in record if field not in mapping]
+        if unknown:
+            raise ValueError(f"Unknown columns for '{sheet_name}': {unknown}")
+
+        table, columns = self._table(sheet_name)
+        valores = self._to_db(columns, {self._column_name(sheet_name, mapping[field]): value
+                                        for field, value in record.items()})
+        with self._lock:
+            row = self._next_row(sheet_name)
+            names = ', '.join(valores)
+            self._conn.execute(
+                f"INSERT INTO {table} (fila, {names}) VALUES (:fila, {', '.join(':' + c for c in valores)})",
+                {**valores, 'fila': row}
+            )
+            self.mark_dirty()
+        logger.debug(f"Row {row} appended to '{sheet_name}'.")
+        return row
+
+    def iter_records(self, sheet_name: str) -> Iterator[Tuple[int, tuple]]:
+        table, _ = self._table(sheet_name)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT fila, {self._select_columns(sheet_name)} FROM {table} ORDER BY fila"
+            ).fetchall()
+        for db_row in rows:
+            values = self._row_values(sheet_name, db_row[1:])
+            if any(v is not None for v in values):
+                yield db_row[0], values
+
+    def iter_values(self, sheet_name: str, columns: Optional[List[str]] = None) -> Iterator[tuple]:
+        """Selects only the requested columns and fetches them in batches."""
+        table, table_columns = self._table(sheet_name)
+        positions = self._column_positions(sheet_name, columns)
+        selected = [table_columns[i] for i in positions]
+        query = f"SELECT {', '.join(selected)}, tipos FROM {table} ORDER BY fila"
+        with self._lock:
+            cursor = self._conn.execute(query)
+        while True:
+            with self._lock:
+                batch = cursor.fetchmany(self.FETCH_BATCH)
+            if not batch:
+                break
+            for db_row in batch:
+                values = self._from_db(list(db_row[:-1]), db_row[-1], positions)
+                if any(v is not None for v in values):
+                    yield values
+
+    def column_values(self, sheet_name: str, columns: List[str]) -> List[list]:
+        """One query for all the columns; gaps in the row numbers are filled with None."""
+        table, _ = self._table(sheet_name)
+        selected = [self._column_name(sheet_name, column) for column in columns]
+        query = f"SELECT fila, {', '.join(selected)}, tipos FROM {table} ORDER BY fila"
+        with self._lock:
+            rows = self._conn.execute(query).fetchall()
+        if not rows:
+            return [[] for _ in columns]
+        filas, *result, tipos = [list(values) for values in zip(*rows)]
+        etiquetadas = [(i, etiquetas) for i, etiquetas in enumerate(tipos) if etiquetas]
+        for values, column in zip(result, columns):
+            position = column_index(column) - 1
+            for i, etiquetas in etiquetadas:
+                values[i] = self._valor_desde_db(values[i], etiquetas[position])
+        if filas[0] != FIRST_DATA_ROW or filas[-1] - filas[0] + 1 != len(filas):
+            completas = []
+            for values in result:
+                por_fila = dict(zip(filas, values))
+                completas.append([por_fila.get(fila) for fila in range(FIRST_DATA_ROW, filas[-1] + 1)])
+            result = completas
+        return result
+
+    def row_values(self, sheet_name: str, rows: List[int]) -> List[tuple]:
+        """Fetches the rows by primary key, ROW_VALUES_BATCH at a time."""
+        table, _ = self._table(sheet_name)
+        por_fila = {}
+        with self._lock:
+            for inicio in range(0, len(rows), self.ROW_VALUES_BATCH):
+                lote = rows[inicio:inicio + self.ROW_VALUES_BATCH]
+                for db_row in self._conn.execute(
+                        f"SELECT fila, {self._select_columns(sheet_name)} FROM {table} "
+                        f"WHERE fila IN ({', '.join('?' * len(lote))})", lote):
+                    por_fila[db_row[0]] = self._row_values(sheet_name, db_row[1:])
+        vacia = (None,) * len(SHEET_HEADERS[sheet_name])
+        return [por_fila.get(row, vacia) for row in rows]
+
+    def replace_rows(self, sheet_name: str, rows: List[tuple]) -> int:
+        table, columns = self._table(sheet_name)
+        with self._lock:
+            current = {fila: values for fila, values in self.iter_records(sheet_name)}
+            nuevas = {FIRST_DATA_ROW + i: tuple(values) for i, values in enumerate(rows)}
+            cambios = 0
+            for fila in set(current) | set(nuevas):
+                antes = current.get(fila, (None,) * len(columns))
+                despues = nuevas.get(fila, (None,) * len(columns))
+                cambios += sum(1 for a, b in zip(antes, despues) if a != b)
+            if not cambios:
+                return 0
+
+            self._conn.execute(f"DELETE FROM {table}")
+            for fila, values in nuevas.items():
+                valores = self._to_db(columns, dict(zip(columns, values)))
+                self._conn.execute(
+                    f"INSERT INTO {table} (fila, {', '.join(valores)}) "
+                    f"VALUES (:fila, {', '.join(':' + c for c in valores)})",
+                    {**valores, 'fila': fila}
+                )
+            self.mark_dirty()
+        return cambios
+
+    def _headers(self, sheet_name: str) -> Tuple[str, List[str]]:
+        """Returns the stored title and headers of a sheet, or the defaults."""
+        with self._lock:
+            row = self._conn.execute("SELECT titulo, encabezados FROM hojas WHERE hoja = ?", (sheet_name,)).fetchone()
+        if row:
+            return row[0], json.loads(row[1])
+        return SHEET_TITLES[sheet_name], list(SHEET_HEADERS[sheet_name])
+
+    def get_headers(self, sheet_name: str) -> List[str]:
+        _, headers = self._headers(sheet_name)
+        return headers[:len(self._table(sheet_name)[1])]
+
+    def _storage_file(self) -> Optional[str]:
+        return self.archivo_db
+
+    def reload(self):
+        """Nothing is cached in memory; pending changes are discarded."""
+        self._rollback()
+
+    @metricas.medido('save')
+    def _commit(self):
+        with self._lock:
+            try:
+                self._conn.commit()
+                self._dirty = False
+                logger.info("Changes committed to SQLite.")
+            except Exception as e:
+                logger.error(f"Error committing to SQLite: {str(e)}")
+                self._rollback()
+                raise
+
+    def _rollback(self):
+        with self._lock:
+            self._conn.rollback()
+            self._dirty = False
+            self._data_replaced()
+
+    def close(self, timeout: Optional[float] = None):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    # --- Import / export of the three-sheet workbook ---
+    @metricas.medido('load')
+    def import_from_excel(self, archivo_excel: str):
+        """Replaces the database content with the three sheets of a workbook.
+        Values of columns A-K (A-F for control) are copied as they are, with their
+        original row numbers, titles and headers, so an export reproduces the sheets."""
+        wb = load_workbook(archivo_excel)
+        with self.transaction():
+            for sheet_name, (table, columns) in TABLES.items():
+                self._conn.execute(f"DELETE FROM {table}")
+                if sheet_name not in wb.sheetnames:
+                    continue
+                ws = wb[sheet_name]
+                n = len(columns)
+                titulo = ws.cell(row=1, column=1).value
+                encabezados = [ws.cell(row=2, column=c).value for c in range(1, n + 1)]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO hojas (hoja, titulo, encabezados) VALUES (?, ?, ?)",
+                    (sheet_name, titulo, json.dumps(encabezados, ensure_ascii=False, default=str))
+                )
+                total = 0
+                for fila, values in enumerate(
+                        ws.iter_rows(min_row=FIRST_DATA_ROW, max_col=n, values_only=True), start=FIRST_DATA_ROW):
+                    if all(v is None for v in values):
+                        continue
+                    valores = self._to_db(columns, dict(zip(columns, values)))
+                    self._conn.execute(
+                        f"INSERT INTO {table} (fila, {', '.join(valores)}) "
+                        f"VALUES (:fila, {', '.join(':' + c for c in valores)})",
+                        {**valores, 'fila': fila}
+                    )
+                    total += 1
+                logger.info(f"Imported {total} rows of '{sheet_name}' from {archivo_excel}.")
+            self.mark_dirty()
+
+    def export_to_excel(self, archivo_excel: str):
+        """Writes the database as the three-sheet workbook (title, headers, rows at
+        their original row numbers)."""
+        wb = Workbook()
+        if 'Sheet' in wb.sheetnames:
+            del wb['Sheet']
+        for sheet_name in TABLES:
+            ws = wb.create_sheet(sheet_name)
+            titulo, encabezados = self._headers(sheet_name)
+            ws['A1'] = titulo
+            for col_idx, header in enumerate(encabezados, start=1):
+                ws.cell(row=2, column=col_idx, value=header)
+            for fila, values in self.iter_records(sheet_name):
+                for col_idx, value in enumerate(values, start=1):
+                    if value is not None:
+                        ws.cell(row=fila, column=col_idx, value=value)
+        tmp_path = archivo_excel + '.tmp.xlsx'
+        wb.save(tmp_path)
+        os.replace(tmp_path, archivo_excel)
+        logger.info(f"SQLite data exported to {archivo_excel}.")
@@ -0,0 +1,133 @@
+import logging
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from almacen.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+# Columns searched by the query tab (those present in the sheet)
+COLUMNAS_BUSQUEDA = ['N° de parte', 'Nombre', 'Descripción', 'Almacén', 'Ubicación', 'Encargado']
+MIN_SUBCADENA = 3 # Shorter words only match the start of a word
+_SEPARADORES = re.compile(r'[\W_]+')
+
+
+def normalizar(texto) -> str:
+    """Search key: lower case, without accents, words separated by single spaces
+    ('Taladro Percutor 1/2"' -> 'taladro percutor 1 2')."""
+    texto = str(texto)
+    if not texto.isascii():
+        texto = unicodedata.normalize('NFKD', texto)
+        texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _SEPARADORES.sub(' ', texto.lower()).strip()
+
+
+def _tokens(valor) -> List[str]:
+    """Words of a cell; numbers are also indexed without leading zeros ('P-000123' -> p, 000123, 123)."""
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return []
+    tokens = normalizar(valor).split()
+    return tokens + [t.lstrip('0') for t in tokens if t[0] == '0' and t.isdigit() and t.lstrip('0')]
+
+
+# --- IndiceBusqueda Class ---
+class IndiceBusqueda:
+    """Inverted index of the words of a DataFrame, for the search box of the query tab.
+
+    Every distinct word of the searched columns goes into a sorted vocabulary; the row
+    positions of each word are stored contiguously in one array, in vocabulary order.
+    A word of the query matches every vocabulary word it starts, found with a binary
+    search, and whose rows are then a single slice of that array. Words of three or
+    more letters also match inside longer words (a scan of the vocabulary, not of the
+    rows). A row is a result when it matches every word of the query; the rows of each
+    word are combined as boolean masks, in time linear in the rows.
+
+    Consecutive queries reuse the rows of the words they share with the previous one,
+    so while the user types only the word being edited is looked up. The DataFrame is
+    not copied; the index is tied to that frame and must be rebuilt when it changes."""
+
+    def __init__(self, df: 'pd.DataFrame', columnas: Optional[List[str]] = None):
+        self.df = df
+        self.columnas = [c for c in (columnas or COLUMNAS_BUSQUEDA) if c in df.columns]
+        with metricas.span('indice_busqueda'):
+            self._construir()
+        self._palabras = {} # {query word: row mask} of the last query
+        self._previo = (frozenset(), None) # (all query words but the last, mask of the rows matching them all)
+        logger.info(f"Search index built: {len(df)} rows, {len(self.vocabulario)} words.")
+
+    def _construir(self):
+        """Builds the vocabulary and the row arrays. Cells are tokenized once per distinct
+        value of each column, and the (word, row) pairs expanded and sorted with numpy."""
+        n = len(self.df)
+        columnas = []
+        vocabulario = set()
+        for columna in self.columnas:
+            codigos, valores = pd.factorize(self.df[columna], use_na_sentinel=True)
+            tokens = [_tokens(v) for v in valores]
+            vocabulario.update(t for lista in tokens for t in lista)
+            columnas.append((codigos, tokens))
+
+        self.vocabulario = sorted(vocabulario)
+        ids = {token: i for i, token in enumerate(self.vocabulario)}
+        pares = []
+        for codigos, tokens in columnas:
+            # Words of each distinct value, flattened: value k owns plano[inicio[k]:inicio[k] + largo[k]]
+            largo = np.array([len(lista) for lista in tokens] + [0], dtype=np.int64)
+            inicio = np.concatenate(([0], np.cumsum(largo)[:-1]))
+            plano = np.array([ids[t] for lista in tokens for t in lista], dtype=np.int64)
+            codigos = np.where(codigos < 0, len(tokens), codigos) # Empty cells -> the [0] entry
+            largos = largo[codigos]
+            filas = np.repeat(np.arange(n, dtype=np.int64), largos)
+            desplazamiento = np.arange(len(filas), dtype=np.int64) - np.repeat(np.cumsum(largos) - largos, largos)
+            pares.append(plano[inicio[codigos].repeat(largos) + desplazamiento] * max(n, 1) + filas)
+
+        claves = np.sort(np.concatenate(pares)) if pares else np.empty(0, dtype=np.int64) # By word, then row
+        claves = claves[np.concatenate(([True], claves[1:] != claves[:-1]))] if len(claves) else claves
+        self._token_de_par = claves // max(n, 1)
+        self._filas = claves % max(n, 1)
+        self._inicio = np.searchsorted(self._token_de_par, np.arange(len(self.vocabulario) + 1))
+
+    def filas_de_palabra(self, palabra: str) -> np.ndarray:
+        """Boolean mask of the rows with a word that starts with (or, from three
+        letters, contains) `palabra`, already normalized."""
+        mascara = np.zeros(len(self.df), dtype=bool)
+        desde = bisect_left(self.vocabulario, palabra)
+        hasta = bisect_left(self.vocabulario, palabra + '\uffff', desde)
+        mascara[self._filas[self._inicio[desde]:self._inicio[hasta]]] = True
+        if len(palabra) >= MIN_SUBCADENA:
+            internas = [i for i, token in enumerate(self.vocabulario)
+                        if palabra in token and not token.startswith(palabra)]
+            if internas:
+                tokens = np.zeros(len(self.vocabulario), dtype=bool)
+                tokens[internas] = True
+                mascara[self._filas[tokens[self._token_de_par]]] = True
+        return mascara
+
+    def buscar(self, consulta: str) -> Optional[np.ndarray]:
+        """Sorted positions of the rows that match every word of `consulta`, or None
+        for an empty query (no filter)."""
+        palabras = list(dict.fromkeys(normalizar(consulta).split()))
+        if not palabras:
+            return None
+        with metricas.span('buscar'):
+            filas_palabras = {p: self._palabras.get(p) for p in palabras}
+            for palabra, filas in filas_palabras.items():
+                if filas is None:
+                    filas_palabras[palabra] = self.filas_de_palabra(palabra)
+            self._palabras = filas_palabras
+
+            # While typing only the last word changes: the rows of the others are kept
+            fijas = frozenset(palabras[:-1])
+            if self._previo[0] != fijas:
+                base = None
+                for palabra in fijas:
+                    base = filas_palabras[palabra] if base is None else base & filas_palabras[palabra]
+                self._previo = (fijas, base)
+            base = self._previo[1]
+            ultima = filas_palabras[palabras[-1]]
+            return np.flatnonzero(ultima if base is None else base & ultima)
@@ -0,0 +1,108 @@
+import logging
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from almacen.almacenamiento import SHEET_INGRESOS, SHEET_SALIDAS, StorageBackend
+from almacen.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+# Form fields filled from the latest Ingresos row of a known part, with their column
+CAMPOS_PARTE = {'Nombre': 'C', 'Descripción': 'D', 'Unidad': 'F', 'Almacén': 'H', 'Ubicación': 'I'}
+
+
+# --- CatalogoPartes Class ---
+class CatalogoPartes:
+    """Known parts of the Ingresos sheet, for the autocomplete and the part label of
+    the movement forms and for the scanner queue.
+
+    Keys are kept case-folded in a sorted list, so the parts starting with what the
+    user typed are one binary search away, and each part has a record with the form
+    fields of its latest ingreso and its ledger stock. Both are built from the sheets
+    once per storage replacement (load, rollback, merge of another station's save) and
+    then follow this process' movements, which MovimientoManager pushes through
+    registrar(). Lookups read the records without taking the storage lock, so typing
+    does not wait for a save in progress."""
+
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+        self._claves: List[Tuple[str, str]] = [] # Sorted (case-folded part, part as stored)
+        self._fichas: Dict[str, Dict] = {} # {part: CAMPOS_PARTE fields + 'stock'}, replaced on change
+        self._replacements = None # storage.replacements the records were built at
+        self._lock = threading.Lock() # Taken after the storage lock, never before
+
+    def _actualizar(self):
+        if self.storage.replacements == self._replacements:
+            return
+        with self.storage._lock, self._lock:
+            if self.storage.replacements != self._replacements:
+                self._reconstruir()
+
+    @metricas.medido('catalogo_partes')
+    def _reconstruir(self):
+        """Reads every part's latest ingreso and ledger stock from the sheets."""
+        storage = self.storage
+        partes, cantidades, *campos = storage.column_values(SHEET_INGRESOS, ['B', 'G'] + list(CAMPOS_PARTE.values()))
+        ultima, stock = {}, {} # {part: index of its latest ingreso}, {part: ledger stock}
+        for i, (parte, cantidad) in enumerate(zip(partes, cantidades)):
+            if parte is not None:
+                parte = str(parte).strip()
+                ultima[parte] = i
+                stock[parte] = stock.get(parte, 0) + (cantidad or 0)
+        for parte, cantidad in zip(*storage.column_values(SHEET_SALIDAS, ['B', 'G'])):
+            parte = None if parte is None else str(parte).strip()
+            if parte in stock:
+                stock[parte] -= cantidad or 0
+        fichas = {}
+        for parte, i in ultima.items():
+            ficha = {campo: valores[i] for campo, valores in zip(CAMPOS_PARTE, campos)}
+            ficha['stock'] = stock[parte]
+            fichas[parte] = ficha
+        self._fichas = fichas
+        self._claves = sorted((parte.casefold(), parte) for parte in fichas)
+        self._replacements = self.storage.replacements
+
+    def registrar(self, tipo: str, movimientos: List[Dict]):
+        """Adds movements just applied to the storage. Called inside the transaction
+        that applied them, so a rollback (which replaces the data) also discards them."""
+        with self._lock:
+            if self._replacements != self.storage.replacements:
+                return # Not built yet or out of date: the next lookup rebuilds from the sheets
+            for datos in movimientos:
+                parte = str(datos['N° de parte']).strip()
+                ficha = self._fichas.get(parte)
+                if tipo == 'ingreso':
+                    if ficha is None:
+                        insort(self._claves, (parte.casefold(), parte))
+                    nueva = {campo: datos.get(campo) for campo in CAMPOS_PARTE}
+                    nueva['stock'] = (ficha['stock'] if ficha else 0) + datos['Cantidad']
+                elif ficha is not None:
+                    nueva = {**ficha, 'stock': ficha['stock'] - datos['Cantidad']}
+                else:
+                    continue
+                self._fichas[parte] = nueva # A new record, so readers never see half an update
+
+    def sugerir(self, prefijo: str, limite: int = 10) -> List[str]:
+        """Up to `limite` part numbers starting with `prefijo` (ignoring case), in order."""
+        prefijo = str(prefijo).strip().casefold()
+        if not prefijo:
+            return []
+        with metricas.span('sugerir_partes'):
+            self._actualizar()
+            with self._lock:
+                desde = bisect_left(self._claves, (prefijo, ''))
+                return [parte for clave, parte in self._claves[desde:desde + limite] if clave.startswith(prefijo)]
+
+    def datos(self, parte: str) -> Optional[Dict]:
+        """Form fields of a known part (CAMPOS_PARTE) from its latest ingreso, plus
+        'disponible', the quantity a salida can take; None if the part has no ingreso."""
+        self._actualizar()
+        parte = str(parte).strip()
+        ficha = self._fichas.get(parte)
+        if ficha is None:
+            return None
+        datos = {campo: ficha[campo] for campo in CAMPOS_PARTE}
+        datos['disponible'] = max(0, ficha['stock'])
+        datos['N° de parte'] = parte
+        return datos
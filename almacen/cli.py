@@ -0,0 +1,320 @@
+"""Command line for the inventory, for batch and scheduled jobs without the GUI.
+
+    python -m almacen libro.xlsx ingreso --parte P-001 --cantidad 5 --nombre Taladro --unidad pza \
+        --almacen A1 --ubicacion E-3 --encargado Ana
+    python -m almacen libro.xlsx salida --parte P-001 --cantidad 2 --encargado Ana
+    python -m almacen libro.xlsx importar ingreso recepcion.csv --rechazos rechazos.csv
+    python -m almacen libro.xlsx nocturno --metodo ewma
+    python -m almacen libro.xlsx --backend sqlite verificar
+    python -m almacen libro.xlsx conciliar
+    python -m almacen libro.xlsx stock-al 2025-03-31 --parte P-001 --parte P-002
+    python -m almacen libro.xlsx movimientos salida --desde 2025-03-01 --hasta 2025-03-31
+    python -m almacen libro.xlsx consumo --desde 2025-03-01 --hasta 2025-03-31
+    python -m almacen libro.xlsx servir --puerto 8765
+    python -m almacen libro.xlsx --servidor 127.0.0.1:8765 reporte
+
+Exit status: 0 on success, 1 on error or rejected movement, 3 when `verificar` or
+`conciliar` find differences, 4 when `importar` rejected some rows (2 is argparse's usage error).
+"""
+import argparse
+import contextlib
+import json
+import logging
+import socket
+import sys
+
+from almacen.almacenamiento import SHEET_INGRESOS, SHEET_SALIDAS
+from almacen.catalogo import CAMPOS_PARTE
+from almacen.cliente import ClienteInventario
+from almacen.control import ControlInventarioManager
+from almacen.importacion import escribir_rechazos
+from almacen.inventario import Inventario
+from almacen.metricas import metricas
+from almacen.movimientos import CAMPOS_OPCIONALES
+
+logger = logging.getLogger(__name__)
+
+EXIT_ERROR = 1
+EXIT_DIFERENCIAS = 3
+EXIT_RECHAZOS = 4
+
+# PronosticoConsumo.METODOS, not imported here so the movement commands do not load pandas
+METODOS = ('promedio', 'ewma', 'estacional')
+
+# Form field of each movement option
+CAMPOS_MOVIMIENTO = {
+    'fecha': 'Fecha', 'parte': 'N° de parte', 'nombre': 'Nombre', 'descripcion': 'Descripción',
+    'unidad': 'Unidad', 'cantidad': 'Cantidad', 'almacen': 'Almacén', 'ubicacion': 'Ubicación',
+    'encargado': 'Encargado', 'comentarios': 'Comentarios',
+}
+
+
+def _datos_movimiento(inventario: Inventario, args) -> dict:
+    """The movement of the command options. Part fields left out (Nombre, Unidad...) are
+    taken from the part's latest ingreso, as the forms fill them in; a required field
+    still missing raises ValueError naming its option."""
+    datos = {campo: getattr(args, opcion) for opcion, campo in CAMPOS_MOVIMIENTO.items()}
+    conocida = inventario.datos_parte(args.parte)
+    for campo in CAMPOS_PARTE:
+        if datos[campo] is None and conocida:
+            datos[campo] = conocida[campo]
+    for opcion, campo in CAMPOS_MOVIMIENTO.items():
+        if campo not in CAMPOS_OPCIONALES and opcion != 'fecha' and not str(datos[campo] or "").strip():
+            raise ValueError(f"El campo '{campo}' es obligatorio (opción --{opcion}).")
+    return datos
+
+
+def _imprimir_json(valor):
+    print(json.dumps(valor, ensure_ascii=False, indent=2, default=str))
+
+
+def cmd_ingreso(inventario: Inventario, args) -> int:
+    inventario.registrar_ingreso(_datos_movimiento(inventario, args))
+    print(f"Ingreso registrado: {args.parte} x {args.cantidad}")
+    return 0
+
+
+def cmd_salida(inventario: Inventario, args) -> int:
+    inventario.registrar_salida(_datos_movimiento(inventario, args))
+    print(f"Salida registrada: {args.parte} x {args.cantidad}")
+    return 0
+
+
+def cmd_importar(inventario: Inventario, args) -> int:
+    resultado = inventario.importar(args.tipo, args.lista)
+    rechazos = resultado['rechazos']
+    print(f"{resultado['aplicados']} movimientos registrados, {len(rechazos)} filas rechazadas.")
+    if rechazos and args.rechazos:
+        escribir_rechazos(args.rechazos, rechazos)
+    elif rechazos:
+        for r in rechazos:
+            print(f"- Fila {r['fila']} ({r['parte']}): {r['motivo']}")
+    return EXIT_RECHAZOS if rechazos else 0
+
+
+def cmd_recalcular(inventario: Inventario, args) -> int:
+    cambios = inventario.recalcular()
+    print(f"Control de inventarios recalculado ({cambios} celdas cambiaron).")
+    return 0
+
+
+def cmd_verificar(inventario: Inventario, args) -> int:
+    diferencias = inventario.verificar()
+    if args.json:
+        _imprimir_json(diferencias)
+    elif not diferencias:
+        print("La hoja 'Control de inventarios' coincide con el recálculo completo.")
+    else:
+        print(f"Se encontraron {len(diferencias)} diferencias:")
+        for d in diferencias:
+            print(f"- {d['parte']} ({d['campo']}): esperado {d['esperado']}, actual {d['actual']}")
+    return EXIT_DIFERENCIAS if diferencias else 0
+
+
+def cmd_conciliar(inventario: Inventario, args) -> int:
+    resultado = inventario.conciliar()
+    diferencias = resultado['diferencias']
+    if args.json:
+        _imprimir_json(resultado)
+    elif not diferencias:
+        print(f"El stock de las {resultado['partes']} partes coincide con el registro de movimientos.")
+    else:
+        print(f"{len(diferencias)} de {resultado['partes']} partes no coinciden con el registro de movimientos:")
+        for d in diferencias:
+            print(f"- {d['parte']} ({d['motivo']}): según movimientos {d['derivado']}, mostrado {d['mostrado']}")
+    return EXIT_DIFERENCIAS if diferencias else 0
+
+
+def cmd_stock_al(inventario: Inventario, args) -> int:
+    stock = inventario.stock_al(args.fecha, args.parte)
+    if args.json:
+        _imprimir_json(stock)
+    elif not stock:
+        print(f"Ninguna parte tenía stock al {args.fecha}.")
+    else:
+        print(f"Stock al {args.fecha}:")
+        for parte, cantidad in sorted(stock.items()):
+            print(f"- {parte}: {cantidad}")
+    return 0
+
+
+def cmd_movimientos(inventario: Inventario, args) -> int:
+    hoja = SHEET_INGRESOS if args.tipo == 'ingreso' else SHEET_SALIDAS
+    df = inventario.movimientos_entre(hoja, args.desde, args.hasta)
+    if args.json:
+        _imprimir_json([dict(fila=int(fila), **valores) for fila, valores in zip(df.index, df.to_dict('records'))])
+    else:
+        for fila, valores in zip(df.index, df.itertuples(index=False)):
+            print(f"{fila}\t{valores[0]}\t{valores[1]}\t{valores[6]}\t{valores[9] or ''}")
+        print(f"{len(df)} movimientos.")
+    return 0
+
+
+def cmd_consumo(inventario: Inventario, args) -> int:
+    consumo = inventario.consumo_entre(args.desde, args.hasta)
+    if args.json:
+        _imprimir_json(consumo)
+    else:
+        for parte, cantidad in consumo.items():
+            print(f"- {parte}: {cantidad}")
+        print(f"{len(consumo)} partes con salidas.")
+    return 0
+
+
+def cmd_migrar(inventario: Inventario, args) -> int:
+    ajustes = inventario.migrar_libro_antiguo()
+    print(f"Libro convertido al registro de movimientos ({ajustes} ingresos de ajuste).")
+    return 0
+
+
+def cmd_predecir(inventario: Inventario, args) -> int:
+    cambios = inventario.predecir(args.dias, args.metodo)
+    print(f"Predicción de necesidades actualizada ({args.metodo}, {args.dias} días; {cambios} celdas cambiaron).")
+    return 0
+
+
+def cmd_reporte(inventario: Inventario, args) -> int:
+    reporte = inventario.reporte()
+    if args.json:
+        _imprimir_json(reporte)
+    else:
+        print(ControlInventarioManager.formatear_reporte(reporte))
+    return 0
+
+
+def cmd_nocturno(inventario: Inventario, args) -> int:
+    """Nightly job: full recomputation, forecast and report, saved once at the end
+    (through a server, each step is saved by its own request)."""
+    storage = getattr(inventario, 'storage', None)
+    with storage.transaction() if storage is not None else contextlib.nullcontext():
+        cmd_recalcular(inventario, args)
+        cmd_predecir(inventario, args)
+    return cmd_reporte(inventario, args)
+
+
+def cmd_servir(inventario: Inventario, args) -> int:
+    """Serves the inventory to the GUI and scripts until interrupted (Ctrl+C)."""
+    from almacen.servidor import ServidorInventario
+    servidor = ServidorInventario(inventario, args.host, args.puerto)
+    print(f"Servidor del inventario en {servidor.url} (Ctrl+C para detenerlo)")
+    try:
+        servidor.servir()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.cerrar(timeout=60)
+    return 0
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m almacen', description=__doc__.splitlines()[0])
+    parser.add_argument('archivo', help="Libro de Excel del inventario (con sqlite, la base se guarda junto a él; "
+                                              "no se usa con --servidor)")
+    parser.add_argument('--backend', default='xlsx', choices=['xlsx', 'sqlite'])
+    parser.add_argument('--log', default='almacen.log', help="Archivo de log ('-' para la salida de error)")
+    parser.add_argument('--estacion', help="Nombre de esta estación en el libro compartido "
+                                           "(por defecto <equipo>-cli, distinto del de la interfaz)")
+    parser.add_argument('--servidor', metavar='HOST:PUERTO',
+                        help="Trabajar contra un servidor del inventario en lugar de abrir el archivo")
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    for nombre, funcion, ayuda in (('ingreso', cmd_ingreso, "Registrar un ingreso"),
+                                   ('salida', cmd_salida, "Registrar una salida")):
+        sub = comandos.add_parser(nombre, help=ayuda)
+        sub.add_argument('--parte', required=True, help="N° de parte")
+        sub.add_argument('--cantidad', required=True, type=int)
+        # Required like in the forms, except the part fields of a known part (see _datos_movimiento)
+        sub.add_argument('--nombre')
+        sub.add_argument('--descripcion')
+        sub.add_argument('--unidad')
+        sub.add_argument('--almacen')
+        sub.add_argument('--ubicacion')
+        sub.add_argument('--encargado', required=True)
+        sub.add_argument('--comentarios')
+        sub.add_argument('--fecha', help="AAAA-MM-DD (hoy por defecto)")
+        sub.set_defaults(funcion=funcion)
+
+    sub = comandos.add_parser('importar', help="Registrar una lista CSV/xlsx de movimientos con un solo guardado")
+    sub.add_argument('tipo', choices=['ingreso', 'salida'])
+    sub.add_argument('lista', help="Archivo CSV o xlsx con una fila de encabezados (N° de parte, Cantidad...)")
+    sub.add_argument('--rechazos', help="CSV donde escribir las filas rechazadas (por defecto se imprimen)")
+    sub.set_defaults(funcion=cmd_importar)
+
+    comandos.add_parser('recalcular', help="Recalcular toda la hoja de control").set_defaults(funcion=cmd_recalcular)
+
+    sub = comandos.add_parser('verificar', help="Comparar la hoja de control con el recálculo, sin escribir")
+    sub.add_argument('--json', action='store_true')
+    sub.set_defaults(funcion=cmd_verificar)
+
+    sub = comandos.add_parser('conciliar', help="Comparar el stock mostrado con el derivado de todos los movimientos")
+    sub.add_argument('--json', action='store_true')
+    sub.set_defaults(funcion=cmd_conciliar)
+
+    sub = comandos.add_parser('stock-al', help="Stock de las partes al final de una fecha pasada")
+    sub.add_argument('fecha', help="AAAA-MM-DD")
+    sub.add_argument('--parte', action='append', help="Parte a consultar (se puede repetir; por defecto todas)")
+    sub.add_argument('--json', action='store_true')
+    sub.set_defaults(funcion=cmd_stock_al)
+
+    sub = comandos.add_parser('movimientos', help="Ingresos o salidas con fecha dentro de un rango")
+    sub.add_argument('tipo', choices=['ingreso', 'salida'])
+    sub.add_argument('--desde', help="AAAA-MM-DD (incluida; sin límite si se omite)")
+    sub.add_argument('--hasta', help="AAAA-MM-DD (incluida; sin límite si se omite)")
+    sub.add_argument('--json', action='store_true')
+    sub.set_defaults(funcion=cmd_movimientos)
+
+    sub = comandos.add_parser('consumo', help="Total de salidas de cada parte en un rango de fechas")
+    sub.add_argument('--desde', help="AAAA-MM-DD (incluida; sin límite si se omite)")
+    sub.add_argument('--hasta', help="AAAA-MM-DD (incluida; sin límite si se omite)")
+    sub.add_argument('--json', action='store_true')
+    sub.set_defaults(funcion=cmd_consumo)
+
+    comandos.add_parser('migrar', help="Convertir una sola vez un libro de la versión que descontaba las salidas "
+                                       "de los ingresos").set_defaults(funcion=cmd_migrar)
+
+    sub = comandos.add_parser('reporte', help="Reporte de estado del inventario")
+    sub.add_argument('--json', action='store_true')
+    sub.set_defaults(funcion=cmd_reporte)
+
+    for nombre, funcion, ayuda in (('predecir', cmd_predecir, "Predecir necesidades (mínimos, máximos y estado)"),
+                                   ('nocturno', cmd_nocturno, "Recalcular, predecir y generar el reporte")):
+        sub = comandos.add_parser(nombre, help=ayuda)
+        sub.add_argument('--dias', type=int, default=30, help="Días de historial de salidas")
+        sub.add_argument('--metodo', default='promedio', choices=METODOS)
+        if nombre == 'nocturno':
+            sub.add_argument('--json', action='store_true', help="Reporte en JSON")
+        sub.set_defaults(funcion=funcion)
+
+    sub = comandos.add_parser('servir', help="Servir el inventario por HTTP a la interfaz y a otros programas")
+    sub.add_argument('--host', default='127.0.0.1', help="Dirección de escucha (solo este equipo por defecto)")
+    sub.add_argument('--puerto', type=int, default=8765)
+    sub.set_defaults(funcion=cmd_servir)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = _parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        **({} if args.log == '-' else {'filename': args.log, 'filemode': 'a'})
+    )
+
+    try:
+        if args.servidor and args.comando == 'servir':
+            raise ValueError("'servir' abre el archivo; no se combina con --servidor.")
+        if args.servidor:
+            inventario = ClienteInventario(args.servidor)
+        else:
+            inventario = Inventario(args.archivo, args.backend, args.estacion or f"{socket.gethostname()}-cli")
+        with inventario:
+            return args.funcion(inventario, args)
+    except ValueError as e: # Rejected movement, same message as the forms
+        print(f"Rechazado: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    except Exception as e:
+        logger.error(f"Command '{args.comando}' failed: {str(e)}", exc_info=True)
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        metricas.log_resumen()
@@ -0,0 +1,224 @@
+"""Thin client of the inventory server (see almacen.servidor): the Inventario methods
+over HTTP/JSON, so the tabs and the CLI work the same against a shared server as
+against a workbook opened in the process (stdlib only).
+
+    python -m almacen libro.xlsx --servidor 127.0.0.1:8765 reporte
+    ALMACEN_SERVIDOR=127.0.0.1:8765 python main.py
+
+Movements, queries and maintenance are one request each; the form suggestions and
+the query tab use the batched routes (/partes/datos, /stock), and the registers are
+fetched again only when the server's data version changes.
+"""
+import http.client
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from almacen.importacion import leer_movimientos
+
+logger = logging.getLogger(__name__)
+
+# Seconds the server's generation, as carried by its last answer, is taken as current
+VIGENCIA_GENERACION_S = 1.0
+
+
+# --- ClienteInventario Class ---
+class ClienteInventario:
+    """Inventario of a running ServidorInventario: same methods, same errors.
+
+    Rejected movements raise ValueError with the server's message (the one the forms
+    show); an unreachable server raises ConnectionError. Each thread keeps one
+    keep-alive connection. DataFrames are cached by the server's data version, so an
+    unchanged sheet is not transferred again, and `generacion` is taken from the
+    X-Generacion header of the last answer instead of a request of its own.
+
+        with ClienteInventario('http://127.0.0.1:8765') as inventario:
+            inventario.registrar_salida({...})
+    """
+
+    def __init__(self, url: str, timeout: float = 60.0, timeout_conexion: float = 5.0):
+        partes = urlsplit(url if '//' in url else f"http://{url}")
+        self.url = f"http://{partes.hostname}:{partes.port or 80}"
+        self._host, self._puerto = partes.hostname, partes.port or 80
+        self.timeout = timeout
+        self.timeout_conexion = timeout_conexion # For the startup check (load_async)
+        self._generacion: Optional[Tuple[int, float]] = None # (server generation, time.monotonic() seen)
+        self._local = threading.local() # Connection of each thread
+        self._frames = {} # {sheet_name: (server version, DataFrame)}
+        self._frames_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # --- Transport ---
+    def _conexion(self, timeout: Optional[float] = None) -> http.client.HTTPConnection:
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = self._local.conexion = http.client.HTTPConnection(
+                self._host, self._puerto, timeout=timeout or self.timeout)
+        return conexion
+
+    def _solicitar(self, metodo: str, ruta: str, datos=None, consulta=None):
+        """Sends one request and returns the decoded JSON answer. A GET on a connection
+        dropped by the server is retried once on a new one; a movement is never resent,
+        since the server may have applied it."""
+        if consulta:
+            ruta = f"{ruta}?{urlencode(consulta, doseq=True)}"
+        cuerpo = json.dumps(datos, ensure_ascii=False, default=str).encode('utf-8') if datos is not None else None
+        encabezados = {'Content-Type': 'application/json; charset=utf-8'} if cuerpo else {}
+        for intento in (1, 2):
+            conexion = self._conexion()
+            try:
+                conexion.request(metodo, ruta, body=cuerpo, headers=encabezados)
+                respuesta = conexion.getresponse()
+                estado, contenido = respuesta.status, respuesta.read()
+                generacion = respuesta.getheader('X-Generacion')
+                if generacion is not None:
+                    self._generacion = (int(generacion), time.monotonic())
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                conexion.close()
+                self._local.conexion = None
+                if intento == 2 or metodo != 'GET':
+                    raise ConnectionError(f"Se perdió la conexión con el servidor {self.url}: {e}") from e
+            except OSError as e:
+                conexion.close()
+                self._local.conexion = None
+                raise ConnectionError(f"No se pudo conectar con el servidor {self.url}: {e}") from e
+
+        valor = json.loads(contenido) if contenido else {}
+        if estado == 400:
+            raise ValueError(valor.get('error'))
+        if estado != 200:
+            raise RuntimeError(f"Error del servidor ({estado}): {valor.get('error')}")
+        return valor
+
+    # --- Inventario interface ---
+    def load_async(self) -> Future:
+        """Checks on a background thread that the server answers; the Future fails with
+        ConnectionError if it does not within `timeout_conexion` seconds."""
+        future = Future()
+
+        def comprobar():
+            self._conexion(self.timeout_conexion) # This thread's connection, used once
+            try:
+                self.salud()
+                future.set_result(True)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self.close()
+
+        threading.Thread(target=comprobar, name='ClienteInventario.salud', daemon=True).start()
+        return future
+
+    def salud(self) -> Dict:
+        return self._solicitar('GET', '/salud')
+
+    def registrar_ingreso(self, datos: Dict):
+        self._solicitar('POST', '/movimientos', {'tipo': 'ingreso', 'datos': datos})
+
+    def registrar_salida(self, datos: Dict):
+        self._solicitar('POST', '/movimientos', {'tipo': 'salida', 'datos': datos})
+
+    def registrar_lote(self, tipo: str, movimientos: Iterable[Tuple[int, Dict]]) -> Dict:
+        return self._solicitar('POST', '/movimientos/lote', {'tipo': tipo, 'movimientos': list(movimientos)})
+
+    def importar(self, tipo: str, path: str) -> Dict:
+        """Reads the file here and sends its rows in one batch."""
+        return self.registrar_lote(tipo, leer_movimientos(path))
+
+    def stock(self, partes: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        return self._solicitar('POST', '/stock', {'partes': list(partes)})['stock']
+
+    def stock_al(self, fecha, partes: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        consulta = {'fecha': str(fecha)}
+        if partes is not None:
+            consulta['parte'] = list(partes)
+        return self._solicitar('GET', '/stock/fecha', consulta=consulta)['stock']
+
+    def sugerir_partes(self, prefijo: str, limite: int = 10) -> List[str]:
+        if not str(prefijo).strip():
+            return []
+        return self._solicitar('GET', '/partes', consulta={'prefijo': prefijo, 'limite': limite})['partes']
+
+    def datos_parte(self, parte: str) -> Optional[Dict]:
+        return self._solicitar('GET', '/partes/datos', consulta={'parte': parte})['datos']
+
+    def datos_partes(self, partes: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        return self._solicitar('POST', '/partes/datos', {'partes': list(partes)})['datos']
+
+    def read_dataframe(self, sheet_name: str):
+        """The sheet as a pandas DataFrame, transferred only when the data changed."""
+        with self._frames_lock:
+            cached = self._frames.get(sheet_name)
+        consulta = {'hoja': sheet_name}
+        if cached is not None:
+            consulta['version'] = cached[0]
+        respuesta = self._solicitar('GET', '/registros', consulta=consulta)
+        if respuesta.get('sin_cambios'):
+            return cached[1]
+
+        import pandas as pd
+        df = pd.DataFrame(respuesta['filas'], columns=respuesta['columnas'])
+        with self._frames_lock:
+            self._frames[sheet_name] = (respuesta['version'], df)
+        return df
+
+    def movimientos_entre(self, sheet_name: str, desde=None, hasta=None):
+        consulta = {'hoja': sheet_name}
+        consulta.update({clave: str(fecha) for clave, fecha in (('desde', desde), ('hasta', hasta)) if fecha})
+        respuesta = self._solicitar('GET', '/movimientos', consulta=consulta)
+
+        import pandas as pd
+        return pd.DataFrame(respuesta['filas'], columns=respuesta['columnas'],
+                            index=pd.Index(respuesta['indice'], name='fila'))
+
+    def consumo_entre(self, desde=None, hasta=None) -> Dict[str, int]:
+        consulta = {clave: str(fecha) for clave, fecha in (('desde', desde), ('hasta', hasta)) if fecha}
+        return self._solicitar('GET', '/consumo', consulta=consulta)['consumo']
+
+    @property
+    def generacion(self) -> int:
+        """The server's generation from the last answer, if at most
+        VIGENCIA_GENERACION_S old; otherwise asked with /salud."""
+        ultima = self._generacion
+        if ultima is not None and time.monotonic() - ultima[1] <= VIGENCIA_GENERACION_S:
+            return ultima[0]
+        return self.salud()['generacion']
+
+    def recalcular(self) -> int:
+        return self._solicitar('POST', '/recalcular', {})['cambios']
+
+    def verificar(self) -> List[Dict]:
+        return self._solicitar('GET', '/verificar')['diferencias']
+
+    def conciliar(self) -> Dict:
+        return self._solicitar('GET', '/conciliar')
+
+    def migrar_libro_antiguo(self) -> int:
+        return self._solicitar('POST', '/migrar', {})['ajustes']
+
+    def predecir(self, dias_historial: int = 30, metodo: str = 'promedio') -> int:
+        return self._solicitar('POST', '/predecir', {'dias': dias_historial, 'metodo': metodo})['cambios']
+
+    def reporte(self) -> Dict:
+        return self._solicitar('GET', '/reporte')['reporte']
+
+    def metricas(self) -> Dict:
+        """Operation timings of the server process."""
+        return self._solicitar('GET', '/metricas')
+
+    def close(self, timeout=None):
+        """Closes this thread's connection; the server keeps running."""
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is not None:
+            conexion.close()
+            self._local.conexion = None
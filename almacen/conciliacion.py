@@ -0,0 +1,145 @@
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from almacen.almacenamiento import SHEET_CONTROL, SHEET_INGRESOS, SHEET_SALIDAS, StorageBackend
+from almacen.catalogo import CAMPOS_PARTE, CatalogoPartes
+from almacen.control import ControlInventarioManager
+from almacen.metricas import metricas
+from almacen.movimientos import MovimientoManager
+
+logger = logging.getLogger(__name__)
+
+# Encargado of the income rows written by migrar_libro_antiguo
+ENCARGADO_MIGRACION = "Migración a libro mayor"
+
+
+def _cantidades_por_fila(storage: StorageBackend, sheet_name: str, columna_parte: str,
+                         columna_cantidad: str) -> 'pd.Series':
+    """Quantity of every row of a sheet that has a part number, indexed by the stripped
+    part number (one entry per row, in row order). Non-numeric quantities count as 0."""
+    partes, cantidades = storage.column_values(sheet_name, [columna_parte, columna_cantidad])
+    partes = pd.Series(partes, dtype=object)
+    con_parte = partes.notna().to_numpy()
+    partes = partes[con_parte].astype(str).str.strip().to_numpy()
+    cantidades = pd.to_numeric(pd.Series(cantidades, dtype=object)[con_parte], errors='coerce').fillna(0).to_numpy()
+    con_parte = partes != ""
+    return pd.Series(cantidades[con_parte], index=partes[con_parte])
+
+
+def totales_por_parte(storage: StorageBackend, sheet_name: str) -> 'pd.Series':
+    """Sum of the quantities (column G) of every part of a movement sheet, indexed by
+    the stripped part number. Quantities are summed per distinct cell value with
+    bincount, so only the distinct part numbers are converted and stripped."""
+    partes, cantidades = storage.column_values(sheet_name, ['B', 'G'])
+    codigos, unicos = pd.factorize(pd.Series(partes, dtype=object)) # -1 for empty cells
+    cantidades = pd.to_numeric(pd.Series(cantidades, dtype=object), errors='coerce').fillna(0).to_numpy()
+    con_parte = codigos >= 0
+    sumas = np.bincount(codigos[con_parte], weights=cantidades[con_parte], minlength=len(unicos))
+    totales = pd.Series(sumas, index=pd.Index(unicos, dtype=object).astype(str).str.strip())
+    totales = totales.groupby(level=0, sort=False).sum() # 'P-1' and 'P-1 ' are the same part
+    return totales[totales.index != ""]
+
+
+# --- ConciliacionStock Class ---
+class ConciliacionStock:
+    """Audit of the control sheet against the movement ledger.
+
+    The whole ledger is replayed in one columnar pass: both movement sheets are read
+    once, summed per part with a pandas groupby and subtracted, and the result is
+    compared with the stock shown in 'Control de inventarios' as whole arrays. No part
+    is looked up on its own, so a million movements take seconds."""
+
+    def __init__(self, storage: StorageBackend, catalogo: Optional[CatalogoPartes] = None):
+        self.storage = storage
+        self.catalogo = catalogo # Told about the incomes appended by migrar_libro_antiguo
+
+    def totales(self) -> 'pd.DataFrame':
+        """Per part: 'ingresos', 'salidas', 'derivado' (ingresos - salidas) and 'mostrado'
+        (Stock actual of its control row, NaN without one), for every part that has
+        movements or a control row."""
+        with self.storage._lock:
+            ingresos = totales_por_parte(self.storage, SHEET_INGRESOS)
+            salidas = totales_por_parte(self.storage, SHEET_SALIDAS)
+            control = _cantidades_por_fila(self.storage, SHEET_CONTROL, 'A', 'C')
+        mostrado = control[~control.index.duplicated()] # The first row, as find_part
+
+        partes = ingresos.index.union(salidas.index).union(mostrado.index)
+        tabla = pd.DataFrame({
+            'ingresos': ingresos.reindex(partes, fill_value=0),
+            'salidas': salidas.reindex(partes, fill_value=0),
+            'mostrado': mostrado.reindex(partes),
+        })
+        tabla['derivado'] = tabla['ingresos'] - tabla['salidas']
+        return tabla
+
+    @metricas.medido('conciliar')
+    def conciliar(self) -> Dict:
+        """Parts whose stock derived from the ledger differs from the displayed one.
+
+        The control sheet shows the derived stock with a floor at 0, and only for parts
+        with ingresos. Returns {'partes', 'diferencias': [{'parte', 'derivado', 'mostrado',
+        'motivo'}]}, the differences sorted by part; 'motivo' is one of 'diferencia',
+        'sin fila de control', 'sin movimientos' and 'stock negativo' (more salidas than
+        ingresos, a ledger that needs correcting even if the sheet shows 0)."""
+        tabla = self.totales()
+        derivado = tabla['derivado'].to_numpy(dtype=float)
+        mostrado = tabla['mostrado'].to_numpy(dtype=float)
+        con_ingresos = tabla['ingresos'].to_numpy() != 0
+        sin_control = np.isnan(mostrado)
+        sin_movimientos = ~sin_control & (tabla['ingresos'].to_numpy() == 0) & (tabla['salidas'].to_numpy() == 0)
+
+        motivos = np.select(
+            [derivado < 0, sin_movimientos, sin_control & con_ingresos,
+             ~sin_control & (mostrado != np.maximum(derivado, 0))],
+            ['stock negativo', 'sin movimientos', 'sin fila de control', 'diferencia'],
+            default=''
+        )
+        marcadas = np.flatnonzero(motivos != '')
+        diferencias = [
+            {'parte': parte, 'derivado': int(derivado[i]),
+             'mostrado': None if sin_control[i] else int(mostrado[i]), 'motivo': str(motivos[i])}
+            for parte, i in zip(tabla.index[marcadas], marcadas)
+        ]
+        diferencias.sort(key=lambda d: d['parte'])
+        logger.info(f"Ledger reconciliation of {len(tabla)} parts found {len(diferencias)} differences.")
+        return {'partes': len(tabla), 'diferencias': diferencias}
+
+    def migrar_libro_antiguo(self) -> int:
+        """Converts a workbook written before the ledger, where every salida was also
+        deducted from the single Ingresos row of its part, so that the stock shown by the
+        old version is kept. For each part with salidas an income equal to them is
+        appended (Encargado ENCARGADO_MIGRACION), then the control sheet is rebuilt.
+        Runs once: raises ValueError if the workbook already holds those rows.
+        Returns the number of incomes appended."""
+        em = self.storage
+        with em.transaction():
+            if any(encargado == ENCARGADO_MIGRACION for (encargado,) in em.iter_values(SHEET_INGRESOS, ['J'])):
+                raise ValueError("El libro ya fue migrado al libro mayor.")
+            tabla = self.totales()
+            ajustes = tabla[(tabla['ingresos'] != 0) & (tabla['salidas'] > 0)]
+            hoy = datetime.now().strftime("%Y-%m-%d")
+            movimientos = []
+            for parte, salidas in ajustes['salidas'].items():
+                fila = em.find_part_rows(SHEET_INGRESOS, parte)[-1]
+                datos = {campo: em.get_cell_value(SHEET_INGRESOS, fila, columna) for campo, columna in CAMPOS_PARTE.items()}
+                datos.update({
+                    'Fecha': hoy, 'N° de parte': parte, 'Cantidad': int(salidas), 'Encargado': ENCARGADO_MIGRACION,
+                    'Comentarios': "Salidas ya descontadas de este ingreso por la versión anterior",
+                })
+                movimientos.append(datos)
+
+            if movimientos:
+                seq = em.journal_movements('ingreso', movimientos)
+                manager = MovimientoManager(em)
+                for datos in movimientos:
+                    manager.aplicar('ingreso', datos, actualizar_control=False)
+                em.journal_applied(seq)
+                if self.catalogo is not None:
+                    self.catalogo.registrar('ingreso', movimientos)
+            ControlInventarioManager(em).actualizar_inventario()
+        logger.info(f"Workbook migrated to the ledger: {len(movimientos)} adjustment incomes appended.")
+        return len(movimientos)
@@ -0,0 +1,353 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from almacen.almacenamiento import StorageBackend
+from almacen.metricas import metricas
+
+if TYPE_CHECKING: # pandas is imported on first use (forecasting), not at startup
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# --- ControlInventarioManager Class ---
+class ControlInventarioManager:
+    """Handler for advanced inventory control: recomputation of the control sheet,
+    consistency check, forecasting and reporting. Errors are logged and raised.
+
+    The Ingresos and Salidas sheets are the ledger: rows are only ever appended, and
+    the stock of a part is the sum of its ingresos minus the sum of its salidas. The
+    control sheet is derived from them and can always be rebuilt."""
+
+    def __init__(self, excel_manager: StorageBackend):
+        self.excel_manager = excel_manager
+        self.umbral_alerta = 0.2  # 20% below minimum to alert
+
+    def _calcular_inventario(self) -> Dict[str, Dict]:
+        """Aggregates income and outcome into the expected control row of every part.
+        Returns {part_number: {'nombre', 'stock_actual', 'min', 'max', 'estado'}}."""
+        em = self.excel_manager
+
+        # Create a dictionary to hold the aggregated stock and initial info for each part
+        inventario_temp = {} # {part_number: {'nombre': '', 'stock_actual': 0}}
+
+        # Aggregate stock from 'Ingresos de almacén' (columns B 'N° de parte', C 'Nombre', G 'Cantidad')
+        for part, nombre, cantidad in em.iter_values('Ingresos de almacén', ['B', 'C', 'G']):
+            if part:
+                part = str(part).strip()
+                nombre = nombre or ""
+                cantidad = cantidad or 0
+
+                if part not in inventario_temp:
+                    inventario_temp[part] = {'nombre': nombre, 'stock_actual': 0}
+                inventario_temp[part]['stock_actual'] += cantidad
+                # Update name in case it's more complete in a later entry
+                if nombre:
+                    inventario_temp[part]['nombre'] = nombre
+
+        # Deduct stock from 'Salidas de almacén' (columns B 'N° de parte', G 'Cantidad')
+        for part, cantidad in em.iter_values('Salidas de almacén', ['B', 'G']):
+            if part:
+                part = str(part).strip()
+                cantidad = cantidad or 0
+                if part in inventario_temp:
+                    inventario_temp[part]['stock_actual'] -= cantidad
+                else:
+                    logger.warning(f"Part '{part}' found in 'Salidas' but not in 'Ingresos'. Skipping deduction for inventory control.")
+
+        # Read existing min/max values from 'Control de inventarios'
+        # (columns A 'N° de parte', D 'Stock mínimo', E 'Stock máximo')
+        existing_control_data = {} # {part_number: {'min': value, 'max': value}}
+        for part, min_val, max_val in em.iter_values('Control de inventarios', ['A', 'D', 'E']):
+            if part:
+                part = str(part).strip()
+                existing_control_data[part] = {'min': min_val or 0, 'max': max_val or 0}
+
+        inventario = {}
+        for part, data in inventario_temp.items():
+            existing = existing_control_data.get(part, {})
+            inventario[part] = self._calcular_fila_control(
+                data['nombre'], data['stock_actual'], existing.get('min', 0), existing.get('max', 0))
+        return inventario
+
+    def _calcular_fila_control(self, nombre, stock_actual: int, stock_minimo: int, stock_maximo: int) -> Dict:
+        """Applies the stock floor, the min/max defaults and the status to one control row."""
+        stock_actual = max(0, stock_actual) # Ensure stock doesn't go below 0
+
+        # If min/max are still 0 (i.e., not set manually or found in existing data), apply defaults
+        if stock_minimo == 0 and stock_actual > 0: # Only calculate if stock exists
+            stock_minimo = max(int(stock_actual * 0.3), 1) # 30% of current stock as minimum
+        if stock_maximo == 0 and stock_actual > 0: # Only calculate if stock exists
+            stock_maximo = max(int(stock_actual * 2), stock_minimo + 1) # Double current stock as maximum
+
+        # If stock is 0 and no min/max exists, min/max stay at 0 to avoid large default numbers
+        return {
+            'nombre': nombre,
+            'stock_actual': stock_actual,
+            'min': stock_minimo,
+            'max': stock_maximo,
+            'estado': self.determinar_estado(stock_actual, stock_minimo, stock_maximo)
+        }
+
+    @metricas.medido('actualizar_inventario')
+    def actualizar_inventario(self) -> int:
+        """Recomputes the whole 'Control de Inventarios' sheet from income and outcome.
+        This is the explicit "recompute all" action; single movements use actualizar_parte.
+        Returns the number of cells that changed."""
+        try:
+            with self.excel_manager.transaction():
+                inventario = self._calcular_inventario()
+
+                # Rows (columns A to F) as they must look after the rebuild. Only cells whose
+                # value changes are written, so an identical rebuild does not need a save
+                filas_nuevas = [
+                    (part, data['nombre'], data['stock_actual'], data['min'], data['max'], data['estado'])
+                    for part, data in inventario.items()
+                ]
+                cambios = self.excel_manager.replace_rows('Control de inventarios', filas_nuevas)
+            logger.info(f"Control de inventario updated successfully ({cambios} cells changed).")
+            return cambios
+
+        except Exception as e:
+            logger.error(f"Error updating inventory: {str(e)}", exc_info=True)
+            raise
+
+    def _totales_parte(self, part: str) -> Optional[Tuple[str, int]]:
+        """Name (from its latest income naming it) and ledger stock of one part, read
+        through the part index; None if the part has no income rows."""
+        em = self.excel_manager
+        filas_ingreso = em.find_part_rows('Ingresos de almacén', part)
+        if not filas_ingreso:
+            return None
+        nombre = ""
+        stock = 0
+        for row in filas_ingreso:
+            nombre = em.get_cell_value('Ingresos de almacén', row, 'C') or nombre
+            stock += em.get_cell_value('Ingresos de almacén', row, 'G') or 0
+        for row in em.find_part_rows('Salidas de almacén', part):
+            stock -= em.get_cell_value('Salidas de almacén', row, 'G') or 0
+        return nombre, stock
+
+    def stock_parte(self, part_number: str) -> Optional[int]:
+        """Stock of a part derived from the ledger (its ingresos minus its salidas),
+        the quantity a salida can take; None if the part has no income."""
+        totales = self._totales_parte(str(part_number).strip())
+        return None if totales is None else totales[1]
+
+    @metricas.medido('actualizar_parte')
+    def actualizar_parte(self, part_number: str):
+        """Updates only the control row of one part after an income or outcome.
+        Reads the part's rows through the part index instead of re-aggregating every sheet."""
+        try:
+            em = self.excel_manager
+            part = str(part_number).strip()
+
+            totales = self._totales_parte(part)
+            if totales is None:
+                # Same as the full rebuild: parts without income have no control row
+                logger.warning(f"Part '{part}' has no income rows. Control row not updated.")
+                return
+            nombre, stock_actual = totales
+
+            fila_control = em.find_part('Control de inventarios', part)
+            stock_minimo = stock_maximo = 0
+            if fila_control:
+                stock_minimo = em.get_cell_value('Control de inventarios', fila_control, 'D') or 0
+                stock_maximo = em.get_cell_value('Control de inventarios', fila_control, 'E') or 0
+
+            data = self._calcular_fila_control(nombre, stock_actual, stock_minimo, stock_maximo)
+            registro = {
+                'N° de parte': part, 'Nombre': data['nombre'], 'Stock actual': data['stock_actual'],
+                'Stock mínimo': data['min'], 'Stock máximo': data['max'], 'Estado': data['estado']
+            }
+            if fila_control:
+                for campo, valor in registro.items():
+                    if campo != 'N° de parte':
+                        em.update_cell('Control de inventarios', fila_control,
+                                       em.column_mapping['Control de inventarios'][campo], valor)
+            else:
+                fila_control = em.append_row('Control de inventarios', registro)
+            logger.info(f"Control row {fila_control} updated for part {part}. Stock: {data['stock_actual']}")
+
+        except Exception as e:
+            logger.error(f"Error updating inventory for part '{part_number}': {str(e)}", exc_info=True)
+            raise
+
+    @metricas.medido('verificar_consistencia')
+    def verificar_consistencia(self) -> List[Dict]:
+        """Compares the control sheet against a full recomputation without writing anything.
+        Returns the differences as [{'parte', 'campo', 'esperado', 'actual'}]; empty if consistent."""
+        em = self.excel_manager
+        esperado = self._calcular_inventario()
+
+        actual = {}
+        for row in em.iter_values('Control de inventarios'):
+            if row[0]:
+                actual[str(row[0]).strip()] = {
+                    'nombre': row[1] or "", 'stock_actual': row[2] or 0,
+                    'min': row[3] or 0, 'max': row[4] or 0, 'estado': row[5] or ""
+                }
+
+        diferencias = []
+        for part in sorted(set(esperado) | set(actual)):
+            for campo in ('nombre', 'stock_actual', 'min', 'max', 'estado'):
+                valor_esperado = esperado.get(part, {}).get(campo)
+                valor_actual = actual.get(part, {}).get(campo)
+                if valor_esperado != valor_actual:
+                    diferencias.append({'parte': part, 'campo': campo,
+                                        'esperado': valor_esperado, 'actual': valor_actual})
+        logger.info(f"Consistency check found {len(diferencias)} differences in 'Control de inventarios'.")
+        return diferencias
+
+    def determinar_estado(self, actual: int, minimo: int, maximo: int) -> str:
+        """Determines the inventory status with advanced logic."""
+        if actual <= 0:
+            return "🔴 AGOTADO - Sin stock disponible"
+        elif actual <= minimo * (1 + self.umbral_alerta): # Below min + 20% threshold
+            return "🟠 ALERTA - Stock por debajo del mínimo"
+        elif actual <= minimo * 1.5: # 1.5 times min
+            return "🟡 ADVERTENCIA - Stock próximo al mínimo"
+        elif actual >= maximo * 0.9 and maximo > 0: # Nearing max stock, and max is set
+            return "🟢 COMPLETO - Stock máximo alcanzado"
+        else:
+            return "⚪ NORMAL - Stock dentro de rangos"
+
+    def predecir_necesidades(self, dias_historial: int = 30, metodo: str = 'promedio', historial=None) -> int:
+        """Predicts inventory needs based on historical data, for every part at once.
+        `metodo` is one of PronosticoConsumo.METODOS ('promedio', 'ewma', 'estacional').
+        With a HistorialStock, only the Salidas of the period are read, through its
+        date index; otherwise the whole sheet is parsed. Returns the number of control
+        cells that changed."""
+        from almacen.pronostico import PronosticoConsumo # Imports pandas on first use
+        try:
+            em = self.excel_manager
+            with metricas.span('predecir'), em.transaction():
+                df_control = em.read_dataframe('Control de inventarios')
+                modelo = PronosticoConsumo(dias_historial, metodo)
+                if historial is None:
+                    pronostico = modelo.calcular(em.read_dataframe('Salidas de almacén'), df_control)
+                else:
+                    ahora = datetime.now()
+                    pronostico = modelo.calcular_periodo(
+                        historial.salidas_desde(modelo.fecha_limite(ahora)), df_control, ahora
+                    )
+                filas = self._aplicar_pronostico(df_control, pronostico)
+                # Bulk write-back: only the cells whose value changes are touched
+                cambios = em.replace_rows('Control de inventarios', filas)
+            logger.info(f"Prediction of needs completed for {dias_historial} days ({metodo}).")
+            return cambios
+
+        except Exception as e:
+            logger.error(f"Error in predecir_necesidades: {str(e)}", exc_info=True)
+            raise
+
+    def _aplicar_pronostico(self, df_control: 'pd.DataFrame', pronostico: 'pd.DataFrame') -> List[tuple]:
+        """Returns the control rows (columns A to F) with the suggested min/max and the
+        predicted status. Min/max only change when they are 0 or the suggestion is higher;
+        parts without consumption get their status re-evaluated with the current min/max."""
+        import numpy as np
+        import pandas as pd
+        valores = df_control.iloc[:, :6].astype(object)
+        actual_min = pd.to_numeric(valores.iloc[:, 3], errors='coerce').fillna(0)
+        actual_max = pd.to_numeric(valores.iloc[:, 4], errors='coerce').fillna(0)
+
+        con_parte = pronostico['parte'].notna() & (pronostico['parte'] != "")
+        con_consumo = con_parte & (pronostico['consumo_diario'] > 0)
+        nuevo_min = con_consumo & ((actual_min == 0) | (pronostico['min_sugerido'] > actual_min))
+        nuevo_max = con_consumo & ((actual_max == 0) | (pronostico['max_sugerido'] > actual_max))
+        valores.iloc[:, 3] = valores.iloc[:, 3].where(~nuevo_min, pronostico['min_sugerido'])
+        valores.iloc[:, 4] = valores.iloc[:, 4].where(~nuevo_max, pronostico['max_sugerido'])
+
+        # Status with prediction for the parts with consumption
+        dias = pronostico['dias_restantes'].where(con_consumo, 0).clip(upper=1e9).astype(int).astype(str)
+        estado_prediccion = np.select(
+            [pronostico['dias_restantes'] < 7, pronostico['dias_restantes'] < 15],
+            ["🔴 URGENTE - Solo " + dias + " días de stock", "🟠 ALERTA - " + dias + " días de stock"],
+            default="🟢 SUFICIENTE"
+        )
+        estados = valores.iloc[:, 5].copy()
+        estados[con_consumo] = estado_prediccion[con_consumo.to_numpy()]
+
+        # Parts without consumption in the period: status from the existing min/max
+        sin_consumo = con_parte & ~con_consumo
+        estados[sin_consumo] = [
+            self.determinar_estado(stock, minimo, maximo)
+            for stock, minimo, maximo in zip(
+                pronostico['stock'][sin_consumo], actual_min[sin_consumo], actual_max[sin_consumo]
+            )
+        ]
+        valores.iloc[:, 5] = estados
+
+        # Native Python values, so every backend can store them (sqlite3 rejects numpy types)
+        filas = valores.where(valores.notna(), None)
+        return [
+            tuple(v.item() if isinstance(v, np.generic) else v for v in fila)
+            for fila in filas.itertuples(index=False, name=None)
+        ]
+
+    def generar_reporte(self) -> Dict:
+        """Generates a complete inventory status report (see formatear_reporte for its text)."""
+        try:
+            reporte = {
+                "total_items": 0,
+                "agotados": 0,
+                "alertas": 0,
+                "advertencias": 0,
+                "sugerencias_reabastecimiento": []
+            }
+
+            with metricas.span('generar_reporte'):
+                for values in self.excel_manager.iter_values('Control de inventarios'):
+                    part = values[0]
+                    if not part:
+                        continue
+
+                    reporte["total_items"] += 1
+                    estado = values[5] or ""
+
+                    if "AGOTADO" in estado or "URGENTE" in estado:
+                        reporte["agotados"] += 1
+                    elif "ALERTA" in estado:
+                        reporte["alertas"] += 1
+                    elif "ADVERTENCIA" in estado:
+                        reporte["advertencias"] += 1
+
+                    stock_actual = values[2] or 0
+                    stock_minimo = values[3] or 0
+
+                    if stock_actual < stock_minimo:
+                        reporte["sugerencias_reabastecimiento"].append({
+                            "parte": part,
+                            "nombre": values[1],
+                            "actual": stock_actual,
+                            "minimo": stock_minimo,
+                            "cantidad_sugerida": max(stock_minimo - stock_actual + 1, 1) # Suggest to reach at least min + 1
+                        })
+
+            logger.info("Inventory report generated.")
+            return reporte
+
+        except Exception as e:
+            logger.error(f"Error generating report: {str(e)}", exc_info=True)
+            raise
+
+    @staticmethod
+    def formatear_reporte(reporte: Dict) -> str:
+        """Text of a report returned by generar_reporte, as shown to the user."""
+        report_str = f"""--- Reporte de Inventario ---
+Total de ítems: {reporte['total_items']}
+Ítems agotados/urgentes: {reporte['agotados']}
+Ítems en alerta: {reporte['alertas']}
+Ítems en advertencia: {reporte['advertencias']}
+
+Sugerencias de Reabastecimiento:
+"""
+        if reporte["sugerencias_reabastecimiento"]:
+            for item in reporte["sugerencias_reabastecimiento"]:
+                report_str += (f"- N° Parte: {item['parte']}, Nombre: {item['nombre']}, "
+                               f"Actual: {item['actual']}, Mínimo: {item['minimo']}, "
+                               f"Sugerido: {item['cantidad_sugerida']}\n")
+        else:
+            report_str += "Ninguna sugerencia de reabastecimiento en este momento."
+        return report_str
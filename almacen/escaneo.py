@@ -0,0 +1,111 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from almacen.catalogo import CAMPOS_PARTE
+from almacen.movimientos import entero_positivo
+
+logger = logging.getLogger(__name__)
+
+ESCANEOS_POR_LOTE = 20 # A batch is recorded after this many scans...
+ESPERA_MAXIMA_S = 5.0 # ...or this many seconds after its first scan
+
+
+def leer_escaneo(texto: str, cantidad=1) -> Tuple[str, int]:
+    """Splits what a scanner (or the operator) typed into part number and quantity.
+    'P-001*5' means 5 units; otherwise `cantidad` is used."""
+    texto = str(texto).strip()
+    if '*' in texto:
+        texto, multiplicador = texto.rsplit('*', 1)
+        cantidad = multiplicador.strip()
+    parte = texto.strip()
+    if not parte:
+        raise ValueError("El campo 'N° de parte' es obligatorio.")
+    return parte, entero_positivo("Cantidad", cantidad)
+
+
+# --- ColaEscaneos Class ---
+class ColaEscaneos:
+    """Pending scans of one movement type, recorded in batches.
+
+    Scans of the same part are merged into one movement. The queue is due when it
+    holds `max_escaneos` scans or its first scan is `max_espera` seconds old; the
+    caller then records it with confirmar(), which goes through registrar_lote: one
+    journal write, one transaction, one control update per part and one save for the
+    whole batch. Works with an Inventario or a ClienteInventario."""
+
+    def __init__(self, inventario, tipo: str, max_escaneos: int = ESCANEOS_POR_LOTE,
+                 max_espera: float = ESPERA_MAXIMA_S):
+        if tipo not in ('ingreso', 'salida'):
+            raise ValueError(f"Tipo de movimiento desconocido: {tipo}")
+        self.inventario = inventario
+        self.tipo = tipo
+        self.max_escaneos = max_escaneos
+        self.max_espera = max_espera
+        self._pendientes: 'OrderedDict[str, int]' = OrderedDict() # {part: merged quantity}, in scan order
+        self.escaneos = 0 # Scans since the last batch
+        self._primero: Optional[float] = None # time.monotonic() of the first pending scan
+        self._reintento: Optional[float] = None # After a failed batch, not due again before this time
+
+    def escanear(self, parte: str, cantidad: int = 1) -> bool:
+        """Queues a scan; returns True when the queue is due."""
+        parte = str(parte).strip()
+        self._pendientes[parte] = self._pendientes.get(parte, 0) + cantidad
+        self.escaneos += 1
+        if self._primero is None:
+            self._primero = time.monotonic()
+        return self.vencida()
+
+    @property
+    def pendientes(self) -> List[Tuple[str, int]]:
+        return list(self._pendientes.items())
+
+    def segundos_restantes(self) -> Optional[float]:
+        """Seconds until the queue is due by time, or None when it is empty."""
+        if self._primero is None:
+            return None
+        return max(0.0, self.max_espera - (time.monotonic() - self._primero))
+
+    def vencida(self) -> bool:
+        if not self._pendientes or (self._reintento is not None and time.monotonic() < self._reintento):
+            return False
+        return self.escaneos >= self.max_escaneos or self.segundos_restantes() == 0
+
+    def descartar(self):
+        self._pendientes.clear()
+        self.escaneos = 0
+        self._primero = None
+        self._reintento = None
+
+    def confirmar(self, plantilla: Optional[Dict] = None) -> Optional[Dict]:
+        """Records the pending movements and empties the queue; None if it was empty.
+
+        Each movement takes the fields of its part from the catalog (Nombre,
+        Descripción, Unidad, Almacén, Ubicación), read for the whole batch with one
+        datos_partes call that does not wait for a save in progress, and the rest from
+        `plantilla`, e.g. Encargado and Comentarios of the form, which also supplies the
+        fields of parts not seen before. If recording fails the queue is kept, so no
+        scan is lost. Returns {'aplicados', 'rechazos'}; 'fila' of a rejection is the
+        position of its part in the batch."""
+        if not self._pendientes:
+            return None
+        try:
+            conocidas = self.inventario.datos_partes(list(self._pendientes))
+            movimientos = []
+            for numero, (parte, cantidad) in enumerate(self._pendientes.items(), start=1):
+                datos = dict(plantilla or {})
+                conocida = conocidas.get(parte)
+                for campo in CAMPOS_PARTE:
+                    if conocida and conocida[campo] not in (None, ""):
+                        datos[campo] = conocida[campo]
+                datos.update({'N° de parte': parte, 'Cantidad': cantidad})
+                movimientos.append((numero, datos))
+            resultado = self.inventario.registrar_lote(self.tipo, movimientos)
+        except Exception:
+            self._reintento = time.monotonic() + self.max_espera # Kept, and retried after max_espera
+            raise
+        logger.info(f"Scan batch of {self.escaneos} scans ({len(movimientos)} parts) recorded as {self.tipo}s: "
+                    f"{resultado['aplicados']} applied, {len(resultado['rechazos'])} rejected.")
+        self.descartar()
+        return resultado
@@ -0,0 +1,484 @@
+"""Stock of any past date: a date index of each movement sheet plus periodic stock
+snapshots saved next to the workbook (`<archivo>.instantaneas`).
+
+A snapshot holds the stock of every part as of the end of one day. The stock as of a
+date D starts from the latest snapshot not after D and adds only the movements dated
+between that snapshot and D, found by binary search in the date index; movements
+recorded after the snapshot but dated before it (back-dated entries) are added too,
+until the next cut folds them into the snapshots they belong to.
+Snapshots are cut at the end of each completed day and, over a longer history, every
+MOVIMIENTOS_POR_INSTANTANEA movements, so a query reads at most about that many
+movements (or those of a single day, if one day has more) whatever the size of the
+history. Movements without a valid date count in the current stock but in no date.
+
+The same date indexes answer range queries (the movements between two dates, the
+consumption of each part in a window, the Salidas window of the forecast) at a cost
+that depends on the movements in the range, not on the size of the sheets.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import zlib
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from almacen.almacenamiento import FIRST_DATA_ROW, SHEET_INGRESOS, SHEET_SALIDAS, StorageBackend
+from almacen.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+MOVIMIENTOS_POR_INSTANTANEA = 5000 # A snapshot is also cut at the end of the day reaching this many movements
+MAX_PENDIENTES = 1024 # Appended rows kept unsorted before they are merged into the date index
+SIGNOS = {SHEET_INGRESOS: 1, SHEET_SALIDAS: -1} # Effect of each movement sheet on the stock
+_EPOCA = pd.Timestamp('1970-01-01')
+
+
+def dia(fecha) -> int:
+    """Day number (days since 1970-01-01) of a date, a datetime or an ISO text
+    ('2025-03-01'). Raises ValueError with a user-facing message otherwise."""
+    try:
+        marca = pd.Timestamp(fecha)
+    except (TypeError, ValueError):
+        marca = pd.NaT
+    if pd.isna(marca):
+        raise ValueError(f"Fecha no válida: {fecha} (use AAAA-MM-DD).")
+    return (marca.normalize() - _EPOCA).days
+
+
+def fecha_de_dia(numero: int) -> str:
+    return (date(1970, 1, 1) + timedelta(days=int(numero))).isoformat()
+
+
+def dias_de(valores) -> Tuple[np.ndarray, np.ndarray]:
+    """Day numbers of a column of Fecha cells, parsed like the forecast does (ISO
+    texts or datetimes), and the mask of the cells that hold a valid date."""
+    fechas = pd.to_datetime(pd.Series(valores, dtype=object), errors='coerce', format='ISO8601')
+    validas = fechas.notna().to_numpy()
+    dias = np.zeros(len(fechas), dtype=np.int64)
+    dias[validas] = (fechas[validas].dt.normalize() - _EPOCA).dt.days.to_numpy()
+    return dias, validas
+
+
+# --- IndiceFechas Class ---
+class IndiceFechas:
+    """The movements of one sheet sorted by date, for range queries by binary search.
+
+    Day number, row, part code and quantity of every movement with a valid date are
+    kept in parallel numpy arrays ordered by day (then row). The index is built once
+    from whole columns; rows appended later are read one by one into a small unsorted
+    buffer that is merged into the arrays when it fills, so keeping it up to date costs
+    O(1) per movement and a range query O(log n + rows in the range)."""
+
+    def __init__(self, storage: StorageBackend, sheet_name: str, codigo_parte: Callable[[str], int]):
+        self.storage = storage
+        self.sheet_name = sheet_name
+        self.codigo_parte = codigo_parte # Part number -> code shared by both movement sheets
+        self._pendientes: List[Tuple[int, int, int, float]] = [] # (day, row, part, quantity) not merged yet
+        self._construir()
+
+    def _construir(self):
+        fechas, partes, cantidades = self.storage.column_values(self.sheet_name, ['A', 'B', 'G'])
+        self.ultima_fila = FIRST_DATA_ROW - 1 + len(fechas) # Last row read
+        dias, validas = dias_de(fechas)
+        codigos, unicos = pd.factorize(pd.Series(partes, dtype=object))
+        validas = validas & (codigos >= 0)
+        mapa = np.array([self._codigo(parte) for parte in unicos] + [-1], dtype=np.int64)
+        codigos = mapa[codigos] # -1 (no part) takes the last entry
+        validas = validas & (codigos >= 0)
+        cantidades = pd.to_numeric(pd.Series(cantidades, dtype=object), errors='coerce').fillna(0).to_numpy(dtype=float)
+
+        filas = np.flatnonzero(validas) + FIRST_DATA_ROW
+        orden = np.argsort(dias[validas], kind='stable') # Stable: rows of a day stay in row order
+        self.dias = dias[validas][orden]
+        self.filas = filas[orden]
+        self.partes = codigos[validas][orden]
+        self.cantidades = cantidades[validas][orden]
+        self._pendientes.clear()
+        logger.info(f"Date index of '{self.sheet_name}' built: {len(self.dias)} movements.")
+
+    def _codigo(self, parte) -> int:
+        parte = str(parte).strip()
+        return self.codigo_parte(parte) if parte else -1
+
+    def __len__(self) -> int:
+        return len(self.dias) + len(self._pendientes)
+
+    def actualizar(self) -> List[Tuple[int, int, int, float]]:
+        """Indexes the rows appended since the last call and returns them as
+        (day, row, part, quantity), leaving out rows without a valid date or part."""
+        em = self.storage
+        nuevas = []
+        for fila in range(self.ultima_fila + 1, em.get_max_row(self.sheet_name) + 1):
+            parte = em.get_cell_value(self.sheet_name, fila, 'B')
+            codigo = self._codigo(parte) if parte is not None else -1
+            try:
+                numero = dia(em.get_cell_value(self.sheet_name, fila, 'A'))
+            except ValueError:
+                continue
+            finally:
+                self.ultima_fila = fila
+            if codigo >= 0:
+                cantidad = pd.to_numeric(em.get_cell_value(self.sheet_name, fila, 'G'), errors='coerce')
+                nuevas.append((numero, fila, codigo, 0.0 if pd.isna(cantidad) else float(cantidad)))
+        self._pendientes.extend(nuevas)
+        if len(self._pendientes) > MAX_PENDIENTES:
+            self._fusionar()
+        return nuevas
+
+    def _fusionar(self):
+        """Merges the buffer of appended rows into the sorted arrays."""
+        pendientes = sorted(self._pendientes)
+        dias, filas, partes, cantidades = (np.array(columna) for columna in zip(*pendientes))
+        posiciones = np.searchsorted(self.dias, dias, side='right') # After the rows of the same day
+        self.dias = np.insert(self.dias, posiciones, dias)
+        self.filas = np.insert(self.filas, posiciones, filas)
+        self.partes = np.insert(self.partes, posiciones, partes)
+        self.cantidades = np.insert(self.cantidades, posiciones, cantidades)
+        self._pendientes.clear()
+
+    def rango(self, desde: Optional[int] = None, hasta: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Movements dated from day `desde` to day `hasta`, both included (None: no
+        bound), as arrays 'dias', 'filas', 'partes' and 'cantidades' in date order."""
+        inicio = 0 if desde is None else np.searchsorted(self.dias, desde, side='left')
+        fin = len(self.dias) if hasta is None else np.searchsorted(self.dias, hasta, side='right')
+        resultado = {
+            'dias': self.dias[inicio:fin], 'filas': self.filas[inicio:fin],
+            'partes': self.partes[inicio:fin], 'cantidades': self.cantidades[inicio:fin],
+        }
+        pendientes = [p for p in self._pendientes
+                      if (desde is None or p[0] >= desde) and (hasta is None or p[0] <= hasta)]
+        if pendientes:
+            extra = [np.array(columna) for columna in zip(*sorted(pendientes))]
+            combinado = {clave: np.concatenate((valores, nuevos))
+                         for (clave, valores), nuevos in zip(resultado.items(), extra)}
+            orden = np.argsort(combinado['dias'], kind='stable')
+            resultado = {clave: valores[orden] for clave, valores in combinado.items()}
+        return resultado
+
+
+# --- HistorialStock Class ---
+class HistorialStock:
+    """Stock as of any date, from periodic snapshots plus the movements since.
+
+    Snapshots are materialized in memory as one stock array per snapshot (indexed by
+    part code) and saved compactly as the change of each part since the previous
+    snapshot, with the last row of each sheet they cover and a checksum of the date,
+    part and quantity of every movement up to it, so snapshots of a workbook that was
+    replaced or edited since are discarded and rebuilt.
+    The file is a cache: deleting it only costs one replay of the history. The date
+    indexes kept in step here also serve the date-range queries of the movements."""
+
+    def __init__(self, storage: StorageBackend, intervalo: int = MOVIMIENTOS_POR_INSTANTANEA,
+                 ruta: Optional[str] = None):
+        self.storage = storage
+        self.intervalo = intervalo
+        archivo = storage._storage_file()
+        self.ruta = ruta or (f"{archivo}.instantaneas" if archivo else None)
+        self._lock = threading.Lock()
+        self._reemplazos = None # storage.replacements the indexes were built for
+        self._generacion = None
+        self.indices: Dict[str, IndiceFechas] = {}
+        self._codigos: Dict[str, int] = {}
+        self.partes: List[str] = [] # Part number of each code
+        self.instantaneas: List[Dict] = [] # {'dia', 'filas': {sheet: row}, 'huellas': {sheet: checksum}, 'stock': array}
+        self._tardias: Dict[str, List[Tuple[int, int, int, float]]] = {} # Rows recorded after a snapshot but dated before it, until the next cut
+        self._hasta: Optional[int] = None # Day up to which snapshots are complete
+
+    # --- Parts ---
+    def _codigo(self, parte: str) -> int:
+        codigo = self._codigos.get(parte)
+        if codigo is None:
+            codigo = self._codigos[parte] = len(self.partes)
+            self.partes.append(parte)
+        return codigo
+
+    # --- Indexes and snapshots in step with the storage ---
+    def _actualizar(self):
+        """Brings the date indexes up to date: rebuilt after a rollback or reload,
+        extended with the appended rows otherwise."""
+        em = self.storage
+        if em.replacements != self._reemplazos or not self.indices:
+            self._reemplazos = em.replacements
+            self._generacion = em.generation
+            with metricas.span('indice_fechas'):
+                self._codigos, self.partes = {}, []
+                self.indices = {sheet: IndiceFechas(em, sheet, self._codigo) for sheet in SIGNOS}
+            self._cargar()
+        elif em.generation != self._generacion:
+            self._generacion = em.generation
+            for sheet, indice in self.indices.items():
+                for movimiento in indice.actualizar():
+                    if self.instantaneas and movimiento[0] <= self.instantaneas[-1]['dia']:
+                        self._tardias[sheet].append(movimiento)
+
+    def _huellas(self, sheet_name: str, ultimas: List[int]) -> List[int]:
+        """Checksum of the indexed movements of a sheet up to each of the given rows:
+        a wrapping int64 sum over the rows of their day, row and quantity times a CRC of
+        the part number, one cumulative sum for all of them."""
+        movimientos = self.indices[sheet_name].rango()
+        pesos = np.array([zlib.crc32(parte.encode('utf-8')) for parte in self.partes] + [0], dtype=np.int64)
+        orden = np.argsort(movimientos['filas'], kind='stable')
+        filas = movimientos['filas'][orden]
+        valores = (np.round(movimientos['cantidades'][orden]).astype(np.int64) * pesos[movimientos['partes'][orden]]
+                   + movimientos['dias'][orden] * 1_000_003 + filas)
+        acumulado = np.concatenate(([0], np.cumsum(valores)))
+        return acumulado[np.searchsorted(filas, ultimas, side='right')].tolist()
+
+    def _cargar(self):
+        """Reads the snapshots saved next to the storage, keeping those that still match
+        it (every snapshot after the first one that does not is dropped too), and finds
+        the back-dated rows recorded after each of them."""
+        self.instantaneas, self._hasta = [], None
+        guardadas = {}
+        if self.ruta and os.path.exists(self.ruta):
+            try:
+                with open(self.ruta, encoding='utf-8') as f:
+                    guardadas = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Snapshot file {self.ruta} unreadable, snapshots will be rebuilt: {str(e)}")
+
+        hasta, guardadas = guardadas.get('hasta'), guardadas.get('instantaneas', [])
+        huellas = {sheet: self._huellas(sheet, [guardada['filas'][sheet] for guardada in guardadas])
+                   for sheet in self.indices}
+        stock = np.zeros(0)
+        for i, guardada in enumerate(guardadas):
+            filas = guardada['filas']
+            if any(filas[sheet] > indice.ultima_fila or guardada['huellas'][sheet] != huellas[sheet][i]
+                   for sheet, indice in self.indices.items()):
+                logger.warning(f"Snapshots from {guardada['fecha']} on no longer match the data and were discarded.")
+                break
+            stock = self._sumar(stock, {self._codigo(parte): cambio for parte, cambio in guardada['cambios'].items()})
+            self.instantaneas.append({'dia': dia(guardada['fecha']), 'filas': filas,
+                                      'huellas': guardada['huellas'], 'stock': stock})
+        else:
+            if hasta:
+                self._hasta = dia(hasta)
+        if self.instantaneas and self._hasta is None:
+            self._hasta = self.instantaneas[-1]['dia']
+
+        # A row is back-dated for the last snapshot made before it was recorded if it
+        # is dated on or before that snapshot's day
+        for sheet, indice in self.indices.items():
+            tardias = []
+            if self.instantaneas:
+                ultimas = np.array([instantanea['filas'][sheet] for instantanea in self.instantaneas])
+                dias = np.array([instantanea['dia'] for instantanea in self.instantaneas])
+                previa = np.searchsorted(ultimas, indice.filas, side='left') - 1
+                marcadas = np.flatnonzero((previa >= 0) & (indice.dias <= dias[np.maximum(previa, 0)]))
+                tardias = list(zip(indice.dias[marcadas].tolist(), indice.filas[marcadas].tolist(),
+                                   indice.partes[marcadas].tolist(), indice.cantidades[marcadas].tolist()))
+            self._tardias[sheet] = tardias
+        logger.info(f"{len(self.instantaneas)} stock snapshots loaded.")
+
+    def _guardar(self):
+        """Writes the snapshots (atomically: temporary file, then rename)."""
+        if not self.ruta:
+            return
+        instantaneas, previo = [], np.zeros(0)
+        for instantanea in self.instantaneas:
+            cambio = self._sumar(instantanea['stock'], -previo)
+            instantaneas.append({
+                'fecha': fecha_de_dia(instantanea['dia']), 'filas': instantanea['filas'],
+                'huellas': instantanea['huellas'],
+                'cambios': {self.partes[i]: int(cambio[i]) for i in np.flatnonzero(cambio)},
+            })
+            previo = instantanea['stock']
+        # A temporary name of its own: stations sharing the workbook folder save too
+        temporal = f"{self.ruta}.{socket.gethostname()}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump({'hasta': fecha_de_dia(self._hasta) if self._hasta is not None else None,
+                           'instantaneas': instantaneas}, f, ensure_ascii=False)
+            os.replace(temporal, self.ruta)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+
+    @staticmethod
+    def _sumar(stock: np.ndarray, cambios) -> np.ndarray:
+        """stock + cambios, where cambios is an array or {code: quantity}; the result has
+        room for every code involved."""
+        if isinstance(cambios, dict):
+            largo = max([len(stock)] + [codigo + 1 for codigo in cambios])
+            resultado = np.zeros(largo)
+            resultado[:len(stock)] = stock
+            for codigo, cantidad in cambios.items():
+                resultado[codigo] += cantidad
+            return resultado
+        largo = max(len(stock), len(cambios))
+        resultado = np.zeros(largo)
+        resultado[:len(stock)] += stock
+        resultado[:len(cambios)] += cambios
+        return resultado
+
+    # --- Queries ---
+    def _stock_desde_instantanea(self, numero: int) -> np.ndarray:
+        """Stock array (by part code) as of the end of day `numero`."""
+        k = bisect_right([instantanea['dia'] for instantanea in self.instantaneas], numero) - 1
+        base = self.instantaneas[k] if k >= 0 else None
+        stock = np.zeros(len(self.partes))
+        if base is not None:
+            stock[:len(base['stock'])] = base['stock']
+        for sheet, signo in SIGNOS.items():
+            movimientos = self.indices[sheet].rango(base['dia'] + 1 if base else None, numero)
+            stock += signo * np.bincount(movimientos['partes'], weights=movimientos['cantidades'], minlength=len(stock))
+            if base is not None:
+                for numero_tardia, fila, codigo, cantidad in self._tardias[sheet]:
+                    if fila > base['filas'][sheet] and numero_tardia <= base['dia']:
+                        stock[codigo] += signo * cantidad
+        return stock
+
+    def _completar(self, hasta: int) -> int:
+        """Cuts the snapshots missing up to day `hasta` (included): at the end of every
+        day that completes `intervalo` movements since the previous snapshot, and at
+        `hasta`. Back-dated rows recorded since the last cut are added to the snapshots
+        first. Returns the number of snapshots added."""
+        if self._hasta is not None and hasta <= self._hasta:
+            return 0
+        self._incorporar_tardias()
+        desde = self.instantaneas[-1]['dia'] + 1 if self.instantaneas else None
+        dias = np.sort(np.concatenate([indice.rango(desde, hasta)['dias'] for indice in self.indices.values()]))
+        self._hasta = hasta
+        if not len(dias):
+            self._guardar()
+            return 0
+
+        unicos, cuantos = np.unique(dias, return_counts=True)
+        cortes, acumulado = [], 0
+        for numero, cantidad in zip(unicos.tolist(), cuantos.tolist()):
+            acumulado += cantidad
+            if acumulado >= self.intervalo:
+                cortes.append(numero)
+                acumulado = 0
+        if not cortes or cortes[-1] != hasta:
+            cortes.append(hasta)
+
+        with metricas.span('instantaneas'):
+            filas = {sheet: indice.ultima_fila for sheet, indice in self.indices.items()}
+            huellas = {sheet: self._huellas(sheet, [fila])[0] for sheet, fila in filas.items()}
+            for numero in cortes:
+                # Each cut starts from the one before, so only its interval is read
+                stock = self._stock_desde_instantanea(numero)
+                self.instantaneas.append({'dia': numero, 'filas': dict(filas), 'huellas': huellas, 'stock': stock})
+            self._guardar()
+        logger.info(f"{len(cortes)} stock snapshots added up to {fecha_de_dia(hasta)}.")
+        return len(cortes)
+
+    def _incorporar_tardias(self):
+        """Adds the back-dated rows to the stock of every snapshot dated on or after them
+        that was cut before they were recorded. The snapshots then cover every indexed
+        row, so the queries no longer go through these rows one by one."""
+        if not any(self._tardias.values()):
+            return
+        filas = {sheet: indice.ultima_fila for sheet, indice in self.indices.items()}
+        huellas = {sheet: self._huellas(sheet, [fila])[0] for sheet, fila in filas.items()}
+        for instantanea in self.instantaneas:
+            cambios = {}
+            for sheet, signo in SIGNOS.items():
+                for numero, fila, codigo, cantidad in self._tardias[sheet]:
+                    if fila > instantanea['filas'][sheet] and numero <= instantanea['dia']:
+                        cambios[codigo] = cambios.get(codigo, 0) + signo * cantidad
+            if cambios:
+                instantanea['stock'] = self._sumar(instantanea['stock'], cambios)
+            instantanea['filas'], instantanea['huellas'] = dict(filas), huellas
+        logger.info(f"{sum(map(len, self._tardias.values()))} back-dated movements added to the stock snapshots.")
+        for sheet in self._tardias:
+            self._tardias[sheet] = []
+
+    def revisar(self, hoy: Optional[date] = None) -> int:
+        """Cuts the snapshots of the days completed since the last ones. Cheap when they
+        are up to date (no data is read), so it can run after every movement."""
+        ayer = dia(hoy or date.today()) - 1
+        with self._lock:
+            if self._hasta is not None and ayer <= self._hasta and self.indices:
+                return 0
+            with self.storage._lock:
+                self._actualizar()
+                return self._completar(ayer)
+
+    def stock_al(self, fecha, partes: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Stock as of the end of day `fecha` (date, datetime or 'AAAA-MM-DD'): of the
+        given parts (0 for parts without movements), or of every part whose stock that
+        day is not zero."""
+        numero = dia(fecha)
+        with self._lock, metricas.span('stock_al'):
+            with self.storage._lock:
+                self._actualizar()
+                self._completar(dia(date.today()) - 1)
+                stock = self._stock_desde_instantanea(numero)
+        if partes is not None:
+            codigos = self._codigos
+            return {parte: int(stock[codigos[clave]]) if clave in codigos else 0
+                    for parte, clave in ((parte, str(parte).strip()) for parte in partes)}
+        return {self.partes[i]: int(stock[i]) for i in np.flatnonzero(stock)}
+
+    # --- Movements by date ---
+    @staticmethod
+    def _limites(desde, hasta) -> Tuple[Optional[int], Optional[int]]:
+        """Day numbers of an inclusive date range (None: no bound)."""
+        desde = dia(desde) if desde not in (None, "") else None
+        hasta = dia(hasta) if hasta not in (None, "") else None
+        if desde is not None and hasta is not None and desde > hasta:
+            raise ValueError("La fecha inicial es posterior a la fecha final.")
+        return desde, hasta
+
+    def _rango(self, sheet_name: str, desde, hasta) -> Dict[str, np.ndarray]:
+        if sheet_name not in SIGNOS:
+            raise ValueError(f"Hoja de movimientos desconocida: {sheet_name}")
+        desde, hasta = self._limites(desde, hasta)
+        with self._lock, self.storage._lock:
+            self._actualizar()
+            return self.indices[sheet_name].rango(desde, hasta)
+
+    def movimientos_entre(self, sheet_name: str, desde=None, hasta=None) -> pd.DataFrame:
+        """Rows of a movement sheet dated from `desde` to `hasta` (both included; None
+        leaves that end open), in date order, with the sheet headers as columns and the
+        sheet row numbers as index. Only the rows in the range are read."""
+        with metricas.span('movimientos_entre'):
+            filas = self._rango(sheet_name, desde, hasta)['filas'].tolist()
+            valores = self.storage.row_values(sheet_name, filas)
+            return pd.DataFrame(valores, columns=self.storage.get_headers(sheet_name),
+                                index=pd.Index(filas, name='fila'))
+
+    def cantidades_entre(self, sheet_name: str, desde=None, hasta=None) -> pd.DataFrame:
+        """Date, part and quantity of the movements of a sheet in a date range, as
+        columns fecha/parte/cantidad (the input of PronosticoConsumo)."""
+        movimientos = self._rango(sheet_name, desde, hasta)
+        return pd.DataFrame({
+            'fecha': pd.to_datetime(movimientos['dias'], unit='D'),
+            'parte': [self.partes[codigo] for codigo in movimientos['partes'].tolist()],
+            'cantidad': movimientos['cantidades'],
+        })
+
+    def salidas_desde(self, fecha_limite: datetime) -> pd.DataFrame:
+        """The Salidas at or after `fecha_limite`, as cantidades_entre; dates without a
+        time count from their midnight, as PronosticoConsumo.preparar_salidas compares them."""
+        limite = pd.Timestamp(fecha_limite)
+        desde = dia(limite) + (0 if limite == limite.normalize() else 1)
+        return self.cantidades_entre(SHEET_SALIDAS, fecha_de_dia(desde))
+
+    def consumo_entre(self, desde=None, hasta=None) -> Dict[str, int]:
+        """Total salidas of each part with salidas dated from `desde` to `hasta` (both
+        included), largest first."""
+        with metricas.span('consumo_entre'):
+            movimientos = self._rango(SHEET_SALIDAS, desde, hasta)
+            codigos, posiciones = np.unique(movimientos['partes'], return_inverse=True)
+            totales = np.bincount(posiciones, weights=movimientos['cantidades'], minlength=len(codigos))
+            orden = np.argsort(-totales, kind='stable')
+            return {self.partes[codigo]: int(total) for codigo, total in zip(codigos[orden].tolist(), totales[orden])}
+
+    def reconstruir(self) -> int:
+        """Discards every snapshot and cuts them again over the whole history."""
+        with self._lock, self.storage._lock:
+            self._actualizar()
+            self.instantaneas, self._hasta = [], None
+            for sheet in self._tardias:
+                self._tardias[sheet] = []
+            return self._completar(dia(date.today()) - 1)
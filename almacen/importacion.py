@@ -0,0 +1,108 @@
+import csv
+import logging
+import os
+import unicodedata
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from openpyxl import load_workbook
+
+from almacen.movimientos import CAMPOS_FORMULARIO, CAMPOS_OPCIONALES
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_IMPORTACION = ['Fecha'] + CAMPOS_FORMULARIO # Fecha is optional (today by default)
+FILAS_ENCABEZADO = 10 # The header row is searched in the first rows (e.g. row 2 of an exported sheet)
+
+
+def _normalizar(texto) -> str:
+    """Header key without accents, case, symbols or extra spaces ('N° de parte' -> 'n de parte')."""
+    texto = unicodedata.normalize('NFKD', str(texto or ""))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    texto = ''.join(c if c.isalnum() else ' ' for c in texto.lower())
+    return ' '.join(texto.split())
+
+
+ENCABEZADOS = {_normalizar(campo): campo for campo in CAMPOS_IMPORTACION}
+ENCABEZADOS.update({'numero de parte': 'N° de parte', 'no de parte': 'N° de parte', 'parte': 'N° de parte'})
+
+
+def _valor(campo: str, valor):
+    """Converts a cell to the value a form would submit: text, except the quantity."""
+    if valor is None:
+        return ""
+    if isinstance(valor, (datetime, date)):
+        return valor.strftime("%Y-%m-%d")
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    if campo == 'Cantidad' and isinstance(valor, (int, float)):
+        return valor
+    return str(valor).strip()
+
+
+def _filas_csv(path: str):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        muestra = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        yield from csv.reader(f, dialecto)
+
+
+def _filas_xlsx(path: str):
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def leer_movimientos(path: str) -> List[Tuple[int, Dict]]:
+    """Reads a list of movements from a CSV (comma, semicolon or tab separated) or xlsx
+    file (first sheet). Columns are matched by header name, ignoring case and accents,
+    and unknown columns are ignored. Returns (file row, datos) pairs for the non-empty
+    rows. Raises ValueError if a required column is missing."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        filas = _filas_xlsx(path)
+    elif extension in ('.csv', '.txt'):
+        filas = _filas_csv(path)
+    else:
+        raise ValueError(f"Formato no soportado: {extension or path} (use CSV o xlsx).")
+
+    columnas: Optional[Dict[int, str]] = None
+    movimientos = []
+    for numero, fila in enumerate(filas, start=1):
+        if columnas is None:
+            encontradas = {i: ENCABEZADOS[_normalizar(v)] for i, v in enumerate(fila) if _normalizar(v) in ENCABEZADOS}
+            if 'N° de parte' in encontradas.values():
+                columnas = encontradas
+                faltantes = [c for c in CAMPOS_FORMULARIO if c not in CAMPOS_OPCIONALES and c not in columnas.values()]
+                if faltantes:
+                    raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+            elif numero >= FILAS_ENCABEZADO:
+                break
+            continue
+
+        datos = {campo: "" for campo in CAMPOS_FORMULARIO}
+        for i, campo in columnas.items():
+            datos[campo] = _valor(campo, fila[i] if i < len(fila) else None)
+        if any(v != "" for v in datos.values()):
+            movimientos.append((numero, datos))
+
+    if columnas is None:
+        raise ValueError("No se encontró la fila de encabezados (se requiere la columna 'N° de parte').")
+    logger.info(f"{len(movimientos)} movements read from {path}.")
+    return movimientos
+
+
+def escribir_rechazos(path: str, rechazos: List[Dict]):
+    """Writes the rejected rows of an import as CSV (opens directly in Excel)."""
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Fila', 'N° de parte', 'Motivo'])
+        for rechazo in rechazos:
+            writer.writerow([rechazo['fila'], rechazo['parte'], rechazo['motivo']])
+    logger.info(f"{len(rechazos)} rejected rows written to {path}.")
@@ -0,0 +1,187 @@
+import logging
+import os
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from almacen.almacenamiento import SHEET_CONTROL, StorageBackend
+from almacen.backend_excel import ExcelManager
+from almacen.backend_sqlite import SQLiteManager
+from almacen.catalogo import CatalogoPartes
+from almacen.control import ControlInventarioManager
+from almacen.importacion import leer_movimientos
+from almacen.metricas import metricas
+from almacen.movimientos import MovimientoManager
+
+logger = logging.getLogger(__name__)
+
+
+def crear_almacenamiento(archivo_excel: str, backend: str = "xlsx", cargar: bool = True,
+                         estacion: Optional[str] = None) -> StorageBackend:
+    """Creates the storage backend. With "sqlite" the data lives in a database next to
+    the Excel file, imported from the workbook the first time it is opened.
+    With cargar=False the workbook is not loaded (or imported) yet (see load_async).
+    `estacion` names this station's journal when several share the workbook (the PC
+    name by default)."""
+    if backend == "xlsx":
+        return ExcelManager(archivo_excel, cargar=cargar, estacion=estacion)
+    if backend == "sqlite":
+        archivo_db = os.path.splitext(archivo_excel)[0] + '.db'
+        nueva = not os.path.exists(archivo_db)
+        importar = nueva and os.path.exists(archivo_excel)
+        manager = SQLiteManager(archivo_db, importar_de=archivo_excel if importar else None)
+        if cargar:
+            manager.load()
+        return manager
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+# --- Inventario Class ---
+class Inventario:
+    """Entry point to the inventory without a GUI, for scripts, scheduled jobs, tests,
+    the Tk tabs and the inventory server.
+
+    Opens the storage backend and exposes the operations of the application. Nothing
+    opens a dialog: rejected movements raise ValueError with the same message the
+    forms show, and storage errors propagate. As a context manager it closes the
+    storage on exit, waiting for pending saves. ClienteInventario offers the same
+    methods against a running server.
+
+        with Inventario(archivo_excel) as inventario:
+            inventario.registrar_ingreso({...})
+            inventario.predecir(metodo='ewma')
+    """
+
+    def __init__(self, archivo_excel: str, backend: str = "xlsx", estacion: Optional[str] = None,
+                 cargar: bool = True):
+        self.storage = crear_almacenamiento(archivo_excel, backend, cargar=cargar, estacion=estacion)
+        self.catalogo = CatalogoPartes(self.storage)
+        self.movimientos = MovimientoManager(self.storage, self.catalogo)
+        self.control = ControlInventarioManager(self.storage)
+        self._historial = None # HistorialStock, created by the first query by date
+
+    def load_async(self) -> Future:
+        """Loads the storage in the background (see StorageBackend.load_async)."""
+        return self.storage.load_async()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def registrar_ingreso(self, datos: Dict):
+        """Records an income; `datos` holds the form fields ('N° de parte', 'Cantidad'...)."""
+        self.movimientos.registrar('ingreso', datos)
+        self._revisar_historial()
+
+    def registrar_salida(self, datos: Dict):
+        """Records an output after checking the available stock."""
+        self.movimientos.registrar('salida', datos)
+        self._revisar_historial()
+
+    def registrar_lote(self, tipo: str, movimientos: Iterable[Tuple[int, Dict]]) -> Dict:
+        """Records many (row, datos) movements with a single save.
+        Returns {'aplicados': int, 'rechazos': [{'fila', 'parte', 'motivo'}]}."""
+        resultado = self.movimientos.registrar_lote(tipo, list(movimientos))
+        self._revisar_historial()
+        return resultado
+
+    def importar(self, tipo: str, path: str) -> Dict:
+        """Records a CSV/xlsx list of ingresos or salidas with a single save."""
+        with metricas.span('importar'):
+            return self.registrar_lote(tipo, leer_movimientos(path))
+
+    def stock(self, partes: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """Control row of each part as {'nombre', 'stock_actual', 'min', 'max', 'estado'},
+        or None for parts without one."""
+        em = self.storage
+        resultado = {}
+        with em._lock:
+            for parte in partes:
+                fila = em.find_part(SHEET_CONTROL, parte)
+                resultado[parte] = None if not fila else {
+                    clave: em.get_cell_value(SHEET_CONTROL, fila, columna)
+                    for clave, columna in (('nombre', 'B'), ('stock_actual', 'C'), ('min', 'D'),
+                                           ('max', 'E'), ('estado', 'F'))
+                }
+        return resultado
+
+    def sugerir_partes(self, prefijo: str, limite: int = 10) -> List[str]:
+        """Known part numbers starting with `prefijo`, for autocompletion."""
+        return self.catalogo.sugerir(prefijo, limite)
+
+    def datos_parte(self, parte: str) -> Optional[Dict]:
+        """Nombre, Descripción, Unidad, Almacén, Ubicación and 'disponible' of a known part."""
+        return self.catalogo.datos(parte)
+
+    def datos_partes(self, partes: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """datos_parte of several parts at once, as {part: datos or None}."""
+        return {parte: self.catalogo.datos(parte) for parte in partes}
+
+    def read_dataframe(self, sheet_name: str):
+        """The sheet as a pandas DataFrame, cached until the data changes."""
+        return self.storage.read_dataframe(sheet_name)
+
+    @property
+    def generacion(self) -> int:
+        """Counter that changes whenever the data changes."""
+        return self.storage.generation
+
+    def recalcular(self) -> int:
+        """Rebuilds the control sheet; returns the number of cells that changed."""
+        return self.control.actualizar_inventario()
+
+    def verificar(self) -> List[Dict]:
+        """Differences between the control sheet and a full recomputation."""
+        return self.control.verificar_consistencia()
+
+    def conciliar(self) -> Dict:
+        """Parts whose stock derived from the movement ledger differs from the control
+        sheet (see ConciliacionStock.conciliar)."""
+        from almacen.conciliacion import ConciliacionStock # Imports pandas on first use
+        return ConciliacionStock(self.storage).conciliar()
+
+    def migrar_libro_antiguo(self) -> int:
+        """One-time conversion of a workbook written before the ledger
+        (see ConciliacionStock.migrar_libro_antiguo)."""
+        from almacen.conciliacion import ConciliacionStock
+        return ConciliacionStock(self.storage, self.catalogo).migrar_libro_antiguo()
+
+    @property
+    def historial(self):
+        """Stock snapshots and date indexes of the movements (see HistorialStock)."""
+        if self._historial is None:
+            from almacen.historial import HistorialStock # Imports pandas on first use
+            self._historial = HistorialStock(self.storage)
+        return self._historial
+
+    def stock_al(self, fecha, partes: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Stock as of the end of day `fecha` ('AAAA-MM-DD' or a date): of the given parts,
+        or of every part with stock other than zero that day."""
+        return self.historial.stock_al(fecha, partes)
+
+    def movimientos_entre(self, sheet_name: str, desde=None, hasta=None):
+        """Rows of 'Ingresos de almacén' or 'Salidas de almacén' dated from `desde` to
+        `hasta` (both included, None for an open end) as a DataFrame indexed by row."""
+        return self.historial.movimientos_entre(sheet_name, desde, hasta)
+
+    def consumo_entre(self, desde=None, hasta=None) -> Dict[str, int]:
+        """Total salidas of each part in a date range, largest first."""
+        return self.historial.consumo_entre(desde, hasta)
+
+    def _revisar_historial(self):
+        """Cuts the snapshots of the days completed since the last movement, once the
+        history is in use (it is built by the first query, not by movements)."""
+        if self._historial is not None:
+            self._historial.revisar()
+
+    def predecir(self, dias_historial: int = 30, metodo: str = 'promedio') -> int:
+        """Updates min/max and status from the consumption forecast."""
+        return self.control.predecir_necesidades(dias_historial, metodo, historial=self.historial)
+
+    def reporte(self) -> Dict:
+        """Inventory status report (see ControlInventarioManager.formatear_reporte)."""
+        return self.control.generar_reporte()
+
+    def close(self, timeout=None):
+        self.storage.close(timeout)
@@ -0,0 +1,102 @@
+import functools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+# --- Metricas Class ---
+class Metricas:
+    """Timing spans of the storage and manager operations.
+
+    Every finished span adds its duration to a rolling window of the last `ventana`
+    samples of that operation, from which count, p50, p95 and max are computed on
+    demand. Spans may finish on any thread (e.g. saves on the writer thread)."""
+
+    def __init__(self, ventana: int = 1000):
+        self.ventana = ventana
+        self._muestras = {} # {operation: deque of the last durations in seconds}
+        self._totales = {} # {operation: spans recorded since the last reset}
+        self._lock = threading.Lock()
+
+    def registrar(self, operacion: str, duracion: float):
+        """Adds one duration (seconds) to an operation."""
+        with self._lock:
+            muestras = self._muestras.get(operacion)
+            if muestras is None:
+                muestras = self._muestras[operacion] = deque(maxlen=self.ventana)
+                self._totales[operacion] = 0
+            muestras.append(duracion)
+            self._totales[operacion] += 1
+
+    @contextmanager
+    def span(self, operacion: str):
+        """Times the enclosed block, also when it raises."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(operacion, time.perf_counter() - inicio)
+
+    def medido(self, operacion: str):
+        """Decorator that records every call of a function as a span."""
+        def decorador(funcion):
+            @functools.wraps(funcion)
+            def envoltura(*args, **kwargs):
+                inicio = time.perf_counter()
+                try:
+                    return funcion(*args, **kwargs)
+                finally:
+                    self.registrar(operacion, time.perf_counter() - inicio)
+            return envoltura
+        return decorador
+
+    @staticmethod
+    def _percentil(ordenadas, p: float) -> float:
+        """Nearest-rank percentile of an already sorted list."""
+        indice = max(0, min(len(ordenadas) - 1, math.ceil(p / 100 * len(ordenadas)) - 1))
+        return ordenadas[indice]
+
+    def resumen(self) -> Dict[str, Dict]:
+        """Returns {operation: {'count', 'p50', 'p95', 'max', 'ultimo'}} (durations in
+        seconds over the rolling window; count is the total since the last reset)."""
+        with self._lock:
+            copia = {operacion: (list(muestras), self._totales[operacion])
+                     for operacion, muestras in self._muestras.items()}
+        resumen = {}
+        for operacion, (muestras, total) in sorted(copia.items()):
+            ordenadas = sorted(muestras)
+            resumen[operacion] = {
+                'count': total,
+                'p50': self._percentil(ordenadas, 50),
+                'p95': self._percentil(ordenadas, 95),
+                'max': ordenadas[-1],
+                'ultimo': muestras[-1],
+            }
+        return resumen
+
+    def reiniciar(self):
+        with self._lock:
+            self._muestras.clear()
+            self._totales.clear()
+
+    def log_resumen(self, nivel: int = logging.INFO):
+        """Writes one line per operation to the log."""
+        resumen = self.resumen()
+        if not resumen:
+            return
+        for operacion, datos in resumen.items():
+            logger.log(
+                nivel,
+                f"Timing {operacion}: count={datos['count']} p50={datos['p50'] * 1000:.1f}ms "
+                f"p95={datos['p95'] * 1000:.1f}ms max={datos['max'] * 1000:.1f}ms"
+            )
+
+
+# Process-wide registry used by the storage backends and the managers
+metricas = Metricas()
@@ -0,0 +1,176 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from almacen.almacenamiento import StorageBackend
+from almacen.catalogo import CatalogoPartes
+from almacen.control import ControlInventarioManager
+from almacen.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+# Fields of the Ingreso and Salida forms; all are required except the optional ones
+CAMPOS_FORMULARIO = [
+    'N° de parte', 'Nombre', 'Descripción', 'Unidad',
+    'Cantidad', 'Almacén', 'Ubicación', 'Encargado', 'Comentarios'
+]
+CAMPOS_OPCIONALES = ('Comentarios', 'Descripción')
+
+
+def validar_requeridos(campos: Dict[str, str]):
+    """Raises ValueError naming the first required field left empty."""
+    for campo, valor in campos.items():
+        if not str(valor if valor is not None else "").strip():
+            raise ValueError(f"El campo '{campo}' es obligatorio.")
+
+
+def entero_positivo(campo: str, valor) -> int:
+    """Converts a form value to a positive integer, or raises ValueError."""
+    try:
+        if isinstance(valor, float) and not valor.is_integer():
+            raise ValueError
+        numero = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo} debe ser un número entero válido.") from None
+    if numero <= 0:
+        raise ValueError(f"{campo} debe ser un número entero positivo.")
+    return numero
+
+
+def validar_formulario(datos: Dict) -> Dict:
+    """Applies the checks of the forms to a movement: required fields and a positive
+    integer quantity. Returns the movement with stripped text and an int Cantidad."""
+    datos = {campo: (valor.strip() if isinstance(valor, str) else valor) for campo, valor in datos.items()}
+    validar_requeridos({campo: datos.get(campo) for campo in CAMPOS_FORMULARIO if campo not in CAMPOS_OPCIONALES})
+    datos['Cantidad'] = entero_positivo("Cantidad", datos.get('Cantidad'))
+    return datos
+
+
+# --- MovimientoManager Class ---
+class MovimientoManager:
+    """Records income and outcome movements. The tabs, the command line and the journal
+    replay share these methods, so a replayed movement has exactly the same effect as the
+    original.
+
+    Movements are immutable ledger rows: an ingreso appends to 'Ingresos de almacén' and
+    a salida to 'Salidas de almacén', and no row is ever updated. Stock is derived from
+    the ledger (see ControlInventarioManager.stock_parte). Recorded movements are also
+    pushed to `catalogo`, if given, so the forms' part lookups stay current."""
+
+    def __init__(self, excel_manager: StorageBackend, catalogo: Optional[CatalogoPartes] = None):
+        self.excel_manager = excel_manager
+        self.catalogo = catalogo
+
+    def registrar(self, tipo: str, datos: Dict):
+        """Validates a movement, appends it to the journal and applies it in one transaction.
+        Every entry point (tabs, command line, server) goes through the checks of the
+        forms (validar_formulario) here. Raises ValueError with a user-facing message if
+        the movement is not valid."""
+        em = self.excel_manager
+        datos = validar_formulario(datos)
+        datos['Fecha'] = datos.get('Fecha') or datetime.now().strftime("%Y-%m-%d")
+        with metricas.span(f'registrar_{tipo}'):
+            with em.transaction(): # Merges the other stations' movements before the check
+                self.validar(tipo, datos) # Before any change, so a rejection rolls nothing back
+                seq = em.journal_movement(tipo, datos) # Durable before the workbook is touched
+                self.aplicar(tipo, datos)
+                em.journal_applied(seq)
+                if self.catalogo is not None:
+                    self.catalogo.registrar(tipo, [datos])
+
+    def validar(self, tipo: str, datos: Dict):
+        """Checks the movement against the current stock without modifying anything."""
+        if not str(datos.get('N° de parte') or "").strip():
+            raise ValueError("El campo 'N° de parte' es obligatorio.")
+        cantidad = datos.get('Cantidad')
+        if not isinstance(cantidad, int) or isinstance(cantidad, bool) or cantidad <= 0:
+            raise ValueError("Cantidad debe ser un número entero positivo.")
+        if tipo == 'salida':
+            cantidad_disponible = ControlInventarioManager(self.excel_manager).stock_parte(datos['N° de parte'])
+            if cantidad_disponible is None:
+                raise ValueError("El N° de parte no existe en el registro de ingresos. No se puede realizar la salida.")
+            if datos['Cantidad'] > cantidad_disponible:
+                raise ValueError(f"Cantidad insuficiente. Disponible: {cantidad_disponible}, Solicitado: {datos['Cantidad']}")
+        elif tipo != 'ingreso':
+            raise ValueError(f"Tipo de movimiento desconocido: {tipo}")
+
+    @metricas.medido('registrar_lote')
+    def registrar_lote(self, tipo: str, movimientos: List[Tuple[int, Dict]]) -> Dict:
+        """Records many movements of one type (bulk import) with a single save.
+
+        `movimientos` holds (source row, datos) pairs. Every row is validated first with
+        the rules of the forms and, for outputs, against the stock left by the earlier
+        rows of the batch. Accepted rows are journaled with one fsync and applied in one
+        transaction; the control row of each part is updated once at the end, so default
+        min/max of parts without them come from the stock after the whole batch.
+        Returns {'aplicados': int, 'rechazos': [{'fila', 'parte', 'motivo'}]}."""
+        if tipo not in ('ingreso', 'salida'):
+            raise ValueError(f"Tipo de movimiento desconocido: {tipo}")
+        em = self.excel_manager
+        with em.transaction(): # Merges the other stations' movements before the checks
+            aceptados, rechazos = self._validar_lote(tipo, movimientos)
+            if aceptados:
+                control = ControlInventarioManager(em)
+                seq = em.journal_movements(tipo, aceptados) # Durable before the workbook is touched
+                for datos in aceptados:
+                    self.aplicar(tipo, datos, actualizar_control=False)
+                for parte in dict.fromkeys(str(datos['N° de parte']).strip() for datos in aceptados):
+                    control.actualizar_parte(parte)
+                em.journal_applied(seq)
+                if self.catalogo is not None:
+                    self.catalogo.registrar(tipo, aceptados)
+        logger.info(f"Bulk {tipo}: {len(aceptados)} movements applied, {len(rechazos)} rejected.")
+        return {'aplicados': len(aceptados), 'rechazos': rechazos}
+
+    def _validar_lote(self, tipo: str, movimientos: List[Tuple[int, Dict]]) -> Tuple[List[Dict], List[Dict]]:
+        """Splits a batch into the accepted movements (normalized as the forms do) and
+        the rejections, checking outputs against the stock left by the earlier rows."""
+        hoy = datetime.now().strftime("%Y-%m-%d")
+        aceptados, rechazos = [], []
+        disponible = {} # {part: stock left for the next outputs of the batch}
+        control = ControlInventarioManager(self.excel_manager)
+
+        for fila, datos in movimientos:
+            try:
+                datos = validar_formulario(datos)
+                datos['Fecha'] = datos.get('Fecha') or hoy
+                if tipo == 'salida':
+                    parte = str(datos['N° de parte']).strip()
+                    if parte not in disponible:
+                        stock = control.stock_parte(parte)
+                        if stock is None:
+                            raise ValueError("El N° de parte no existe en el registro de ingresos. No se puede realizar la salida.")
+                        disponible[parte] = stock
+                    if datos['Cantidad'] > disponible[parte]:
+                        raise ValueError(f"Cantidad insuficiente. Disponible: {disponible[parte]}, Solicitado: {datos['Cantidad']}")
+                    disponible[parte] -= datos['Cantidad']
+                aceptados.append(datos)
+            except ValueError as e:
+                rechazos.append({'fila': fila, 'parte': datos.get('N° de parte'), 'motivo': str(e)})
+        return aceptados, rechazos
+
+    def aplicar(self, tipo: str, datos: Dict, actualizar_control: bool = True):
+        """Applies a movement to the in-memory workbook (no journal, no save).
+        With actualizar_control=False the part's control row is left to the caller."""
+        if tipo == 'ingreso':
+            self.aplicar_ingreso(datos, actualizar_control)
+        elif tipo == 'salida':
+            self.aplicar_salida(datos, actualizar_control)
+        else:
+            raise ValueError(f"Tipo de movimiento desconocido: {tipo}")
+
+    def aplicar_ingreso(self, datos: Dict, actualizar_control: bool = True):
+        """Appends an income to 'Ingresos de almacén' and updates the part's control row.
+        Earlier incomes of the part are left as they are: every movement is its own row."""
+        next_row = self.excel_manager.append_row('Ingresos de almacén', datos)
+        logger.info(f"Income of part {datos['N° de parte']} registered in 'Ingresos de almacén' row {next_row}.")
+        if actualizar_control:
+            ControlInventarioManager(self.excel_manager).actualizar_parte(datos['N° de parte'])
+
+    def aplicar_salida(self, datos: Dict, actualizar_control: bool = True):
+        """Appends an output to 'Salidas de almacén' and updates the part's control row.
+        The stock is not deducted anywhere else: it is derived from both sheets."""
+        next_row = self.excel_manager.append_row('Salidas de almacén', datos)
+        logger.info(f"Output of part {datos['N° de parte']} registered in 'Salidas de almacén' row {next_row}.")
+        if actualizar_control:
+            ControlInventarioManager(self.excel_manager).actualizar_parte(datos['N° de parte'])
@@ -0,0 +1,162 @@
+import logging
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from almacen.almacenamiento import COLUMN_MAPPING, SHEET_SALIDAS, SHEET_CONTROL, column_index
+
+logger = logging.getLogger(__name__)
+
+
+def _posicion(sheet_name: str, columna: str) -> int:
+    """0-based position of a named column in the DataFrame of a sheet."""
+    return column_index(COLUMN_MAPPING[sheet_name][columna]) - 1
+
+
+# --- PronosticoConsumo Class ---
+class PronosticoConsumo:
+    """Consumption forecasting over the Salidas history, computed for every part at once.
+
+    The history is loaded in one columnar pass (vectorized date parsing, groupby per
+    part), so the cost grows with the number of movements and not with Python loops
+    per part. Methods:
+      - 'promedio': total consumption of the period divided by its days.
+      - 'ewma': exponentially weighted average of the daily consumption, which follows
+        recent changes in demand.
+      - 'estacional': average consumption per weekday; days of stock are simulated over
+        the coming days with that weekly profile.
+    """
+
+    METODOS = ('promedio', 'ewma', 'estacional')
+
+    def __init__(self, dias_historial: int = 30, metodo: str = 'promedio',
+                 dias_minimo: int = 15, dias_maximo: int = 30, span_ewma: int = 7):
+        if metodo not in self.METODOS:
+            raise ValueError(f"Unknown forecasting method: {metodo}")
+        self.dias_historial = dias_historial
+        self.metodo = metodo
+        self.dias_minimo = dias_minimo # Suggested minimum covers this many days of consumption
+        self.dias_maximo = dias_maximo # Suggested maximum covers this many days of consumption
+        self.span_ewma = span_ewma
+
+    def preparar_salidas(self, df_salidas: pd.DataFrame, fecha_limite: datetime) -> pd.DataFrame:
+        """Returns the outputs since `fecha_limite` as columns fecha/parte/cantidad.
+        Rows with an invalid date or without part number are ignored."""
+        fechas = pd.to_datetime(
+            df_salidas.iloc[:, _posicion(SHEET_SALIDAS, 'Fecha')], errors='coerce', format='ISO8601'
+        )
+        partes = df_salidas.iloc[:, _posicion(SHEET_SALIDAS, 'N° de parte')]
+        cantidades = pd.to_numeric(df_salidas.iloc[:, _posicion(SHEET_SALIDAS, 'Cantidad')], errors='coerce')
+
+        validas = fechas.notna() & partes.notna() & (fechas >= fecha_limite)
+        salidas = pd.DataFrame({
+            'fecha': fechas[validas],
+            'parte': partes[validas].astype(str).str.strip(),
+            'cantidad': cantidades[validas].fillna(0).astype(float),
+        })
+        return salidas[salidas['parte'] != ""]
+
+    def consumo_diario(self, salidas: pd.DataFrame, fecha_limite: datetime,
+                       fecha_referencia: datetime) -> pd.DataFrame:
+        """Daily consumption matrix (one row per day of the period, one column per part)."""
+        dias = pd.date_range(pd.Timestamp(fecha_limite).normalize(), pd.Timestamp(fecha_referencia).normalize(), freq='D')
+        diario = (
+            salidas.assign(dia=salidas['fecha'].dt.normalize())
+            .groupby(['dia', 'parte'])['cantidad'].sum()
+            .unstack(fill_value=0.0)
+        )
+        return diario.reindex(dias, fill_value=0.0)
+
+    def fecha_limite(self, fecha_referencia: datetime) -> datetime:
+        """Start of the period of history used for a forecast made at `fecha_referencia`."""
+        return fecha_referencia - pd.Timedelta(days=self.dias_historial)
+
+    def calcular(self, df_salidas: pd.DataFrame, df_control: pd.DataFrame,
+                 fecha_referencia: Optional[datetime] = None) -> pd.DataFrame:
+        """Forecasts every control row. Returns a DataFrame aligned with `df_control`
+        with columns parte, stock, consumo_diario, dias_restantes, min_sugerido and
+        max_sugerido (consumo_diario is 0 for parts without outputs in the period)."""
+        fecha_referencia = fecha_referencia or datetime.now()
+        salidas = None
+        if self.dias_historial > 0:
+            salidas = self.preparar_salidas(df_salidas, self.fecha_limite(fecha_referencia))
+        return self.calcular_periodo(salidas, df_control, fecha_referencia)
+
+    def calcular_periodo(self, salidas: Optional[pd.DataFrame], df_control: pd.DataFrame,
+                         fecha_referencia: Optional[datetime] = None) -> pd.DataFrame:
+        """Same as calcular, from the outputs of the period already selected (columns
+        fecha/parte/cantidad, as preparar_salidas returns them), e.g. by a date index."""
+        fecha_referencia = fecha_referencia or datetime.now()
+        fecha_limite = self.fecha_limite(fecha_referencia)
+
+        partes = df_control.iloc[:, _posicion(SHEET_CONTROL, 'N° de parte')]
+        resultado = pd.DataFrame({
+            'parte': partes.where(partes.isna(), partes.astype(str).str.strip()),
+            'stock': pd.to_numeric(
+                df_control.iloc[:, _posicion(SHEET_CONTROL, 'Stock actual')], errors='coerce'
+            ).fillna(0).astype(float),
+        }, index=df_control.index)
+
+        consumo = pd.Series(dtype=float)
+        dias_estacional = None
+        if self.dias_historial > 0 and salidas is not None and not salidas.empty:
+            if self.metodo == 'promedio':
+                consumo = salidas.groupby('parte')['cantidad'].sum() / self.dias_historial
+            elif self.metodo == 'ewma':
+                consumo = self._ewma(self.consumo_diario(salidas, fecha_limite, fecha_referencia))
+            else:
+                consumo, dias_estacional = self._estacional(salidas, fecha_limite, fecha_referencia, resultado)
+
+        resultado['consumo_diario'] = resultado['parte'].map(consumo).fillna(0.0).astype(float)
+        con_consumo = resultado['consumo_diario'] > 0
+        with np.errstate(divide='ignore'):
+            resultado['dias_restantes'] = np.where(
+                con_consumo, resultado['stock'] / resultado['consumo_diario'].where(con_consumo, 1.0), np.inf
+            )
+        if dias_estacional is not None:
+            resultado['dias_restantes'] = resultado['parte'].map(dias_estacional).fillna(resultado['dias_restantes'])
+
+        resultado['min_sugerido'] = np.maximum((resultado['consumo_diario'] * self.dias_minimo).astype(int), 1)
+        resultado['max_sugerido'] = (resultado['consumo_diario'] * self.dias_maximo).astype(int)
+        logger.info(
+            f"Forecast ({self.metodo}, {self.dias_historial} days) computed for {len(resultado)} parts, "
+            f"{int(con_consumo.sum())} with consumption."
+        )
+        return resultado
+
+    def _ewma(self, diario: pd.DataFrame) -> pd.Series:
+        """Last value of the exponentially weighted average of each part's daily consumption
+        (same as DataFrame.ewm(span, adjust=False), iterating over days instead of parts)."""
+        alpha = 2.0 / (self.span_ewma + 1)
+        valores = diario.to_numpy()
+        ewma = valores[0].copy()
+        for dia in valores[1:]:
+            ewma = alpha * dia + (1 - alpha) * ewma
+        return pd.Series(ewma, index=diario.columns)
+
+    def _estacional(self, salidas: pd.DataFrame, fecha_limite: datetime,
+                    fecha_referencia: datetime, resultado: pd.DataFrame):
+        """Weekly seasonal forecast. Returns the mean daily consumption of the coming
+        `dias_maximo` days and the days of stock simulated with the weekday profile."""
+        diario = self.consumo_diario(salidas, fecha_limite, fecha_referencia)
+        perfil = diario.groupby(diario.index.dayofweek).mean().reindex(range(7), fill_value=0.0)
+
+        # Consumption of each coming day, following the weekday profile
+        horizonte = max(self.dias_maximo, self.dias_minimo) * 2
+        proximos = pd.date_range(pd.Timestamp(fecha_referencia).normalize() + pd.Timedelta(days=1), periods=horizonte)
+        futuro = perfil.to_numpy()[proximos.dayofweek]
+        consumo = pd.Series(futuro[:self.dias_maximo].mean(axis=0), index=perfil.columns)
+
+        # Days of stock: number of coming days fully covered by the current stock,
+        # extrapolated with the mean consumption beyond the horizon
+        stock = resultado.dropna(subset=['parte']).drop_duplicates('parte').set_index('parte')['stock']
+        stock = stock.reindex(perfil.columns).fillna(0.0).to_numpy()
+        acumulado = futuro.cumsum(axis=0)
+        dias = (acumulado < stock).sum(axis=0).astype(float)
+        fuera = dias >= horizonte
+        if fuera.any():
+            media = consumo.to_numpy()
+            dias[fuera] = np.where(media[fuera] > 0, stock[fuera] / np.where(media[fuera] > 0, media[fuera], 1.0), np.inf)
+        return consumo, pd.Series(dias, index=perfil.columns)
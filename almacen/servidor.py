@@ -0,0 +1,239 @@
+"""Local inventory server: one process owns the storage and its indexes, and the GUI,
+the CLI and scripts work against it over a small HTTP/JSON API (stdlib only).
+
+    python -m almacen libro.xlsx servir --puerto 8765
+
+GET  /salud                              {'estado', 'generacion', 'backend'}
+GET  /stock?parte=P-1&parte=P-2          {'stock': {parte: {...} or null}}
+POST /stock {'partes': [...]}            same, for long lists
+GET  /partes?prefijo=P-00&limite=10     {'partes': [...]} (autocomplete)
+GET  /partes/datos?parte=P-1             {'datos': {...} or null}
+POST /partes/datos {'partes': [...]}     {'datos': {parte: {...} or null}}
+GET  /registros?hoja=...&version=V       {'version', 'columnas', 'filas'}, or
+                                         {'version', 'sin_cambios': true} if V is current
+GET  /verificar                          {'diferencias': [...]}
+GET  /conciliar                          {'partes', 'diferencias': [...]} (ledger audit)
+GET  /stock/fecha?fecha=2025-03-01&parte=P-1
+                                         {'fecha', 'stock': {parte: stock}} (all parts
+                                         with stock other than zero without 'parte')
+GET  /movimientos?hoja=...&desde=2025-03-01&hasta=2025-03-31
+                                         {'columnas', 'filas', 'indice'} (rows of the
+                                         range in date order; an omitted end is open)
+GET  /consumo?desde=...&hasta=...        {'consumo': {parte: total salidas}}
+GET  /reporte                            {'reporte': {...}}
+GET  /metricas                           Metricas.resumen() of the server process
+POST /movimientos {'tipo', 'datos'}      {'generacion'}
+POST /movimientos/lote {'tipo', 'movimientos': [[fila, datos], ...]}
+                                         {'aplicados', 'rechazos'} (single save)
+POST /recalcular                         {'cambios'}
+POST /migrar                             {'ajustes'} (workbooks from before the ledger)
+POST /predecir {'dias', 'metodo'}        {'cambios'}
+
+Rejected movements and bad requests answer 400 {'error': message}, with the same
+message the forms show; other failures answer 500. Requests are served on one thread
+each, but every operation runs under one lock, so writes are applied in arrival order.
+Every answer carries the current data generation in an X-Generacion header.
+"""
+import json
+import logging
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from almacen.almacenamiento import SHEET_TITLES
+from almacen.inventario import Inventario
+from almacen.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+PUERTO = 8765
+MAX_CUERPO = 64 * 1024 * 1024 # Largest request body accepted (a batch of ~100k movements)
+
+
+def _json(valor) -> bytes:
+    return json.dumps(valor, ensure_ascii=False, default=str).encode('utf-8')
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    """Dispatches one HTTP request to the ServidorInventario that owns the server socket."""
+
+    protocol_version = 'HTTP/1.1' # Keep-alive: clients reuse one connection per thread
+    disable_nagle_algorithm = True # Answers are small; without this each waits for a delayed ACK
+
+    def do_GET(self):
+        self._atender('GET')
+
+    def do_POST(self):
+        self._atender('POST')
+
+    def _atender(self, metodo: str):
+        url = urlsplit(self.path)
+        servidor = self.server.inventario_servidor
+        ruta = servidor.rutas.get((metodo, url.path.rstrip('/') or '/'))
+        try:
+            longitud = int(self.headers.get('Content-Length') or 0)
+            if longitud > MAX_CUERPO:
+                raise ValueError(f"Solicitud demasiado grande ({longitud} bytes).")
+            cuerpo = self.rfile.read(longitud) if longitud else b''
+            if ruta is None:
+                self._responder(404, {'error': f"Ruta desconocida: {metodo} {url.path}"})
+                return
+            datos = json.loads(cuerpo) if cuerpo else {}
+            consulta = parse_qs(url.query)
+            with metricas.span(f'servidor {metodo} {url.path}'):
+                with servidor.lock:
+                    respuesta = ruta(datos, consulta)
+            self._responder(200, respuesta)
+        except (ValueError, KeyError, TypeError) as e: # Rejected movement or malformed request
+            mensaje = f"Falta el campo {e}" if isinstance(e, KeyError) else str(e)
+            self._responder(400, {'error': mensaje})
+        except Exception as e:
+            logger.error(f"Request {metodo} {self.path} failed: {str(e)}", exc_info=True)
+            self._responder(500, {'error': str(e)})
+
+    def _responder(self, estado: int, valor):
+        cuerpo = _json(valor)
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.send_header('X-Generacion', str(self.server.inventario_servidor.inventario.generacion))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+# --- ServidorInventario Class ---
+class ServidorInventario:
+    """Serves one Inventario over HTTP/JSON on a local address.
+
+    The storage is loaded and indexed once, by this process; clients only send
+    movements and queries. With the xlsx backend the background writer is started, so
+    a request returns once its movement is journaled and applied in memory and the
+    workbook is saved off the request threads."""
+
+    def __init__(self, inventario: Inventario, host: str = '127.0.0.1', puerto: int = PUERTO):
+        self.inventario = inventario
+        self.lock = threading.Lock() # One operation at a time, in arrival order
+        self.instancia = uuid.uuid4().hex[:8] # Generations restart with the process
+        self.rutas = {
+            ('GET', '/salud'): self.salud,
+            ('GET', '/stock'): self.stock,
+            ('POST', '/stock'): self.stock,
+            ('GET', '/stock/fecha'): self.stock_al,
+            ('GET', '/movimientos'): self.movimientos_entre,
+            ('GET', '/consumo'): self.consumo_entre,
+            ('GET', '/partes'): self.partes,
+            ('GET', '/partes/datos'): self.datos_parte,
+            ('POST', '/partes/datos'): self.datos_partes,
+            ('GET', '/registros'): self.registros,
+            ('GET', '/verificar'): lambda datos, consulta: {'diferencias': inventario.verificar()},
+            ('GET', '/conciliar'): lambda datos, consulta: inventario.conciliar(),
+            ('GET', '/reporte'): lambda datos, consulta: {'reporte': inventario.reporte()},
+            ('GET', '/metricas'): lambda datos, consulta: metricas.resumen(),
+            ('POST', '/movimientos'): self.movimiento,
+            ('POST', '/movimientos/lote'): self.lote,
+            ('POST', '/recalcular'): lambda datos, consulta: {'cambios': inventario.recalcular()},
+            ('POST', '/predecir'): self.predecir,
+            ('POST', '/migrar'): lambda datos, consulta: {'ajustes': inventario.migrar_libro_antiguo()},
+        }
+        self.writer = inventario.storage.start_background_writer()
+        self._http = ThreadingHTTPServer((host, puerto), _Manejador)
+        self._http.daemon_threads = True
+        self._http.inventario_servidor = self
+        self._hilo = None
+
+    @property
+    def url(self) -> str:
+        host, puerto = self._http.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def servir(self):
+        """Serves until cerrar() is called from another thread (or Ctrl+C)."""
+        logger.info(f"Inventory server listening on {self.url}")
+        self._http.serve_forever()
+
+    def iniciar(self) -> 'ServidorInventario':
+        """Serves on a background thread and returns at once."""
+        self._hilo = threading.Thread(target=self.servir, name='ServidorInventario', daemon=True)
+        self._hilo.start()
+        return self
+
+    def cerrar(self, timeout=None):
+        """Stops accepting requests and closes the inventory, waiting for pending saves."""
+        if self._hilo is not None:
+            self._http.shutdown()
+            self._hilo.join(timeout)
+            self._hilo = None
+        self._http.server_close()
+        self.inventario.close(timeout)
+        logger.info("Inventory server stopped.")
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cerrar()
+
+    # --- Routes: (JSON body, query string) -> JSON-serializable answer ---
+    def salud(self, datos, consulta):
+        return {'estado': 'ok', 'generacion': self.inventario.generacion,
+                'backend': type(self.inventario.storage).__name__}
+
+    def stock(self, datos, consulta):
+        partes = datos['partes'] if datos else consulta.get('parte', [])
+        return {'stock': self.inventario.stock(partes)}
+
+    def stock_al(self, datos, consulta):
+        fecha = consulta['fecha'][0]
+        return {'fecha': fecha, 'stock': self.inventario.stock_al(fecha, consulta.get('parte'))}
+
+    def movimientos_entre(self, datos, consulta):
+        hoja = consulta['hoja'][0]
+        df = self.inventario.movimientos_entre(hoja, consulta.get('desde', [None])[0], consulta.get('hasta', [None])[0])
+        return {'columnas': list(df.columns), 'filas': df.values.tolist(), 'indice': df.index.tolist()}
+
+    def consumo_entre(self, datos, consulta):
+        desde, hasta = consulta.get('desde', [None])[0], consulta.get('hasta', [None])[0]
+        return {'consumo': self.inventario.consumo_entre(desde, hasta)}
+
+    def partes(self, datos, consulta):
+        limite = int(consulta.get('limite', ['10'])[0])
+        return {'partes': self.inventario.sugerir_partes(consulta['prefijo'][0], limite)}
+
+    def datos_parte(self, datos, consulta):
+        return {'datos': self.inventario.datos_parte(consulta['parte'][0])}
+
+    def datos_partes(self, datos, consulta):
+        return {'datos': self.inventario.datos_partes(datos['partes'])}
+
+    def registros(self, datos, consulta):
+        """Rows of a sheet, unless the client already holds the current version."""
+        hoja = consulta['hoja'][0]
+        if hoja not in SHEET_TITLES:
+            raise ValueError(f"Hoja desconocida: {hoja}")
+        storage = self.inventario.storage
+        version = f"{self.instancia}:{storage.generation}"
+        if consulta.get('version', [None])[0] == version:
+            return {'version': version, 'sin_cambios': True}
+        return {
+            'version': version,
+            'columnas': storage.get_headers(hoja),
+            'filas': [values for _, values in storage.iter_records(hoja)],
+        }
+
+    def movimiento(self, datos, consulta):
+        tipo = datos['tipo']
+        if tipo not in ('ingreso', 'salida'):
+            raise ValueError(f"Tipo de movimiento desconocido: {tipo}")
+        registrar = self.inventario.registrar_ingreso if tipo == 'ingreso' else self.inventario.registrar_salida
+        registrar(datos['datos'])
+        return {'generacion': self.inventario.generacion}
+
+    def lote(self, datos, consulta):
+        return self.inventario.registrar_lote(datos['tipo'], [tuple(m) for m in datos['movimientos']])
+
+    def predecir(self, datos, consulta):
+        return {'cambios': self.inventario.predecir(int(datos.get('dias', 30)), datos.get('metodo', 'promedio'))}
@@ -0,0 +1 @@
+"""Synthetic workbook generator and micro-benchmarks of the inventory hot paths."""
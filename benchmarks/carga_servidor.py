@@ -0,0 +1,128 @@
+"""Load test of the inventory server: simulated clients on threads send a mix of
+ingresos, salidas and stock queries, and the throughput and latencies are reported.
+
+    python -m benchmarks.carga_servidor --clientes 16 --operaciones 500
+    python -m benchmarks.carga_servidor --servidor 127.0.0.1:8765 --clientes 4
+
+Without --servidor a synthetic workbook is generated and served in-process.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from almacen import Inventario, Metricas
+from almacen.cliente import ClienteInventario
+from almacen.servidor import ServidorInventario
+from benchmarks.generador import generar_libro
+
+logger = logging.getLogger(__name__)
+
+OPERACIONES = ('ingreso', 'salida', 'stock')
+
+
+def _datos(parte: str, cantidad: int) -> dict:
+    return {
+        'N° de parte': parte, 'Nombre': f"Artículo {parte}", 'Descripción': "", 'Unidad': "pza",
+        'Cantidad': cantidad, 'Almacén': "Almacén 1", 'Ubicación': "E-1", 'Encargado': "Carga",
+        'Comentarios': "",
+    }
+
+
+def cliente_simulado(url: str, numero: int, operaciones: int, partes: int, mezcla, lote_stock: int,
+                     tiempos: Metricas, rechazos: list, errores: list):
+    """One client: `operaciones` requests of a random kind (weighted by `mezcla`) over
+    random parts, each timed into `tiempos`. Salidas rejected for lack of stock count
+    as served requests."""
+    rnd = random.Random(numero)
+    cliente = ClienteInventario(url)
+
+    def parte():
+        return f"P-{rnd.randrange(partes):07d}"
+
+    try:
+        for _ in range(operaciones):
+            operacion = rnd.choices(OPERACIONES, mezcla)[0]
+            inicio = time.perf_counter()
+            try:
+                if operacion == 'ingreso':
+                    cliente.registrar_ingreso(_datos(parte(), rnd.randint(1, 20)))
+                elif operacion == 'salida':
+                    cliente.registrar_salida(_datos(parte(), rnd.randint(1, 3)))
+                else:
+                    cliente.stock([parte() for _ in range(lote_stock)])
+            except ValueError:
+                rechazos.append(operacion)
+            except Exception as e:
+                errores.append(f"{operacion}: {e}")
+                continue
+            tiempos.registrar(operacion, time.perf_counter() - inicio)
+    finally:
+        cliente.close()
+
+
+def ejecutar(url: str, clientes: int, operaciones: int, partes: int, mezcla, lote_stock: int) -> dict:
+    tiempos = Metricas(ventana=clientes * operaciones)
+    rechazos, errores = [], []
+    hilos = [
+        threading.Thread(target=cliente_simulado,
+                         args=(url, i, operaciones, partes, mezcla, lote_stock, tiempos, rechazos, errores))
+        for i in range(clientes)
+    ]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    resumen = tiempos.resumen()
+    servidas = sum(datos['count'] for datos in resumen.values())
+    print(f"{clientes} clientes x {operaciones} operaciones en {duracion:.2f}s: "
+          f"{servidas / duracion:.0f} op/s ({len(rechazos)} salidas rechazadas, {len(errores)} errores)")
+    print(f"{'operación':10}{'cantidad':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for operacion, datos in resumen.items():
+        print(f"{operacion:10}{datos['count']:>10}{datos['p50'] * 1000:10.2f}"
+              f"{datos['p95'] * 1000:10.2f}{datos['max'] * 1000:10.2f}")
+    for error in errores[:10]:
+        print(f"- {error}")
+    return {'duracion_s': duracion, 'op_s': servidas / duracion, 'operaciones': resumen,
+            'rechazos': len(rechazos), 'errores': len(errores)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.carga_servidor', description=__doc__.splitlines()[0])
+    parser.add_argument('--servidor', metavar='HOST:PUERTO', help="Servidor en marcha (por defecto uno propio)")
+    parser.add_argument('--clientes', type=int, default=8, help="Simulated clients (one thread each)")
+    parser.add_argument('--operaciones', type=int, default=200, help="Requests per client")
+    parser.add_argument('--mezcla', type=float, nargs=3, default=[0.3, 0.3, 0.4],
+                        metavar=('INGRESO', 'SALIDA', 'STOCK'), help="Weights of each kind of request")
+    parser.add_argument('--lote-stock', type=int, default=10, help="Parts asked in each stock query")
+    parser.add_argument('--movimientos', type=int, default=10000, help="Rows of the generated workbook")
+    parser.add_argument('--partes', type=int, default=1000, help="Distinct part numbers")
+    parser.add_argument('--backend', default='xlsx', choices=['xlsx', 'sqlite'])
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING) # Per-operation INFO logging would distort the timings
+    if args.servidor:
+        ejecutar(args.servidor, args.clientes, args.operaciones, args.partes, args.mezcla, args.lote_stock)
+        return
+
+    with tempfile.TemporaryDirectory(prefix='almacen_carga_') as directorio:
+        archivo = os.path.join(directorio, 'carga.xlsx')
+        generar_libro(archivo, args.movimientos, min(args.partes, args.movimientos))
+        inicio = time.perf_counter()
+        servidor = ServidorInventario(Inventario(archivo, args.backend), puerto=0).iniciar()
+        print(f"Servidor ({args.backend}, {args.movimientos} movimientos) listo en {time.perf_counter() - inicio:.2f}s")
+        try:
+            ejecutar(servidor.url, args.clientes, args.operaciones, args.partes, args.mezcla, args.lote_stock)
+        finally:
+            servidor.cerrar(timeout=120)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import random
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+from almacen.almacenamiento import (
+    SHEET_INGRESOS, SHEET_SALIDAS, SHEET_CONTROL, SHEET_TITLES, SHEET_HEADERS
+)
+
+
+def generar_libro(path: str, movimientos: int, partes: int, proporcion_salidas: float = 0.3,
+                  dias: int = 365, semilla: int = 0) -> str:
+    """Writes a synthetic workbook with the three-sheet layout created by main() and
+    ExcelManager.load (title in row 1, headers in row 2, data from row 3).
+
+    `movimientos` rows are split between Ingresos and Salidas, over `partes` distinct
+    part numbers and the last `dias` days. The control sheet holds the aggregated stock
+    of every part. Rows are streamed with openpyxl write-only mode, so sizes up to
+    millions of rows fit in memory."""
+    rnd = random.Random(semilla)
+    hoy = datetime.now()
+    n_salidas = int(movimientos * proporcion_salidas)
+    n_ingresos = movimientos - n_salidas
+
+    wb = Workbook(write_only=True)
+    hojas = {}
+    for sheet_name in (SHEET_INGRESOS, SHEET_SALIDAS, SHEET_CONTROL):
+        ws = wb.create_sheet(sheet_name)
+        ws.append([SHEET_TITLES[sheet_name]])
+        ws.append(SHEET_HEADERS[sheet_name])
+        hojas[sheet_name] = ws
+
+    def parte():
+        return f"P-{rnd.randrange(partes):07d}"
+
+    def fecha():
+        return (hoy - timedelta(days=rnd.randrange(dias))).strftime("%Y-%m-%d")
+
+    stock = {}
+    nombres = {}
+    for _ in range(n_ingresos):
+        p = parte()
+        cantidad = rnd.randint(5, 50)
+        stock[p] = stock.get(p, 0) + cantidad
+        nombres[p] = f"Artículo {p}"
+        hojas[SHEET_INGRESOS].append([
+            fecha(), p, nombres[p], "Generado para benchmark", None, "pza",
+            cantidad, "Almacén 1", f"E-{rnd.randint(1, 40)}", "Benchmark", ""
+        ])
+
+    # Outputs only for parts that have income, so they pass the stock validation
+    con_ingreso = list(stock)
+    for _ in range(n_salidas if con_ingreso else 0):
+        p = rnd.choice(con_ingreso)
+        cantidad = rnd.randint(1, 5)
+        stock[p] -= cantidad
+        hojas[SHEET_SALIDAS].append([
+            fecha(), p, nombres[p], "Generado para benchmark", None, "pza",
+            cantidad, "Almacén 1", "", "Benchmark", ""
+        ])
+
+    for p, cantidad in stock.items():
+        cantidad = max(0, cantidad)
+        minimo = max(int(cantidad * 0.3), 1) if cantidad > 0 else 0
+        maximo = max(int(cantidad * 2), minimo + 1) if cantidad > 0 else 0
+        hojas[SHEET_CONTROL].append([p, nombres[p], cantidad, minimo, maximo, ""])
+
+    wb.save(path)
+    return path
@@ -0,0 +1,229 @@
+"""Times the hot paths of the inventory on synthetic workbooks and writes the results
+to a JSON file, so runs can be compared (see --comparar).
+
+    python -m benchmarks --tamanos 1000 10000 100000 --partes 500
+    python -m benchmarks --comparar antes.json despues.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from almacen import ControlInventarioManager, MovimientoManager, crear_almacenamiento
+from benchmarks.generador import generar_libro
+
+logger = logging.getLogger(__name__)
+
+RESULTADOS_DIR = os.path.join(os.path.dirname(__file__), 'resultados')
+
+
+def medir(funcion, repeticiones: int, preparar=None) -> dict:
+    """Runs `funcion` `repeticiones` times and returns min/median/mean/max in seconds.
+    `preparar` runs before each repetition, outside the timing."""
+    tiempos = []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return {
+        'repeticiones': repeticiones,
+        'min_s': min(tiempos),
+        'mediana_s': statistics.median(tiempos),
+        'media_s': statistics.fmean(tiempos),
+        'max_s': max(tiempos),
+    }
+
+
+def _datos(parte: str, cantidad: int) -> dict:
+    return {
+        'N° de parte': parte, 'Nombre': f"Artículo {parte}", 'Descripción': "Benchmark",
+        'Unidad': "pza", 'Cantidad': cantidad, 'Almacén': "Almacén 1", 'Ubicación': "E-1",
+        'Encargado': "Benchmark", 'Comentarios': "",
+    }
+
+
+def medir_backend(manager, partes: int, repeticiones: int, repeticiones_lentas: int) -> dict:
+    """Times the operations of one loaded storage backend."""
+    rnd = random.Random(1)
+    resultados = {}
+    control = ControlInventarioManager(manager)
+    movimientos = MovimientoManager(manager)
+    consultas = [f"P-{rnd.randrange(partes):07d}" for _ in range(1000)] + [f"X-{i}" for i in range(100)]
+
+    def buscar():
+        for parte in consultas:
+            manager.find_part('Ingresos de almacén', parte)
+
+    resultados['find_part_x1100'] = medir(buscar, repeticiones)
+    resultados['get_max_row'] = medir(lambda: manager.get_max_row('Salidas de almacén'), repeticiones)
+
+    # guardar_ingreso / guardar_salida without the form: the same registrar() call, with its save
+    existente = next(iter(manager.iter_values('Ingresos de almacén', ['B'])))[0]
+    contador = iter(range(10 ** 9))
+    resultados['guardar_ingreso_nuevo'] = medir(
+        lambda: movimientos.registrar('ingreso', _datos(f"BENCH-{next(contador)}", 10)), repeticiones_lentas)
+    resultados['guardar_ingreso_existente'] = medir(
+        lambda: movimientos.registrar('ingreso', _datos(existente, 10)), repeticiones_lentas)
+    resultados['guardar_salida'] = medir(
+        lambda: movimientos.registrar('salida', _datos(existente, 1)), repeticiones_lentas)
+
+    resultados['actualizar_inventario'] = medir(control.actualizar_inventario, repeticiones_lentas)
+    resultados['verificar_consistencia'] = medir(control.verificar_consistencia, repeticiones_lentas)
+    for metodo in ('promedio', 'ewma', 'estacional'):
+        resultados[f'predecir_necesidades_{metodo}'] = medir(
+            lambda: control.predecir_necesidades(metodo=metodo), repeticiones_lentas)
+    resultados['generar_reporte'] = medir(control.generar_reporte, repeticiones)
+
+    # Stock as of a past date: cold (date index and snapshots built from scratch) and warm
+    import pandas as pd
+    from almacen.historial import HistorialStock
+    historial = HistorialStock(manager)
+    fecha = next(iter(manager.iter_values('Salidas de almacén', ['A'])))[0]
+
+    def borrar_instantaneas():
+        if historial.ruta and os.path.exists(historial.ruta):
+            os.remove(historial.ruta)
+
+    resultados['stock_al_frio'] = medir(lambda: HistorialStock(manager).stock_al(fecha), repeticiones_lentas,
+                                        preparar=borrar_instantaneas)
+    resultados['stock_al'] = medir(lambda: historial.stock_al(fecha), repeticiones)
+
+    # Date-range queries and the forecast through the same date index
+    semana = (pd.Timestamp(fecha) + pd.Timedelta(days=6)).strftime('%Y-%m-%d')
+    resultados['movimientos_entre_semana'] = medir(
+        lambda: historial.movimientos_entre('Salidas de almacén', fecha, semana), repeticiones)
+    resultados['consumo_entre_semana'] = medir(lambda: historial.consumo_entre(fecha, semana), repeticiones)
+    resultados['predecir_necesidades_indice'] = medir(
+        lambda: control.predecir_necesidades(historial=historial), repeticiones_lentas)
+
+    # Consultas DataFrames: cold (cache invalidated) and warm (cached frame)
+    for sheet_name in ('Ingresos de almacén', 'Salidas de almacén', 'Control de inventarios'):
+        clave = sheet_name.split()[0].lower()
+        resultados[f'dataframe_{clave}_frio'] = medir(
+            lambda: manager.read_dataframe(sheet_name), repeticiones, preparar=manager._data_replaced)
+        resultados[f'dataframe_{clave}_cache'] = medir(lambda: manager.read_dataframe(sheet_name), repeticiones)
+
+    def guardar():
+        manager.mark_dirty()
+        manager.save()
+
+    resultados['save'] = medir(guardar, repeticiones_lentas)
+    return resultados
+
+
+def ejecutar(tamanos, partes: int, backends, repeticiones: int, repeticiones_lentas: int, directorio: str) -> dict:
+    corrida = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'versiones': _versiones(),
+        'resultados': [],
+    }
+    for movimientos in tamanos:
+        partes_efectivas = min(partes, movimientos)
+        origen = os.path.join(directorio, f"bench_{movimientos}_{partes_efectivas}.xlsx")
+        inicio = time.perf_counter()
+        generar_libro(origen, movimientos, partes_efectivas)
+        print(f"[{movimientos} movimientos, {partes_efectivas} partes] libro generado en {time.perf_counter() - inicio:.1f}s")
+
+        for backend in backends:
+            # Each backend works on its own copy, so writes do not leak between runs
+            base = os.path.join(directorio, f"{backend}_{movimientos}_{partes_efectivas}")
+            archivo = base + '.xlsx'
+            with open(origen, 'rb') as src, open(archivo, 'wb') as dst:
+                dst.write(src.read())
+            for sobrante in (base + '.db', archivo + '.journal'):
+                if os.path.exists(sobrante):
+                    os.remove(sobrante)
+
+            fila = {'backend': backend, 'movimientos': movimientos, 'partes': partes_efectivas, 'operaciones': {}}
+            managers = []
+
+            def cargar():
+                if managers:
+                    managers.pop().close()
+                if backend == 'sqlite' and os.path.exists(base + '.db'):
+                    os.remove(base + '.db') # Every repetition measures the import from the workbook
+                managers.append(crear_almacenamiento(archivo, backend))
+
+            fila['operaciones']['load'] = medir(cargar, repeticiones_lentas)
+            fila['operaciones'].update(
+                medir_backend(managers[-1], partes_efectivas, repeticiones, repeticiones_lentas))
+            managers[-1].close()
+            corrida['resultados'].append(fila)
+            for operacion, tiempo in fila['operaciones'].items():
+                print(f"  {backend:6} {operacion:34} {tiempo['mediana_s'] * 1000:10.2f} ms")
+    return corrida
+
+
+def _versiones() -> dict:
+    versiones = {}
+    for modulo in ('openpyxl', 'pandas', 'numpy'):
+        try:
+            versiones[modulo] = __import__(modulo).__version__
+        except ImportError:
+            versiones[modulo] = None
+    return versiones
+
+
+def comparar(base: str, nuevo: str):
+    """Prints the median time of every operation in two result files and their ratio."""
+    def cargar(path):
+        with open(path, encoding='utf-8') as f:
+            corrida = json.load(f)
+        return {
+            (fila['backend'], fila['movimientos'], fila['partes'], operacion): tiempo['mediana_s']
+            for fila in corrida['resultados'] for operacion, tiempo in fila['operaciones'].items()
+        }
+
+    antes, despues = cargar(base), cargar(nuevo)
+    print(f"{'backend':8}{'movimientos':>12}  {'operación':34}{'antes ms':>12}{'después ms':>12}{'razón':>8}")
+    for clave in sorted(set(antes) & set(despues)):
+        backend, movimientos, _, operacion = clave
+        razon = despues[clave] / antes[clave] if antes[clave] else float('inf')
+        print(f"{backend:8}{movimientos:>12}  {operacion:34}{antes[clave] * 1000:12.2f}{despues[clave] * 1000:12.2f}{razon:8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.splitlines()[0])
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Movement rows of each synthetic workbook (1k to 1M)")
+    parser.add_argument('--partes', type=int, default=1000, help="Distinct part numbers")
+    parser.add_argument('--backends', nargs='+', default=['xlsx'], choices=['xlsx', 'sqlite'])
+    parser.add_argument('--repeticiones', type=int, default=5, help="Repetitions of the fast operations")
+    parser.add_argument('--repeticiones-lentas', type=int, default=2,
+                        help="Repetitions of the operations that load or save the whole file")
+    parser.add_argument('--directorio', help="Where the workbooks are generated (temporary by default)")
+    parser.add_argument('--salida', help="JSON result file (default benchmarks/resultados/<fecha>.json)")
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NUEVO'), help="Compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+
+    logging.getLogger().setLevel(logging.WARNING) # Per-operation INFO logging would distort the timings
+    with tempfile.TemporaryDirectory(prefix='almacen_bench_') as temporal:
+        directorio = args.directorio or temporal
+        os.makedirs(directorio, exist_ok=True)
+        corrida = ejecutar(args.tamanos, args.partes, args.backends,
+                           args.repeticiones, args.repeticiones_lentas, directorio)
+
+    salida = args.salida or os.path.join(RESULTADOS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(corrida, f, ensure_ascii=False, indent=2)
+    print(f"Resultados escritos en {salida}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
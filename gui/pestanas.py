@@ -1,11 +1,25 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from datetime import datetime, timedelta
-import pandas as pd
-from openpyxl import load_workbook
+from datetime import datetime
 import logging
-from typing import Dict, Optional, Tuple, List
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
 import os
+import sys
+import time
+import queue
+from almacen.backend_excel import SaveWorker, crear_libro
+from almacen.backend_sqlite import SQLiteManager
+from almacen.catalogo import CAMPOS_PARTE
+from almacen.cliente import ClienteInventario
+from almacen.escaneo import ColaEscaneos, leer_escaneo
+from almacen.control import ControlInventarioManager
+from almacen.importacion import escribir_rechazos
+from almacen.inventario import Inventario
+from almacen.metricas import metricas
+from almacen.movimientos import CAMPOS_FORMULARIO, entero_positivo, validar_requeridos
+
+if TYPE_CHECKING: # pandas is imported on first use (query tab), not at startup
+    import pandas as pd
 
 # --- Basic Logging Configuration ---
 logging.basicConfig(
@@ -16,187 +30,37 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# --- ExcelManager Class ---
-class ExcelManager:
-    """Class to handle all optimized Excel operations."""
-
-    def __init__(self, archivo_excel: str):
-        self.archivo_excel = archivo_excel
-        self._wb = None
-        self._cache = {}
-        self.column_mapping = {
-            'Ingresos de almacén': {
-                'Fecha': 'A', 'N° de parte': 'B', 'Nombre': 'C',
-                'Descripción': 'D', 'Unidad': 'F', 'Cantidad': 'G',
-                'Almacén': 'H', 'Ubicación': 'I', 'Encargado': 'J',
-                'Comentarios': 'K'
-            },
-            'Salidas de almacén': {
-                'Fecha': 'A', 'N° de parte': 'B', 'Nombre': 'C',
-                'Descripción': 'D', 'Unidad': 'F', 'Cantidad': 'G',
-                'Almacén': 'H', 'Ubicación': 'I', 'Encargado': 'J',
-                'Comentarios': 'K'
-            },
-            'Control de inventarios': {
-                'N° de parte': 'A', 'Nombre': 'B', 'Stock actual': 'C',
-                'Stock mínimo': 'D', 'Stock máximo': 'E', 'Estado': 'F'
-            }
-        }
-        self._ensure_sheets_exist() # Ensure sheets are present on initialization
+# Storage backend used by main(): "xlsx" works on the workbook directly, "sqlite" keeps
+# the data in a database next to it (see crear_almacenamiento)
+BACKEND = "xlsx"
 
-    @property
-    def workbook(self):
-        """Property that handles lazy loading of the workbook."""
-        if self._wb is None:
-            try:
-                self._wb = load_workbook(self.archivo_excel)
-                logger.info("Workbook loaded successfully.")
-            except FileNotFoundError:
-                logger.error(f"Error: Excel file not found at {self.archivo_excel}")
-                messagebox.showerror("Error de Archivo", f"El archivo Excel no se encontró en:\n{self.archivo_excel}\nPor favor, verifique la ruta.")
-                raise
-            except Exception as e:
-                logger.error(f"Error loading workbook: {str(e)}")
-                messagebox.showerror("Error al Cargar", f"Error al cargar el archivo Excel: {e}")
-                raise
-        return self._wb
+# Address of an inventory server ("127.0.0.1:8765", see `python -m almacen ARCHIVO servir`),
+# taken from the ALMACEN_SERVIDOR environment variable. When set, main() works as a thin
+# client of it instead of opening the workbook
+SERVIDOR = os.environ.get("ALMACEN_SERVIDOR") or None
 
-    def _ensure_sheets_exist(self):
-        """Ensures all required sheets exist in the workbook."""
-        try:
-            wb = self.workbook # This will load the workbook
-            for sheet_name in self.column_mapping.keys():
-                if sheet_name not in wb.sheetnames:
-                    wb.create_sheet(sheet_name)
-                    # Add headers if sheet is new (adjust based on your actual headers)
-                    if sheet_name == 'Ingresos de almacén':
-                        ws = wb[sheet_name]
-                        ws['A1'] = "REGISTRO DE INGRESOS EN ALMACÉN"
-                        ws['A2'] = "Fecha"
-                        ws['B2'] = "N° de parte"
-                        ws['C2'] = "Nombre"
-                        ws['D2'] = "Descripción"
-                        ws['E2'] = " " # Added a placeholder for E2 if F is used for Unit
-                        ws['F2'] = "Unidad"
-                        ws['G2'] = "Cantidad"
-                        ws['H2'] = "Almacén"
-                        ws['I2'] = "Ubicación"
-                        ws['J2'] = "Encargado"
-                        ws['K2'] = "Comentarios"
-                    elif sheet_name == 'Salidas de almacén':
-                        ws = wb[sheet_name]
-                        ws['A1'] = "REGISTRO DE SALIDAS EN ALMACÉN"
-                        ws['A2'] = "Fecha"
-                        ws['B2'] = "N° de parte"
-                        ws['C2'] = "Nombre"
-                        ws['D2'] = "Descripción"
-                        ws['E2'] = " " # Added a placeholder for E2 if F is used for Unit
-                        ws['F2'] = "Unidad"
-                        ws['G2'] = "Cantidad"
-                        ws['H2'] = "Almacén"
-                        ws['I2'] = "Ubicación"
-                        ws['J2'] = "Encargado"
-                        ws['K2'] = "Comentarios"
-                    elif sheet_name == 'Control de inventarios':
-                        ws = wb[sheet_name]
-                        ws['A1'] = "CONTROL DE INVENTARIOS"
-                        ws['A2'] = "N° de parte"
-                        ws['B2'] = "Nombre"
-                        ws['C2'] = "Stock actual"
-                        ws['D2'] = "Stock mínimo"
-                        ws['E2'] = "Stock máximo"
-                        ws['F2'] = "Estado"
-                    logger.warning(f"Sheet '{sheet_name}' was missing and has been created.")
-            self.save() # Save after creating missing sheets
-        except Exception as e:
-            logger.error(f"Error ensuring sheets exist: {str(e)}")
-            messagebox.showerror("Error de Hojas", f"No se pudieron asegurar las hojas del Excel: {e}")
+# Interval at which the operation timings are written to almacen.log
+METRICAS_LOG_MS = 5 * 60 * 1000
 
-    def get_sheet(self, sheet_name: str):
-        """Obtains a specific sheet with caching."""
-        if sheet_name not in self._cache:
-            try:
-                self._cache[sheet_name] = self.workbook[sheet_name]
-                logger.debug(f"Sheet '{sheet_name}' loaded into cache.")
-            except KeyError:
-                logger.error(f"Sheet '{sheet_name}' not found.")
-                messagebox.showerror("Error de Hoja", f"La hoja '{sheet_name}' no se encontró en el archivo Excel.")
-                raise
-        return self._cache[sheet_name]
-
-    def save(self):
-        """Saves changes to the Excel file."""
-        try:
-            if self._wb: # Ensure workbook is loaded before saving
-                self._wb.save(self.archivo_excel)
-                logger.info("Changes saved successfully.")
-            else:
-                logger.warning("Attempted to save but workbook was not loaded.")
-        except Exception as e:
-            logger.error(f"Error saving: {str(e)}")
-            messagebox.showerror("Error al Guardar", f"Error al guardar los cambios en Excel: {e}")
-            raise
-
-    def find_part(self, sheet_name: str, part_number: str) -> Optional[int]:
-        """Searches for a part number and returns the row if it exists.
-        Starts search from row 3 (after headers)."""
-        ws = self.get_sheet(sheet_name)
-        # Assuming part numbers are in column B for Ingresos/Salidas, and A for Control
-        col_letter = self.column_mapping[sheet_name]['N° de parte']
-        col_idx = ord(col_letter) - ord('A') + 1
-
-        # Iterate from the first data row (row 3)
-        for row_idx in range(3, ws.max_row + 1):
-            cell_val = ws.cell(row=row_idx, column=col_idx).value
-            if cell_val is not None and str(cell_val).strip() == str(part_number).strip():
-                logger.debug(f"Part '{part_number}' found in row {row_idx} of '{sheet_name}'.")
-                return row_idx
-        logger.debug(f"Part '{part_number}' not found in '{sheet_name}'.")
-        return None
-
-    def get_cell_value(self, sheet_name: str, row: int, column_letter: str):
-        """Gets the value of a specific cell."""
-        ws = self.get_sheet(sheet_name)
-        return ws[f'{column_letter}{row}'].value
-
-    def update_cell(self, sheet_name: str, row: int, column_letter: str, value):
-        """Updates the value of a specific cell."""
-        ws = self.get_sheet(sheet_name)
-        ws[f'{column_letter}{row}'] = value
-        logger.debug(f"Cell '{column_letter}{row}' in '{sheet_name}' updated to: {value}")
-
-    def get_current_quantity(self, sheet_name: str, row: int) -> int:
-        """Gets the current quantity of an item.
-        Assumes quantity is in column G for Ingresos/Salidas and C for Control."""
-        if sheet_name in ['Ingresos de almacén', 'Salidas de almacén']:
-            quantity_col = 'G'
-        elif sheet_name == 'Control de inventarios':
-            quantity_col = 'C'
-        else:
-            raise ValueError(f"Unknown sheet_name for quantity: {sheet_name}")
+# Pause in typing after which the query tab search runs
+BUSQUEDA_DEBOUNCE_MS = 150
 
-        quantity = self.get_cell_value(sheet_name, row, quantity_col)
-        return quantity if quantity is not None else 0
-
-    def get_max_row(self, sheet_name: str) -> int:
-        """Returns the maximum row with data in a given sheet, considering column A."""
-        ws = self.get_sheet(sheet_name)
-        max_r = 2 # Start checking from row 3 (after headers)
-        for row_idx in range(3, ws.max_row + 1):
-            if ws.cell(row=row_idx, column=1).value is not None: # Check if column A has data
-                max_r = row_idx
-        return max_r
+# Part numbers listed under the N° de parte field while typing
+MAX_SUGERENCIAS = 8
 
+# Pause in typing after which the part suggestions and label are refreshed
+PARTE_DEBOUNCE_MS = 120
 
 # --- BaseTabManager Class ---
 class BaseTabManager:
     """Base class for managing tabs with common functionalities."""
 
-    def __init__(self, tab, excel_manager: ExcelManager, tab_name: str):
+    def __init__(self, tab, inventario: Inventario, tab_name: str):
         self.tab = tab
-        self.excel_manager = excel_manager
+        self.inventario = inventario
         self.tab_name = tab_name
         self.entries = {}
+        self.panel_escaneo = None # PanelEscaneo while the scanner mode is on
         self.setup_ui()
 
     def setup_ui(self):
@@ -215,39 +79,186 @@ class BaseTabManager:
 
     def validate_required_fields(self, fields: Dict[str, str]) -> bool:
         """Validates that required fields are completed."""
-        for field, value in fields.items():
-            if not value.strip():
-                messagebox.showerror("Error de Validación", f"El campo '{field}' es obligatorio.")
-                return False
-        return True
+        try:
+            validar_requeridos(fields)
+            return True
+        except ValueError as e:
+            messagebox.showerror("Error de Validación", str(e))
+            return False
 
     def validate_positive_integer(self, field_name: str, value: str) -> Tuple[bool, int]:
         """Validates that a value is a positive integer."""
         try:
-            num = int(value)
-            if num <= 0:
-                messagebox.showerror("Error de Validación", f"{field_name} debe ser un número entero positivo.")
-                return False, 0
-            return True, num
-        except ValueError:
-            messagebox.showerror("Error de Validación", f"{field_name} debe ser un número entero válido.")
+            return True, entero_positivo(field_name, value)
+        except ValueError as e:
+            messagebox.showerror("Error de Validación", str(e))
             return False, 0
 
+    def importar_archivo(self, tipo: str):
+        """Imports a CSV/xlsx list of movements of this tab's type with a single save.
+        Rejected rows are written next to the file and summarized in a dialog."""
+        archivo = filedialog.askopenfilename(
+            title=f"Importar {tipo}s",
+            filetypes=[("Listas de movimientos", "*.csv *.xlsx"), ("CSV", "*.csv"), ("Libro de Excel", "*.xlsx")]
+        )
+        if not archivo:
+            return
+        self.tab.config(cursor="watch")
+        self.tab.update_idletasks()
+        try:
+            resultado = self.inventario.importar(tipo, archivo)
+        except Exception as e:
+            logger.error(f"Error importing {archivo}: {str(e)}", exc_info=True)
+            messagebox.showerror("Error de Importación", f"No se pudo importar el archivo: {e}")
+            return
+        finally:
+            self.tab.config(cursor="")
+
+        mensaje = f"{resultado['aplicados']} {tipo}s registrados."
+        rechazos = resultado['rechazos']
+        if rechazos:
+            archivo_rechazos = os.path.splitext(archivo)[0] + "_rechazos.csv"
+            escribir_rechazos(archivo_rechazos, rechazos)
+            detalle = "\n".join(f"- Fila {r['fila']}: {r['motivo']}" for r in rechazos[:10])
+            messagebox.showwarning(
+                "Importación con Rechazos",
+                f"{mensaje}\n{len(rechazos)} filas rechazadas (detalle en {archivo_rechazos}):\n\n{detalle}"
+            )
+        else:
+            messagebox.showinfo("Importación Completada", mensaje)
+
+    def configurar_autocompletado(self):
+        """Lists the known part numbers under the N° de parte field while typing (Down
+        moves into the list; Enter or a click picks one) and fills in the form from
+        the picked part. The label next to the field shows what is known of the part."""
+        entry = self.entries['N° de parte']
+        self.estado_parte = tk.Label(self.tab, text="", anchor='w', font=('Helvetica', 9, 'italic'))
+        self.estado_parte.grid(row=entry.grid_info()['row'], column=2, sticky='w', padx=5)
+        self.sugerencias = tk.Listbox(self.tab, height=MAX_SUGERENCIAS, exportselection=False, font=('Helvetica', 9))
+        self._consulta_parte = None # Tk after() id of the debounced part lookup
+
+        entry.bind('<KeyRelease>', self.on_parte_tecla)
+        entry.bind('<Down>', self.enfocar_sugerencias)
+        entry.bind('<Return>', lambda event: self.elegir_parte(entry.get()))
+        entry.bind('<FocusOut>', lambda event: self.tab.after(150, self.ocultar_sugerencias_sin_foco))
+        self.sugerencias.bind('<ButtonRelease-1>', self.on_sugerencia_elegida)
+        self.sugerencias.bind('<Return>', self.on_sugerencia_elegida)
+        self.sugerencias.bind('<Escape>', lambda event: (self.ocultar_sugerencias(), entry.focus_set()))
+        self.sugerencias.bind('<FocusOut>', lambda event: self.tab.after(150, self.ocultar_sugerencias_sin_foco))
+
+    def on_parte_tecla(self, event):
+        """Refreshes the suggestions and the part label once typing pauses for
+        PARTE_DEBOUNCE_MS, instead of looking the part up on every keystroke."""
+        if event.keysym in ('Down', 'Up', 'Return', 'Escape', 'Tab'):
+            if event.keysym == 'Escape':
+                self.ocultar_sugerencias()
+            return
+        self.cancelar_consulta_parte()
+        self._consulta_parte = self.tab.after(PARTE_DEBOUNCE_MS, self.consultar_parte)
+
+    def cancelar_consulta_parte(self):
+        if self._consulta_parte is not None:
+            self.tab.after_cancel(self._consulta_parte)
+            self._consulta_parte = None
+
+    def consultar_parte(self):
+        """Shows the known parts starting with the typed number and what is known of it."""
+        self._consulta_parte = None
+        parte = self.entries['N° de parte'].get().strip()
+        try:
+            sugerencias = self.inventario.sugerir_partes(parte, MAX_SUGERENCIAS) if parte else []
+            self.mostrar_parte(parte)
+        except Exception as e: # e.g. storage still loading or server unreachable: no suggestions
+            logger.debug(f"Part lookup failed for '{parte}': {str(e)}")
+            sugerencias = []
+        if not sugerencias or sugerencias == [parte]:
+            self.ocultar_sugerencias()
+            return
+        self.sugerencias.delete(0, tk.END)
+        self.sugerencias.insert(tk.END, *sugerencias)
+        self.sugerencias.config(height=len(sugerencias))
+        entry = self.entries['N° de parte']
+        self.sugerencias.place(x=entry.winfo_x(), y=entry.winfo_y() + entry.winfo_height(), width=entry.winfo_width())
+        self.sugerencias.lift()
+
+    def enfocar_sugerencias(self, event):
+        if self.sugerencias.winfo_ismapped():
+            self.sugerencias.focus_set()
+            self.sugerencias.selection_clear(0, tk.END)
+            self.sugerencias.selection_set(0)
+            self.sugerencias.activate(0)
+        return "break"
+
+    def on_sugerencia_elegida(self, event):
+        seleccion = self.sugerencias.curselection()
+        if seleccion:
+            self.elegir_parte(self.sugerencias.get(seleccion[0]))
+
+    def ocultar_sugerencias(self):
+        self.sugerencias.place_forget()
+
+    def ocultar_sugerencias_sin_foco(self):
+        """Hides the list once neither the field nor the list has the focus."""
+        if self.tab.focus_get() not in (self.entries['N° de parte'], self.sugerencias):
+            self.ocultar_sugerencias()
+
+    def elegir_parte(self, parte: str):
+        """Puts a part number in the form and fills in the fields of a known part."""
+        parte = parte.strip()
+        self.cancelar_consulta_parte()
+        self.ocultar_sugerencias()
+        entry = self.entries['N° de parte']
+        entry.delete(0, tk.END)
+        entry.insert(0, parte)
+        try:
+            datos = self.inventario.datos_parte(parte) if parte else None
+            if datos:
+                for campo in CAMPOS_PARTE:
+                    self.entries[campo].delete(0, tk.END)
+                    self.entries[campo].insert(0, "" if datos[campo] is None else str(datos[campo]))
+            self.mostrar_parte(parte, datos)
+        except Exception as e:
+            logger.error(f"Error reading part '{parte}': {str(e)}", exc_info=True)
+        self.entries['Cantidad'].focus_set()
+        return "break"
+
+    def mostrar_parte(self, parte: str, datos: Optional[Dict] = None):
+        """Shows in the label next to N° de parte whether the part is known."""
+        if datos is None and parte:
+            datos = self.inventario.datos_parte(parte)
+        if not parte:
+            self.estado_parte.config(text="")
+        elif datos:
+            self.estado_parte.config(text=f"Registrada: {datos['Nombre'] or ''}", fg="#2E7D32")
+        else:
+            self.estado_parte.config(text="Parte nueva", fg="#455A64")
+
+    def alternar_modo_escaner(self, tipo: str):
+        """Opens or closes the scanner panel of the tab; closing records what is pending."""
+        if self.panel_escaneo is None:
+            self.panel_escaneo = PanelEscaneo(self, tipo)
+        else:
+            self.cerrar_modo_escaner()
+
+    def cerrar_modo_escaner(self):
+        if self.panel_escaneo is not None:
+            self.panel_escaneo.cerrar()
+            self.panel_escaneo = None
+
     def clear_form(self):
         """Clears all form fields."""
         for entry in self.entries.values():
             entry.delete(0, tk.END)
+        if hasattr(self, 'estado_parte'):
+            self.mostrar_parte("")
 
 # --- IngresoManager Class ---
 class IngresoManager(BaseTabManager):
     """Handler for the 'Ingresos' tab."""
 
-    def __init__(self, tab, excel_manager: ExcelManager):
-        self.field_labels = [
-            'N° de parte', 'Nombre', 'Descripción', 'Unidad',
-            'Cantidad', 'Almacén', 'Ubicación', 'Encargado', 'Comentarios'
-        ]
-        super().__init__(tab, excel_manager, "Ingreso de artículos")
+    def __init__(self, tab, inventario: Inventario):
+        self.field_labels = list(CAMPOS_FORMULARIO)
+        super().__init__(tab, inventario, "Ingreso de artículos")
 
     def setup_ui(self):
         """Configures the user interface for income."""
@@ -266,6 +277,26 @@ class IngresoManager(BaseTabManager):
             font=('Helvetica', 10, 'bold')
         ).grid(row=len(self.field_labels), column=0, columnspan=2, pady=10)
 
+        tk.Button(
+            self.tab,
+            text="📂 Importar lista (CSV/xlsx)...",
+            command=lambda: self.importar_archivo('ingreso'),
+            padx=10,
+            pady=3,
+            font=('Helvetica', 9)
+        ).grid(row=len(self.field_labels) + 1, column=0, columnspan=2)
+
+        tk.Button(
+            self.tab,
+            text="⚡ Modo escáner",
+            command=lambda: self.alternar_modo_escaner('ingreso'),
+            padx=10,
+            pady=3,
+            font=('Helvetica', 9)
+        ).grid(row=len(self.field_labels) + 2, column=0, columnspan=2, pady=5)
+
+        self.configurar_autocompletado()
+
     def guardar_ingreso(self):
         """Handles the process of saving an income."""
         try:
@@ -281,21 +312,8 @@ class IngresoManager(BaseTabManager):
                 return
             datos['Cantidad'] = cantidad # Update with validated integer
 
-            # 1. Save or update to 'Ingresos de almacén'
-            ws_ingresos = self.excel_manager.get_sheet('Ingresos de almacén')
-            fila_existente_ingresos = self.excel_manager.find_part('Ingresos de almacén', datos['N° de parte'])
-
-            if fila_existente_ingresos:
-                self.actualizar_existente(fila_existente_ingresos, datos)
-            else:
-                self.crear_nuevo(datos)
-
-            # 2. Then, update inventory control
-            control_manager = ControlInventarioManager(self.excel_manager)
-            control_manager.actualizar_inventario() # This will ensure min/max are read if they exist
-
-            # 3. Finally, save all changes
-            self.excel_manager.save()
+            # Journaled first, then appended with its control row in one transaction saved once at commit
+            self.inventario.registrar_ingreso(datos)
 
             messagebox.showinfo("Éxito", "Ingreso registrado correctamente en ambas hojas.")
             self.clear_form()
@@ -304,52 +322,14 @@ class IngresoManager(BaseTabManager):
             logger.error(f"Error in guardar_ingreso: {str(e)}", exc_info=True)
             messagebox.showerror("Error", f"Ocurrió un error al guardar el ingreso: {e}")
 
-    def actualizar_existente(self, fila: int, datos: Dict):
-        """Updates an existing record in 'Ingresos de almacén' sheet."""
-        # Get current quantity in 'Ingresos de almacén'
-        cantidad_actual_ingresos = self.excel_manager.get_cell_value('Ingresos de almacén', fila, 'G') or 0
-        nueva_cantidad_ingresos = cantidad_actual_ingresos + datos['Cantidad']
-        self.excel_manager.update_cell('Ingresos de almacén', fila, 'G', nueva_cantidad_ingresos)
-
-        # Update other fields for the existing entry if they are provided (overwriting)
-        self.excel_manager.update_cell('Ingresos de almacén', fila, 'A', datetime.now().strftime("%Y-%m-%d"))
-        self.excel_manager.update_cell('Ingresos de almacén', fila, 'C', datos['Nombre'])
-        self.excel_manager.update_cell('Ingresos de almacén', fila, 'D', datos['Descripción'])
-        self.excel_manager.update_cell('Ingresos de almacén', fila, 'F', datos['Unidad'])
-        self.excel_manager.update_cell('Ingresos de almacén', fila, 'H', datos['Almacén'])
-        self.excel_manager.update_cell('Ingresos de almacén', fila, 'I', datos['Ubicación'])
-        self.excel_manager.update_cell('Ingresos de almacén', fila, 'J', datos['Encargado'])
-        self.excel_manager.update_cell('Ingresos de almacén', fila, 'K', datos['Comentarios'])
-        logger.info(f"Existing part {datos['N° de parte']} updated in 'Ingresos de almacén' row {fila}. New quantity: {nueva_cantidad_ingresos}")
-
-    def crear_nuevo(self, datos: Dict):
-        """Creates a new record in 'Ingresos de almacén' sheet."""
-        ws = self.excel_manager.get_sheet('Ingresos de almacén')
-        next_row = self.excel_manager.get_max_row('Ingresos de almacén') + 1
-
-        ws[f"A{next_row}"] = datetime.now().strftime("%Y-%m-%d")
-        ws[f"B{next_row}"] = datos['N° de parte']
-        ws[f"C{next_row}"] = datos['Nombre']
-        ws[f"D{next_row}"] = datos['Descripción']
-        ws[f"F{next_row}"] = datos['Unidad']
-        ws[f"G{next_row}"] = datos['Cantidad']
-        ws[f"H{next_row}"] = datos['Almacén']
-        ws[f"I{next_row}"] = datos['Ubicación']
-        ws[f"J{next_row}"] = datos['Encargado']
-        ws[f"K{next_row}"] = datos['Comentarios']
-        logger.info(f"New part {datos['N° de parte']} created in 'Ingresos de almacén' row {next_row}.")
-
 
 # --- SalidaManager Class ---
 class SalidaManager(BaseTabManager):
     """Handler for the 'Salidas' tab."""
 
-    def __init__(self, tab, excel_manager: ExcelManager):
-        self.field_labels = [
-            'N° de parte', 'Nombre', 'Descripción', 'Unidad',
-            'Cantidad', 'Almacén', 'Ubicación', 'Encargado', 'Comentarios'
-        ]
-        super().__init__(tab, excel_manager, "Salida de artículos")
+    def __init__(self, tab, inventario: Inventario):
+        self.field_labels = list(CAMPOS_FORMULARIO)
+        super().__init__(tab, inventario, "Salida de artículos")
 
     def setup_ui(self):
         """Configures the user interface for outputs."""
@@ -368,6 +348,41 @@ class SalidaManager(BaseTabManager):
             font=('Helvetica', 10, 'bold')
         ).grid(row=len(self.field_labels), column=0, columnspan=2, pady=10)
 
+        tk.Button(
+            self.tab,
+            text="📂 Importar lista (CSV/xlsx)...",
+            command=lambda: self.importar_archivo('salida'),
+            padx=10,
+            pady=3,
+            font=('Helvetica', 9)
+        ).grid(row=len(self.field_labels) + 1, column=0, columnspan=2)
+
+        tk.Button(
+            self.tab,
+            text="⚡ Modo escáner",
+            command=lambda: self.alternar_modo_escaner('salida'),
+            padx=10,
+            pady=3,
+            font=('Helvetica', 9)
+        ).grid(row=len(self.field_labels) + 2, column=0, columnspan=2, pady=5)
+
+        self.configurar_autocompletado()
+
+    def mostrar_parte(self, parte: str, datos: Optional[Dict] = None):
+        """Shows the stock a salida of the part can take, before submitting."""
+        if datos is None and parte:
+            datos = self.inventario.datos_parte(parte)
+        if not parte:
+            self.estado_parte.config(text="")
+        elif datos is None:
+            self.estado_parte.config(text="Sin ingresos: no se puede dar salida", fg="#c62828")
+        else:
+            disponible = datos['disponible']
+            self.estado_parte.config(
+                text=f"Disponible: {disponible} {datos['Unidad'] or ''}".rstrip(),
+                fg="#2E7D32" if disponible > 0 else "#c62828"
+            )
+
     def guardar_salida(self):
         """Handles the process of saving an output."""
         try:
@@ -382,66 +397,345 @@ class SalidaManager(BaseTabManager):
                 return
             datos['Cantidad'] = cantidad
 
-            # Verify existence in income (main inventory tracking)
-            # We are checking 'Control de inventarios' for the stock status, but the
-            # actual deduction of stock happens in 'Ingresos de almacén'.
-            fila_ingreso = self.excel_manager.find_part('Ingresos de almacén', datos['N° de parte'])
-            if not fila_ingreso:
-                messagebox.showerror("Error", "El N° de parte no existe en el registro de ingresos. No se puede realizar la salida.")
-                return
-
-            # Verify available quantity from 'Ingresos de almacén'
-            cantidad_disponible = self.excel_manager.get_current_quantity('Ingresos de almacén', fila_ingreso)
-            if cantidad > cantidad_disponible:
-                messagebox.showerror(
-                    "Error",
-                    f"Cantidad insuficiente. Disponible: {cantidad_disponible}, Solicitado: {cantidad}"
-                )
+            # Verifies part existence and the stock derived from the ledger, then journals
+            # the output and appends it in one transaction saved once at commit
+            try:
+                self.inventario.registrar_salida(datos)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
 
-            # Register output in 'Salidas de almacén'
-            self.registrar_salida(datos)
-
-            # Update inventory (reduce quantity in 'Ingresos de almacén')
-            nueva_cantidad = cantidad_disponible - cantidad
-            self.excel_manager.update_cell('Ingresos de almacén', fila_ingreso, 'G', nueva_cantidad)
-            logger.info(f"Stock for part {datos['N° de parte']} updated in 'Ingresos de almacén' to {nueva_cantidad}.")
-
-            self.excel_manager.save()
             messagebox.showinfo("Éxito", "Salida registrada y cantidad actualizada correctamente.")
             self.clear_form()
 
-            # Automatically update inventory control
-            ControlInventarioManager(self.excel_manager).actualizar_inventario()
-
         except Exception as e:
             logger.error(f"Error in guardar_salida: {str(e)}", exc_info=True)
             messagebox.showerror("Error", f"Ocurrió un error al guardar la salida: {e}")
 
-    def registrar_salida(self, datos: Dict):
-        """Registers a new output in 'Salidas de almacén' Excel sheet."""
-        ws = self.excel_manager.get_sheet('Salidas de almacén')
-        next_row = self.excel_manager.get_max_row('Salidas de almacén') + 1
-
-        ws[f"A{next_row}"] = datetime.now().strftime("%Y-%m-%d")
-        ws[f"B{next_row}"] = datos['N° de parte']
-        ws[f"C{next_row}"] = datos['Nombre']
-        ws[f"D{next_row}"] = datos['Descripción']
-        ws[f"F{next_row}"] = datos['Unidad']
-        ws[f"G{next_row}"] = datos['Cantidad']
-        ws[f"H{next_row}"] = datos['Almacén']
-        ws[f"I{next_row}"] = datos['Ubicación']
-        ws[f"J{next_row}"] = datos['Encargado']
-        ws[f"K{next_row}"] = datos['Comentarios']
-        logger.info(f"New part {datos['N° de parte']} output registered in 'Salidas de almacén' row {next_row}.")
+# --- PanelEscaneo Class ---
+class PanelEscaneo:
+    """Scanner mode of the Ingreso and Salida tabs: each scan (Enter) goes into a
+    visible queue without dialogs, scans of the same part are merged, and the queue is
+    recorded as one batch (one save) every ColaEscaneos.max_escaneos scans or
+    max_espera seconds. The other form fields (Encargado, Comentarios...) apply to the
+    whole batch and supply the data of parts not registered yet."""
+
+    TICK_MS = 250
+
+    def __init__(self, tab_manager: BaseTabManager, tipo: str):
+        self.tab_manager = tab_manager
+        self.tab = tab_manager.tab
+        self.cola = ColaEscaneos(tab_manager.inventario, tipo)
+
+        self.frame = tk.LabelFrame(self.tab, text=f"⚡ Modo escáner ({tipo}s)", padx=8, pady=5,
+                                   font=('Helvetica', 10, 'bold'))
+        self.frame.grid(row=0, column=3, rowspan=len(CAMPOS_FORMULARIO) + 3, sticky='nsew', padx=10, pady=5)
+        tk.Label(self.frame, text="Escanee o escriba el N° de parte y Enter (P-001*5 = 5 unidades)",
+                 font=('Helvetica', 9, 'italic')).pack(anchor='w')
+
+        fila = tk.Frame(self.frame)
+        fila.pack(fill='x', pady=3)
+        self.entrada = tk.Entry(fila, width=28, font=('Helvetica', 12))
+        self.entrada.pack(side='left')
+        tk.Label(fila, text="Cant.").pack(side='left', padx=(8, 2))
+        self.cantidad = tk.Spinbox(fila, from_=1, to=99999, width=6)
+        self.cantidad.pack(side='left')
+        self.entrada.bind('<Return>', self.on_escaneo)
+
+        self.lista = ttk.Treeview(self.frame, columns=('parte', 'cantidad'), show='headings', height=10)
+        self.lista.heading('parte', text="N° de parte")
+        self.lista.heading('cantidad', text="Cantidad")
+        self.lista.column('parte', width=200)
+        self.lista.column('cantidad', width=80, anchor='center')
+        self.lista.pack(fill='both', expand=True, pady=3)
+
+        self.estado = tk.Label(self.frame, text="", anchor='w', font=('Helvetica', 9))
+        self.estado.pack(fill='x')
+        self.resultado = tk.Label(self.frame, text="", anchor='w', justify='left', wraplength=320, font=('Helvetica', 9))
+        self.resultado.pack(fill='x')
+
+        botones = tk.Frame(self.frame)
+        botones.pack(fill='x', pady=3)
+        tk.Button(botones, text="Registrar ahora", command=self.confirmar, bg="#4CAF50", fg="white",
+                  font=('Helvetica', 9, 'bold')).pack(side='left')
+        tk.Button(botones, text="Descartar", command=self.descartar, font=('Helvetica', 9)).pack(side='left', padx=5)
+
+        self.refrescar()
+        self.entrada.focus_set()
+        self._tick = self.tab.after(self.TICK_MS, self.revisar)
+
+    def on_escaneo(self, event):
+        try:
+            parte, cantidad = leer_escaneo(self.entrada.get(), self.cantidad.get())
+        except ValueError as e:
+            self.tab.bell()
+            self.resultado.config(text=str(e), fg="#c62828")
+            return "break"
+        self.entrada.delete(0, tk.END)
+        self.cantidad.delete(0, tk.END)
+        self.cantidad.insert(0, "1")
+        if self.cola.escanear(parte, cantidad):
+            self.confirmar()
+        else:
+            self.refrescar()
+        return "break"
+
+    def plantilla(self) -> Dict:
+        """Form fields applied to every movement of the batch."""
+        return {campo: entry.get().strip() for campo, entry in self.tab_manager.entries.items()
+                if campo not in ('N° de parte', 'Cantidad')}
+
+    def confirmar(self):
+        """Records the queue as one batch; rejected parts are listed without a dialog."""
+        try:
+            resultado = self.cola.confirmar(self.plantilla())
+        except Exception as e:
+            logger.error(f"Error recording a scan batch: {str(e)}", exc_info=True)
+            self.tab.bell()
+            self.resultado.config(text=f"No se pudo registrar el lote; se reintentará: {e}", fg="#c62828")
+            self.refrescar()
+            return
+        self.refrescar()
+        if resultado is None:
+            return
+        texto = f"✔ {resultado['aplicados']} movimientos registrados a las {datetime.now():%H:%M:%S}"
+        rechazos = resultado['rechazos']
+        if rechazos:
+            self.tab.bell()
+            texto += f"\n✖ {len(rechazos)} rechazados:\n" + "\n".join(f"- {r['parte']}: {r['motivo']}" for r in rechazos[:5])
+        self.resultado.config(text=texto, fg="#c62828" if rechazos else "#2E7D32")
+
+    def descartar(self):
+        if self.cola.pendientes and messagebox.askyesno("Modo escáner", "¿Descartar los escaneos pendientes?"):
+            self.cola.descartar()
+            self.refrescar()
+
+    def refrescar(self):
+        """Shows the pending queue and when it will be recorded."""
+        self.lista.delete(*self.lista.get_children())
+        for parte, cantidad in self.cola.pendientes:
+            self.lista.insert("", "end", values=(parte, cantidad))
+        restantes = self.cola.segundos_restantes()
+        if restantes is None:
+            self.estado.config(text="Sin escaneos pendientes")
+        else:
+            self.estado.config(
+                text=f"{self.cola.escaneos} escaneos, {len(self.cola.pendientes)} partes pendientes; "
+                     f"se registran en {restantes:.0f} s o al llegar a {self.cola.max_escaneos} escaneos"
+            )
+
+    def revisar(self):
+        """Periodic check from the Tk main loop: records the queue when it is due."""
+        if self.cola.vencida():
+            self.confirmar()
+        elif self.cola.pendientes:
+            self.refrescar()
+        self._tick = self.tab.after(self.TICK_MS, self.revisar)
+
+    def cerrar(self):
+        """Records what is pending and removes the panel."""
+        self.tab.after_cancel(self._tick)
+        self.confirmar()
+        if self.cola.pendientes:
+            messagebox.showwarning("Modo escáner", "No se pudieron registrar los escaneos pendientes; revise el log.")
+        self.frame.destroy()
+
+# --- VirtualTable Class ---
+class VirtualTable:
+    """Treeview that only materializes the rows in view plus a small buffer.
+
+    The data stays in the DataFrame; the vertical scrollbar, the mouse wheel and the
+    paging buttons move a window over it and the Treeview items of the window are
+    reused, so the display cost depends on the window size and not on the history.
+    A filter (the row positions of a search) is applied the same way, without copying
+    the frame."""
+
+    DEFAULT_ROW_HEIGHT = 20
+    MAX_COLUMN_WIDTH = 300
+
+    def __init__(self, parent, buffer_rows: int = 10):
+        self.df = None
+        self.filas = None # Positions of the rows shown when filtered, None for all
+        self.offset = 0 # Position in the shown rows of the first row in view
+        self.buffer_rows = buffer_rows # Rows materialized below the view
+        self.tag_func = None # Optional callable(values) -> tags, for row coloring
+        self._anchos = None # (DataFrame, {column: width}) of the last auto-sizing
+
+        container = ttk.Frame(parent)
+        container.pack(expand=True, fill='both')
+
+        self.tree = ttk.Treeview(container, show="headings")
+        self.tree.pack(side='left', expand=True, fill='both')
+
+        # The vertical scrollbar drives the window instead of the Treeview itself
+        self.vsb = ttk.Scrollbar(container, orient="vertical", command=self.on_scrollbar)
+        self.vsb.pack(side='right', fill='y')
+        hsb = ttk.Scrollbar(parent, orient="horizontal", command=self.tree.xview)
+        hsb.pack(side='bottom', fill='x')
+        self.tree.configure(xscrollcommand=hsb.set)
+
+        # Paging controls and row-count status line
+        nav_frame = tk.Frame(parent)
+        nav_frame.pack(side='bottom', fill='x')
+        for text, command in (
+            ("⏮", self.primera_pagina),
+            ("◀ Anterior", self.pagina_anterior),
+            ("Siguiente ▶", self.pagina_siguiente),
+            ("⏭", self.ultima_pagina)
+        ):
+            tk.Button(nav_frame, text=text, command=command, padx=6, font=('Helvetica', 9)).pack(side='left', padx=2, pady=2)
+        self.status_label = tk.Label(nav_frame, text="Sin datos", anchor='e', font=('Helvetica', 9, 'italic'), fg="#455A64")
+        self.status_label.pack(side='right', padx=5)
+
+        self.tree.bind('<Configure>', lambda event: self.render())
+        self.tree.bind('<MouseWheel>', self.on_mousewheel) # Windows / macOS
+        self.tree.bind('<Button-4>', lambda event: self.desplazar(-3) or "break") # X11 wheel up
+        self.tree.bind('<Button-5>', lambda event: self.desplazar(3) or "break") # X11 wheel down
+
+    @property
+    def total_rows(self) -> int:
+        if self.filas is not None:
+            return len(self.filas)
+        return len(self.df) if self.df is not None else 0
+
+    def set_data(self, df: 'pd.DataFrame', tag_func=None):
+        """Shows a DataFrame from its first row."""
+        self.df = df
+        self.filas = None
+        self.tag_func = tag_func
+        self.offset = 0
+
+        self.tree.delete(*self.tree.get_children())
+        self.tree["columns"] = list(df.columns)
+        for col in df.columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=100, anchor='center', stretch=tk.YES)
+        self.render()
+
+    def filtrar(self, filas):
+        """Shows only the rows at the given positions (None shows them all again)."""
+        if self.df is None:
+            return
+        self.filas = filas
+        self.offset = 0
+        self.render()
+
+    def visible_rows(self) -> int:
+        """Number of rows that fit in the Treeview at its current height."""
+        try:
+            row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or self.DEFAULT_ROW_HEIGHT)
+        except (tk.TclError, ValueError):
+            row_height = self.DEFAULT_ROW_HEIGHT
+        height = self.tree.winfo_height()
+        if height <= 1: # Not mapped yet
+            return int(self.tree.cget('height'))
+        return max(1, height // row_height - 1) # One row height is taken by the headings
+
+    @staticmethod
+    def _formatear(value):
+        """Shows empty cells (None / NaN) as blank instead of 'None' or 'nan'."""
+        if value is None or (isinstance(value, float) and value != value):
+            return ""
+        return value
+
+    def render(self):
+        """Materializes the rows of the current window, reusing the existing items."""
+        total = self.total_rows
+        visibles = self.visible_rows()
+        self.offset = max(0, min(self.offset, total - visibles))
+        fin = min(total, self.offset + visibles + self.buffer_rows)
+
+        items = self.tree.get_children()
+        count = 0
+        if total:
+            ventana = self.df.iloc[self.offset:fin] if self.filas is None else self.df.iloc[self.filas[self.offset:fin]]
+            for values in ventana.itertuples(index=False, name=None):
+                values = [self._formatear(v) for v in values]
+                tags = self.tag_func(values) if self.tag_func else ()
+                if count < len(items):
+                    self.tree.item(items[count], values=values, tags=tags)
+                else:
+                    self.tree.insert("", "end", values=values, tags=tags)
+                count += 1
+        if count < len(items):
+            self.tree.delete(*items[count:])
+        self.tree.selection_set(()) # Items now hold other rows
+        self.tree.yview_moveto(0)
+
+        if total:
+            ultimo = min(total, self.offset + visibles)
+            self.vsb.set(self.offset / total, ultimo / total)
+            filtro = f" (filtradas de {len(self.df):,})" if self.filas is not None else ""
+            self.status_label.config(text=f"Filas {self.offset + 1:,}–{ultimo:,} de {total:,}{filtro}")
+        else:
+            self.vsb.set(0, 1)
+            self.status_label.config(text="Sin coincidencias" if self.filas is not None else "Sin registros")
+
+    def calcular_anchos(self, df: 'pd.DataFrame', max_muestra: int = 5000) -> Dict:
+        """Computes the width of each column from the header and the longest value,
+        with vectorized string lengths over the DataFrame (or a bounded sample of it)."""
+        if len(df) > max_muestra:
+            df = df.sample(n=max_muestra, random_state=0)
+        anchos = {}
+        for i, col in enumerate(df.columns):
+            serie = df.iloc[:, i]
+            header_len = len(str(col)) * 8
+            content_len = int(serie.where(serie.notna(), "").astype(str).str.len().max()) * 7 if len(serie) else 0
+            anchos[col] = min(self.MAX_COLUMN_WIDTH, max(header_len, content_len) + 10)
+        return anchos
+
+    def ajustar_anchos(self, max_muestra: int = 5000):
+        """Adjusts column widths to the content; the widths are cached per loaded DataFrame."""
+        if self.df is None:
+            return
+        if self._anchos is None or self._anchos[0] is not self.df:
+            self._anchos = (self.df, self.calcular_anchos(self.df, max_muestra))
+        for col, ancho in self._anchos[1].items():
+            self.tree.column(col, width=ancho)
+
+    def desplazar(self, filas: int):
+        """Moves the window by a number of rows."""
+        self.offset += filas
+        self.render()
+
+    def on_scrollbar(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units'|'pages')."""
+        if args[0] == 'moveto':
+            self.offset = int(float(args[1]) * self.total_rows)
+            self.render()
+        elif args[0] == 'scroll':
+            paso = int(args[1])
+            if args[2] == 'pages':
+                paso *= self.visible_rows()
+            self.desplazar(paso)
+
+    def on_mousewheel(self, event):
+        self.desplazar(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def primera_pagina(self):
+        self.offset = 0
+        self.render()
+
+    def pagina_anterior(self):
+        self.desplazar(-self.visible_rows())
+
+    def pagina_siguiente(self):
+        self.desplazar(self.visible_rows())
+
+    def ultima_pagina(self):
+        self.offset = self.total_rows
+        self.render()
 
 # --- ConsultaManager Class ---
 class ConsultaManager:
     """Handler for the 'Consultas' tab with separate visualization."""
 
-    def __init__(self, tab, excel_manager: ExcelManager):
+    def __init__(self, tab, inventario: Inventario):
         self.tab = tab
-        self.excel_manager = excel_manager
+        self.inventario = inventario
+        self._indices = {} # {VirtualTable: IndiceBusqueda of the frame it shows}
+        self._busqueda_pendiente = None # Tk after() id of the debounced search
         self.setup_ui()
 
     def setup_ui(self):
@@ -469,6 +763,43 @@ class ConsultaManager:
                 font=('Helvetica', 9, 'bold')
             ).pack(side='left', padx=5)
 
+        # Search box: filters the table in view while typing
+        buscar_frame = tk.Frame(self.tab)
+        buscar_frame.pack(fill='x', padx=10)
+        tk.Label(buscar_frame, text="🔎 Buscar:", font=('Helvetica', 9, 'bold')).pack(side='left')
+        self.busqueda = tk.StringVar()
+        tk.Entry(buscar_frame, textvariable=self.busqueda, width=50).pack(side='left', padx=5)
+        tk.Button(buscar_frame, text="✖", command=lambda: self.busqueda.set(""), padx=4,
+                  font=('Helvetica', 8)).pack(side='left')
+        tk.Label(
+            buscar_frame,
+            text="N° de parte, nombre, descripción, almacén, ubicación o encargado",
+            font=('Helvetica', 8, 'italic'),
+            fg="#607D8B"
+        ).pack(side='left', padx=5)
+        self.busqueda.trace_add('write', self.programar_busqueda)
+
+        # Date range: movements between two dates and consumption per part, read through the date index
+        rango_frame = tk.Frame(self.tab)
+        rango_frame.pack(fill='x', padx=10, pady=(5, 0))
+        self.rango_desde = tk.StringVar()
+        self.rango_hasta = tk.StringVar()
+        for texto, variable in (("📅 Desde:", self.rango_desde), ("Hasta:", self.rango_hasta)):
+            tk.Label(rango_frame, text=texto, font=('Helvetica', 9, 'bold')).pack(side='left')
+            tk.Entry(rango_frame, textvariable=variable, width=12).pack(side='left', padx=5)
+        for texto, color, comando in (
+            ("Movimientos del período", "#3F51B5", self.mostrar_movimientos_rango),
+            ("Consumo por parte", "#795548", self.mostrar_consumo_rango)
+        ):
+            tk.Button(rango_frame, text=texto, command=comando, bg=color, fg="white", padx=8,
+                      font=('Helvetica', 9, 'bold')).pack(side='left', padx=5)
+        tk.Label(
+            rango_frame,
+            text="AAAA-MM-DD, ambas incluidas; vacío = sin límite",
+            font=('Helvetica', 8, 'italic'),
+            fg="#607D8B"
+        ).pack(side='left', padx=5)
+
         # Notebook for separate tables
         self.tabs_control = ttk.Notebook(self.tab)
         self.tabs_control.pack(expand=1, fill='both', padx=10, pady=10)
@@ -477,59 +808,98 @@ class ConsultaManager:
         self.tab_ingresos = ttk.Frame(self.tabs_control)
         self.tab_salidas = ttk.Frame(self.tabs_control)
         self.tab_inventario = ttk.Frame(self.tabs_control)
+        self.tab_stock_al = ttk.Frame(self.tabs_control)
+        self.tab_consumo = ttk.Frame(self.tabs_control)
 
         self.tabs_control.add(self.tab_ingresos, text="📥 Ingresos")
         self.tabs_control.add(self.tab_salidas, text="📤 Salidas")
         self.tabs_control.add(self.tab_inventario, text="📊 Inventario")
-
-        # Treeviews for each tab
-        self.tree_ingresos = self.create_treeview(self.tab_ingresos)
-        self.tree_salidas = self.create_treeview(self.tab_salidas)
-        self.tree_inventario = self.create_treeview(self.tab_inventario)
-
-    def create_treeview(self, parent):
-        """Creates a Treeview with scrollbars."""
-        container = ttk.Frame(parent)
-        container.pack(expand=True, fill='both')
-
-        tree = ttk.Treeview(container)
-        tree.pack(side='left', expand=True, fill='both')
-
-        vsb = ttk.Scrollbar(container, orient="vertical", command=tree.yview)
-        vsb.pack(side='right', fill='y')
-        hsb = ttk.Scrollbar(parent, orient="horizontal", command=tree.xview)
-        hsb.pack(side='bottom', fill='x')
-
-        tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        return tree
+        self.tabs_control.add(self.tab_stock_al, text="🕓 Stock a fecha")
+        self.tabs_control.add(self.tab_consumo, text="📉 Consumo")
+
+        # Date of the stock-as-of query, above its table
+        fecha_frame = tk.Frame(self.tab_stock_al)
+        fecha_frame.pack(fill='x', pady=5)
+        tk.Label(fecha_frame, text="Fecha (AAAA-MM-DD):", font=('Helvetica', 9, 'bold')).pack(side='left')
+        self.fecha_stock = tk.StringVar(value=datetime.now().strftime("%Y-%m-%d"))
+        entrada_fecha = tk.Entry(fecha_frame, textvariable=self.fecha_stock, width=12)
+        entrada_fecha.pack(side='left', padx=5)
+        entrada_fecha.bind('<Return>', lambda event: self.mostrar_stock_al())
+        tk.Button(fecha_frame, text="Consultar", command=self.mostrar_stock_al, bg="#00796B", fg="white",
+                  padx=10, font=('Helvetica', 9, 'bold')).pack(side='left', padx=5)
+        tk.Label(
+            fecha_frame,
+            text="Stock al final del día, de las partes con stock distinto de cero",
+            font=('Helvetica', 8, 'italic'),
+            fg="#607D8B"
+        ).pack(side='left', padx=5)
+
+        # Virtualized tables for each tab
+        self.tabla_ingresos = VirtualTable(self.tab_ingresos)
+        self.tabla_salidas = VirtualTable(self.tab_salidas)
+        self.tabla_inventario = VirtualTable(self.tab_inventario)
+        self.tabla_stock_al = VirtualTable(self.tab_stock_al)
+        self.tabla_consumo = VirtualTable(self.tab_consumo)
+
+        # Configure colors for inventory status tags
+        self.tabla_inventario.tree.tag_configure('agotado', background='#ffcdd2')  # Light Red
+        self.tabla_inventario.tree.tag_configure('alerta', background='#fff9c4')  # Light Yellow
+        self.tabla_inventario.tree.tag_configure('advertencia', background='#ffcc80') # Light Orange
+
+        self.tabs_control.bind('<<NotebookTabChanged>>', lambda event: self.aplicar_busqueda())
+
+    def tabla_actual(self) -> VirtualTable:
+        tablas = (self.tabla_ingresos, self.tabla_salidas, self.tabla_inventario, self.tabla_stock_al,
+                  self.tabla_consumo)
+        return tablas[self.tabs_control.index('current')]
+
+    def programar_busqueda(self, *args):
+        """Runs the search once typing pauses for BUSQUEDA_DEBOUNCE_MS."""
+        if self._busqueda_pendiente is not None:
+            self.tab.after_cancel(self._busqueda_pendiente)
+        self._busqueda_pendiente = self.tab.after(BUSQUEDA_DEBOUNCE_MS, self.aplicar_busqueda)
+
+    def aplicar_busqueda(self, tabla: Optional[VirtualTable] = None):
+        """Filters a table (the one in view by default) with the search box text. The
+        index of each loaded frame is built on its first search and reused while the
+        frame is shown; an empty box shows every row again."""
+        self._busqueda_pendiente = None
+        tabla = tabla or self.tabla_actual()
+        if tabla.df is None:
+            return
+        consulta = self.busqueda.get()
+        if not consulta.strip():
+            if tabla.filas is not None:
+                tabla.filtrar(None)
+            return
+        try:
+            indice = self._indices.get(tabla)
+            if indice is None or indice.df is not tabla.df:
+                from almacen.busqueda import IndiceBusqueda
+                indice = self._indices[tabla] = IndiceBusqueda(tabla.df)
+            tabla.filtrar(indice.buscar(consulta))
+        except Exception as e:
+            logger.error(f"Error searching '{consulta}': {str(e)}", exc_info=True)
 
     def cargar_todo(self):
         """Loads and displays data from income, outcome, and inventory."""
         try:
             # Load income data
-            df_ingresos = pd.read_excel(
-                self.excel_manager.archivo_excel,
-                sheet_name='Ingresos de almacén',
-                skiprows=2 # Ensure this matches your header structure
-            ).dropna(how='all') # Drop rows that are entirely NaN
+            df_ingresos = self.inventario.read_dataframe('Ingresos de almacén')
 
             # Load outcome data
-            df_salidas = pd.read_excel(
-                self.excel_manager.archivo_excel,
-                sheet_name='Salidas de almacén',
-                skiprows=2 # Ensure this matches your header structure
-            ).dropna(how='all') # Drop rows that are entirely NaN
+            df_salidas = self.inventario.read_dataframe('Salidas de almacén')
 
-            self.mostrar_datos(self.tree_ingresos, df_ingresos)
-            self.mostrar_datos(self.tree_salidas, df_salidas)
+            self.mostrar_datos(self.tabla_ingresos, df_ingresos)
+            self.mostrar_datos(self.tabla_salidas, df_salidas)
 
             # Load inventory data
             self.mostrar_inventario()
 
             # Auto-adjust column width
-            self.autoajustar_columnas(self.tree_ingresos)
-            self.autoajustar_columnas(self.tree_salidas)
-            self.autoajustar_columnas(self.tree_inventario)
+            self.autoajustar_columnas(self.tabla_ingresos)
+            self.autoajustar_columnas(self.tabla_salidas)
+            self.autoajustar_columnas(self.tabla_inventario)
 
             messagebox.showinfo("Éxito", "Datos cargados correctamente en las pestañas correspondientes.")
 
@@ -540,46 +910,14 @@ class ConsultaManager:
     def mostrar_inventario(self):
         """Displays the current inventory status."""
         try:
-            # Ensure inventory is updated before displaying
-            ControlInventarioManager(self.excel_manager).actualizar_inventario()
-            self.excel_manager.save() # Save changes made by actualizar_inventario
-
-            df_inventario = pd.read_excel(
-                self.excel_manager.archivo_excel,
-                sheet_name='Control de inventarios',
-                skiprows=2 # Ensure this matches your header structure
-            ).dropna(how='all') # Drop rows that are entirely NaN
-
-            # Configure specific columns for inventory
-            self.tree_inventario["columns"] = list(df_inventario.columns)
-            self.tree_inventario["show"] = "headings"
-
-            for col in df_inventario.columns:
-                self.tree_inventario.heading(col, text=col)
-                self.tree_inventario.column(col, width=100, anchor='center', stretch=tk.YES)
-
-            # Clear and load data
-            self.tree_inventario.delete(*self.tree_inventario.get_children())
-
-            for _, row in df_inventario.iterrows():
-                values = list(row)
-                estado = str(values[-1]) if len(values) > 5 else "" # Convert to string for 'in' check
-
-                # Assign tags for coloring based on status
-                tags = ()
-                if "AGOTADO" in estado or "URGENTE" in estado:
-                    tags = ('agotado',)
-                elif "ALERTA" in estado:
-                    tags = ('alerta',)
-                elif "ADVERTENCIA" in estado:
-                    tags = ('advertencia',)
-
-                self.tree_inventario.insert("", "end", values=values, tags=tags)
-
-            # Configure colors for tags
-            self.tree_inventario.tag_configure('agotado', background='#ffcdd2')  # Light Red
-            self.tree_inventario.tag_configure('alerta', background='#fff9c4')  # Light Yellow
-            self.tree_inventario.tag_configure('advertencia', background='#ffcc80') # Light Orange
+            # Ensure inventory is updated before displaying (saved by its own transaction, only if it changed)
+            self.inventario.recalcular()
+
+            df_inventario = self.inventario.read_dataframe('Control de inventarios')
+
+            # Only the rows in view are materialized, colored by their status
+            self.tabla_inventario.set_data(df_inventario, tag_func=self.etiqueta_estado)
+            self.aplicar_busqueda(self.tabla_inventario)
 
             # Select inventory tab
             self.tabs_control.select(2) # Index 2 is the 'Inventario' tab
@@ -588,45 +926,107 @@ class ConsultaManager:
             logger.error(f"Error loading inventory: {str(e)}", exc_info=True)
             messagebox.showerror("Error", f"No se pudo cargar el inventario: {e}")
 
-    def mostrar_datos(self, tree: ttk.Treeview, df: pd.DataFrame):
-        """Displays data in the specified Treeview."""
-        # Clear treeview
-        tree.delete(*tree.get_children())
+    def mostrar_stock_al(self):
+        """Displays the stock of every part as of the end of the date in the box, computed
+        from the nearest stock snapshot and the movements after it."""
+        fecha = self.fecha_stock.get().strip()
+        try:
+            import pandas as pd
+            stock = self.inventario.stock_al(fecha)
+            control = self.inventario.read_dataframe('Control de inventarios')
+            nombres = dict(zip(control['N° de parte'].astype(str).str.strip(), control['Nombre']))
+            partes = sorted(stock)
+            df = pd.DataFrame({
+                'N° de parte': partes,
+                'Nombre': [nombres.get(parte) for parte in partes],
+                f'Stock al {fecha}': [stock[parte] for parte in partes],
+            })
+            self.mostrar_datos(self.tabla_stock_al, df)
+            self.autoajustar_columnas(self.tabla_stock_al)
+            self.tabs_control.select(3) # Index 3 is the 'Stock a fecha' tab
+
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+        except Exception as e:
+            logger.error(f"Error loading the stock as of {fecha}: {str(e)}", exc_info=True)
+            messagebox.showerror("Error", f"No se pudo calcular el stock al {fecha}: {e}")
 
-        # Configure columns
-        tree["columns"] = list(df.columns)
-        tree["show"] = "headings"
+    def rango_fechas(self) -> Tuple[Optional[str], Optional[str]]:
+        """Dates of the range boxes (None for an empty box)."""
+        return self.rango_desde.get().strip() or None, self.rango_hasta.get().strip() or None
 
-        for col in df.columns:
-            tree.heading(col, text=col)
-            tree.column(col, width=100, anchor='center', stretch=tk.YES)
-
-        # Insert data
-        for _, row in df.iterrows():
-            tree.insert("", "end", values=list(row))
-
-    def autoajustar_columnas(self, tree: ttk.Treeview):
-        """Automatically adjusts column width to content."""
-        tree.update_idletasks()
-        for col in tree["columns"]:
-            # Consider both header and content length
-            header_len = len(str(tree.heading(col)["text"])) * 8
-            content_lens = [len(str(tree.set(item, col))) * 7 for item in tree.get_children()]
-            max_len = max(header_len, *content_lens)
-            tree.column(col, width=min(300, max_len + 10))  # Max limit of 300
+    def mostrar_movimientos_rango(self):
+        """Loads the Ingresos and Salidas tables with the movements of the date range
+        only; 'Cargar Todo' shows every movement again."""
+        desde, hasta = self.rango_fechas()
+        try:
+            for sheet_name, tabla in (('Ingresos de almacén', self.tabla_ingresos),
+                                      ('Salidas de almacén', self.tabla_salidas)):
+                df = self.inventario.movimientos_entre(sheet_name, desde, hasta).reset_index(drop=True)
+                self.mostrar_datos(tabla, df)
+                self.autoajustar_columnas(tabla)
+            if self.tabs_control.index('current') > 1:
+                self.tabs_control.select(0)
+
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+        except Exception as e:
+            logger.error(f"Error loading the movements from {desde} to {hasta}: {str(e)}", exc_info=True)
+            messagebox.showerror("Error", f"No se pudieron cargar los movimientos del período: {e}")
+
+    def mostrar_consumo_rango(self):
+        """Displays the total salidas of each part in the date range, largest first."""
+        desde, hasta = self.rango_fechas()
+        try:
+            import pandas as pd
+            consumo = self.inventario.consumo_entre(desde, hasta)
+            control = self.inventario.read_dataframe('Control de inventarios')
+            nombres = dict(zip(control['N° de parte'].astype(str).str.strip(), control['Nombre']))
+            df = pd.DataFrame({
+                'N° de parte': list(consumo),
+                'Nombre': [nombres.get(parte) for parte in consumo],
+                'Salidas en el período': list(consumo.values()),
+            })
+            self.mostrar_datos(self.tabla_consumo, df)
+            self.autoajustar_columnas(self.tabla_consumo)
+            self.tabs_control.select(4) # Index 4 is the 'Consumo' tab
+
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+        except Exception as e:
+            logger.error(f"Error loading the consumption from {desde} to {hasta}: {str(e)}", exc_info=True)
+            messagebox.showerror("Error", f"No se pudo calcular el consumo del período: {e}")
+
+    @staticmethod
+    def etiqueta_estado(values) -> tuple:
+        """Returns the coloring tag of an inventory row from its status column."""
+        estado = str(values[-1]) if len(values) > 5 else "" # Convert to string for 'in' check
+        if "AGOTADO" in estado or "URGENTE" in estado:
+            return ('agotado',)
+        elif "ALERTA" in estado:
+            return ('alerta',)
+        elif "ADVERTENCIA" in estado:
+            return ('advertencia',)
+        return ()
+
+    def mostrar_datos(self, tabla: VirtualTable, df: 'pd.DataFrame'):
+        """Displays data in the specified table (only the rows in view are materialized),
+        filtered by the current search."""
+        tabla.set_data(df)
+        self.aplicar_busqueda(tabla)
+
+    def autoajustar_columnas(self, tabla: VirtualTable):
+        """Automatically adjusts column width to content (header and values of the DataFrame)."""
+        tabla.ajustar_anchos()
 
     def cargar_datos(self, sheet_name: str):
         """Method to load data into the corresponding tab."""
         try:
-            df = pd.read_excel(
-                self.excel_manager.archivo_excel,
-                sheet_name=sheet_name,
-                skiprows=2 # Adjust as needed for your actual header rows
-            ).dropna(how='all') # Drop rows that are entirely NaN
+            df = self.inventario.read_dataframe(sheet_name)
 
-            target_tree = self.tree_ingresos if "Ingresos" in sheet_name else self.tree_salidas
-            self.mostrar_datos(target_tree, df)
-            self.autoajustar_columnas(target_tree)
+            target_tabla = self.tabla_ingresos if "Ingresos" in sheet_name else self.tabla_salidas
+            self.mostrar_datos(target_tabla, df)
+            self.autoajustar_columnas(target_tabla)
 
             # Select the corresponding tab
             tab_index = 0 if "Ingresos" in sheet_name else 1
@@ -638,288 +1038,163 @@ class ConsultaManager:
             logger.error(f"Error loading '{sheet_name}': {str(e)}", exc_info=True)
             messagebox.showerror("Error", f"No se pudo cargar los datos de '{sheet_name}': {e}")
 
-# --- ControlInventarioManager Class ---
-class ControlInventarioManager:
-    """Handler for advanced inventory control."""
+# --- SaveStatusIndicator Class ---
+class SaveStatusIndicator:
+    """Label showing whether the background writer has pending, saved or failed saves.
+    The worker never touches Tk; this polls its status queue from the main loop with after()."""
 
-    def __init__(self, excel_manager: ExcelManager):
-        self.excel_manager = excel_manager
-        self.umbral_alerta = 0.2  # 20% below minimum to alert
+    POLL_MS = 200
 
-    def actualizar_inventario(self):
-        """Updates the 'Control de Inventarios' sheet based on income and outcome."""
+    def __init__(self, parent, save_worker: SaveWorker):
+        self.save_worker = save_worker
+        self.label = tk.Label(parent, text="💾 Sin cambios pendientes", font=('Helvetica', 9), fg="#455A64")
+        self.label.pack(pady=(5, 0))
+        self.label.after(self.POLL_MS, self.poll)
+
+    def poll(self):
+        """Applies every status change queued by the writer thread since the last poll."""
+        try:
+            while True:
+                status, detail = self.save_worker.status_queue.get_nowait()
+                if status == 'pendiente':
+                    self.label.config(text="⏳ Guardando cambios...", fg="#F57C00")
+                elif status == 'guardado':
+                    self.label.config(text=f"✔ Guardado {datetime.now().strftime('%H:%M:%S')}", fg="#2E7D32")
+                elif status == 'error':
+                    self.label.config(text=f"✖ Error al guardar: {detail}", fg="#C62828")
+        except queue.Empty:
+            pass
+        self.label.after(self.POLL_MS, self.poll)
+
+# --- PanelRendimiento Class ---
+class PanelRendimiento:
+    """Diagnostics window with the latency of every timed operation (count, p50, p95,
+    max and last call), refreshed while it is open."""
+
+    REFRESH_MS = 1000
+    COLUMNS = ("Operación", "Llamadas", "p50 (ms)", "p95 (ms)", "Máx (ms)", "Última (ms)")
+
+    def __init__(self, root):
+        self.window = tk.Toplevel(root)
+        self.window.title("Rendimiento")
+        self.window.geometry("620x360")
+
+        self.tree = ttk.Treeview(self.window, columns=self.COLUMNS, show="headings")
+        for col in self.COLUMNS:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=90, anchor='e')
+        self.tree.column("Operación", width=180, anchor='w')
+        self.tree.pack(expand=True, fill='both', padx=10, pady=(10, 5))
+
+        btn_frame = tk.Frame(self.window)
+        btn_frame.pack(fill='x', padx=10, pady=(0, 10))
+        tk.Button(btn_frame, text="Reiniciar", command=self.reiniciar, padx=10).pack(side='left')
+        tk.Button(btn_frame, text="Escribir en log", command=metricas.log_resumen, padx=10).pack(side='left', padx=5)
+        tk.Label(
+            btn_frame, text="Tiempos de las últimas llamadas de cada operación",
+            font=('Helvetica', 9, 'italic'), fg="#455A64"
+        ).pack(side='right')
+
+        self.refrescar()
+
+    def refrescar(self):
+        """Redraws the table and schedules the next refresh while the window exists."""
+        if not self.window.winfo_exists():
+            return
+        self.tree.delete(*self.tree.get_children())
+        for operacion, datos in metricas.resumen().items():
+            self.tree.insert("", "end", values=(
+                operacion, datos['count'],
+                f"{datos['p50'] * 1000:.1f}", f"{datos['p95'] * 1000:.1f}",
+                f"{datos['max'] * 1000:.1f}", f"{datos['ultimo'] * 1000:.1f}"
+            ))
+        self.window.after(self.REFRESH_MS, self.refrescar)
+
+    def reiniciar(self):
+        metricas.reiniciar()
+        self.tree.delete(*self.tree.get_children())
+
+# --- AccionesInventario Class ---
+class AccionesInventario:
+    """Inventory control actions of the main window. The work is done by the GUI-free
+    Inventario (local or through the server), which logs and raises; this shows results
+    and errors in dialogs."""
+
+    def __init__(self, inventario: Inventario):
+        self.inventario = inventario
+
+    def predecir_necesidades(self, dias_historial: int = 30, metodo: str = 'promedio'):
         try:
-            wb = self.excel_manager.workbook
-            ws_control = wb['Control de inventarios']
-            ws_ingresos = wb['Ingresos de almacén']
-            ws_salidas = wb['Salidas de almacén'] # Always assume this sheet exists
-
-            # Create a dictionary to hold the aggregated stock and initial info for each part
-            inventario_temp = {} # {part_number: {'nombre': '', 'stock_actual': 0, 'min': 0, 'max': 0}}
-
-            # Aggregate stock from 'Ingresos de almacén'
-            for row in range(3, ws_ingresos.max_row + 1):
-                part = ws_ingresos.cell(row=row, column=2).value # Column B 'N° de parte'
-                if part:
-                    part = str(part).strip()
-                    nombre = ws_ingresos.cell(row=row, column=3).value or "" # Column C 'Nombre'
-                    cantidad = ws_ingresos.cell(row=row, column=7).value or 0 # Column G 'Cantidad'
-
-                    if part not in inventario_temp:
-                        inventario_temp[part] = {'nombre': nombre, 'stock_actual': 0, 'min': 0, 'max': 0}
-                    inventario_temp[part]['stock_actual'] += cantidad
-                    # Update name in case it's more complete in a later entry
-                    if nombre:
-                        inventario_temp[part]['nombre'] = nombre
-
-            # Deduct stock from 'Salidas de almacén'
-            for row in range(3, ws_salidas.max_row + 1):
-                part = ws_salidas.cell(row=row, column=2).value # Column B 'N° de parte'
-                if part:
-                    part = str(part).strip()
-                    cantidad = ws_salidas.cell(row=row, column=7).value or 0 # Column G 'Cantidad'
-                    if part in inventario_temp:
-                        inventario_temp[part]['stock_actual'] -= cantidad
-                    else:
-                        logger.warning(f"Part '{part}' found in 'Salidas' but not in 'Ingresos'. Skipping deduction for inventory control.")
-
-            # Read existing min/max values from 'Control de inventarios'
-            existing_control_data = {} # {part_number: {'min': value, 'max': value}}
-            for row in range(3, ws_control.max_row + 1):
-                part = ws_control.cell(row=row, column=1).value # Column A 'N° de parte'
-                if part:
-                    part = str(part).strip()
-                    min_val = ws_control.cell(row=row, column=4).value # Column D 'Stock mínimo'
-                    max_val = ws_control.cell(row=row, column=5).value # Column E 'Stock máximo'
-                    existing_control_data[part] = {'min': min_val or 0, 'max': max_val or 0}
-
-            # Clear existing data in 'Control de inventarios' (preserving headers)
-            # Find the last actual row by checking for data in column A
-            last_data_row = 2 # Start just after headers
-            for r in range(3, ws_control.max_row + 1):
-                if ws_control.cell(row=r, column=1).value is not None:
-                    last_data_row = r
-            # Clear from the first data row down
-            for row in range(3, last_data_row + 1):
-                for col_idx in range(1, 7): # Columns A to F
-                    ws_control.cell(row=row, column=col_idx).value = None
-
-            # Write updated data to 'Control de inventarios'
-            next_row = 3
-            for part, data in inventario_temp.items():
-                stock_actual = max(0, data['stock_actual']) # Ensure stock doesn't go below 0
-
-                # Use existing min/max if available, otherwise calculate defaults
-                stock_minimo = existing_control_data.get(part, {}).get('min', 0)
-                stock_maximo = existing_control_data.get(part, {}).get('max', 0)
-
-                # If min/max are still 0 (i.e., not set manually or found in existing data), apply defaults
-                if stock_minimo == 0 and stock_actual > 0: # Only calculate if stock exists
-                    stock_minimo = max(int(stock_actual * 0.3), 1) # 30% of current stock as minimum
-                if stock_maximo == 0 and stock_actual > 0: # Only calculate if stock exists
-                    stock_maximo = max(int(stock_actual * 2), stock_minimo + 1) # Double current stock as maximum
-
-                # If stock is 0 and no min/max exists, keep min/max at 0 to avoid large default numbers
-                if stock_actual == 0 and stock_minimo == 0:
-                    stock_minimo = 0
-                if stock_actual == 0 and stock_maximo == 0:
-                    stock_maximo = 0
-
-                estado = self.determinar_estado(stock_actual, stock_minimo, stock_maximo)
-
-                ws_control.cell(row=next_row, column=1, value=part) # A
-                ws_control.cell(row=next_row, column=2, value=data['nombre']) # B
-                ws_control.cell(row=next_row, column=3, value=stock_actual) # C
-                ws_control.cell(row=next_row, column=4, value=stock_minimo) # D
-                ws_control.cell(row=next_row, column=5, value=stock_maximo) # E
-                ws_control.cell(row=next_row, column=6, value=estado) # F
-
-                next_row += 1
-
-            self.excel_manager.save()
-            logger.info("Control de inventario updated successfully.")
+            self.inventario.predecir(dias_historial, metodo)
+            messagebox.showinfo("Predicción Completada", f"La predicción de necesidades se ha actualizado en la hoja 'Control de inventarios' (basado en {dias_historial} días de historial).")
+        except Exception as e:
+            messagebox.showerror("Error de Predicción", f"Ocurrió un error al predecir necesidades: {e}")
 
+    def actualizar_inventario(self):
+        try:
+            self.inventario.recalcular()
         except Exception as e:
-            logger.error(f"Error updating inventory: {str(e)}", exc_info=True)
             messagebox.showerror("Error de Inventario", f"Ocurrió un error al actualizar el inventario: {e}")
-            raise
-
-    def determinar_estado(self, actual: int, minimo: int, maximo: int) -> str:
-        """Determines the inventory status with advanced logic."""
-        if actual <= 0:
-            return "🔴 AGOTADO - Sin stock disponible"
-        elif actual <= minimo * (1 + self.umbral_alerta): # Below min + 20% threshold
-            return "🟠 ALERTA - Stock por debajo del mínimo"
-        elif actual <= minimo * 1.5: # 1.5 times min
-            return "🟡 ADVERTENCIA - Stock próximo al mínimo"
-        elif actual >= maximo * 0.9 and maximo > 0: # Nearing max stock, and max is set
-            return "🟢 COMPLETO - Stock máximo alcanzado"
-        else:
-            return "⚪ NORMAL - Stock dentro de rangos"
 
-    def predecir_necesidades(self, dias_historial: int = 30):
-        """Predicts inventory needs based on historical data."""
+    def mostrar_verificacion(self):
+        """Runs the consistency check and shows its result in a message box."""
         try:
-            wb = self.excel_manager.workbook
-            ws_control = wb['Control de inventarios']
-            ws_salidas = wb['Salidas de almacén']
-
-            fecha_limite = datetime.now() - timedelta(days=dias_historial)
-
-            # Group outputs by part number within the historical period
-            salidas_data = []
-            for row in range(3, ws_salidas.max_row + 1):
-                fecha_salida_raw = ws_salidas.cell(row=row, column=1).value
-                # Ensure fecha_salida is a datetime object for comparison
-                if isinstance(fecha_salida_raw, datetime):
-                    fecha_salida = fecha_salida_raw
-                elif isinstance(fecha_salida_raw, str):
-                    try:
-                        fecha_salida = datetime.strptime(fecha_salida_raw, "%Y-%m-%d")
-                    except ValueError:
-                        fecha_salida = None # Invalid date format
-                else:
-                    fecha_salida = None
-
-                if fecha_salida and fecha_salida >= fecha_limite:
-                    part = str(ws_salidas.cell(row=row, column=2).value).strip()
-                    cantidad = ws_salidas.cell(row=row, column=7).value or 0
-                    if part:
-                        salidas_data.append({'N° de parte': part, 'Cantidad': cantidad})
-
-            df_salidas_hist = pd.DataFrame(salidas_data)
-
-            if not df_salidas_hist.empty:
-                consumo_por_parte = df_salidas_hist.groupby('N° de parte')['Cantidad'].sum()
-            else:
-                consumo_por_parte = pd.Series(dtype=float)
-
-            # Update control sheet based on predictions
-            for row_idx in range(3, ws_control.max_row + 1):
-                part = ws_control.cell(row=row_idx, column=1).value
-                if part:
-                    part = str(part).strip()
-                    stock_actual = ws_control.cell(row=row_idx, column=3).value or 0 # Column C 'Stock actual'
-
-                    consumo_total = consumo_por_parte.get(part, 0)
-
-                    # Get current min/max to potentially update them
-                    current_min = ws_control.cell(row=row_idx, column=4).value or 0
-                    current_max = ws_control.cell(row=row_idx, column=5).value or 0
-
-                    if consumo_total > 0 and dias_historial > 0:
-                        consumo_diario = consumo_total / dias_historial
-                        dias_restantes = stock_actual / consumo_diario if consumo_diario > 0 else float('inf')
-
-                        suggested_min = max(int(consumo_diario * 15), 1) # Minimum for 15 days of consumption
-                        suggested_max = int(consumo_diario * 30) # Maximum for 30 days of consumption
-
-                        # Only update min/max if they are currently 0 or if the suggested value is higher
-                        if current_min == 0 or suggested_min > current_min:
-                             ws_control.cell(row=row_idx, column=4, value=suggested_min)
-                        if current_max == 0 or suggested_max > current_max:
-                             ws_control.cell(row=row_idx, column=5, value=suggested_max)
-
-                        # Update status with prediction
-                        if dias_restantes < 7:
-                            estado = f"🔴 URGENTE - Solo {int(dias_restantes)} días de stock"
-                        elif dias_restantes < 15:
-                            estado = f"🟠 ALERTA - {int(dias_restantes)} días de stock"
-                        else:
-                            estado = "🟢 SUFICIENTE"
-                        ws_control.cell(row=row_idx, column=6, value=estado) # Column F 'Estado'
-                    else:
-                         # If no consumption in history, re-evaluate status based on existing min/max
-                         # Re-read min/max after potential suggestion updates above
-                         updated_min = ws_control.cell(row=row_idx, column=4).value or 0
-                         updated_max = ws_control.cell(row=row_idx, column=5).value or 0
-                         ws_control.cell(row=row_idx, column=6, value=self.determinar_estado(stock_actual, updated_min, updated_max))
-
-
-            self.excel_manager.save()
-            logger.info(f"Prediction of needs completed for {dias_historial} days.")
-            messagebox.showinfo("Predicción Completada", f"La predicción de necesidades se ha actualizado en la hoja 'Control de inventarios' (basado en {dias_historial} días de historial).")
+            diferencias = self.inventario.verificar()
+            if not diferencias:
+                messagebox.showinfo("Verificación de Control", "La hoja 'Control de inventarios' coincide con el recálculo completo.")
+                return
+            detalle = "\n".join(
+                f"- {d['parte']} ({d['campo']}): esperado {d['esperado']}, actual {d['actual']}"
+                for d in diferencias[:20]
+            )
+            messagebox.showwarning(
+                "Verificación de Control",
+                f"Se encontraron {len(diferencias)} diferencias. Use 'Recalcular Todo' para corregirlas.\n\n{detalle}"
+            )
+        except Exception as e:
+            logger.error(f"Error in verificar_consistencia: {str(e)}", exc_info=True)
+            messagebox.showerror("Error de Verificación", f"Ocurrió un error al verificar el inventario: {e}")
 
+    def mostrar_conciliacion(self):
+        """Replays the movement ledger and shows the parts whose displayed stock differs."""
+        try:
+            resultado = self.inventario.conciliar()
+            diferencias = resultado['diferencias']
+            if not diferencias:
+                messagebox.showinfo("Conciliación de Stock", f"El stock de las {resultado['partes']} partes coincide con el registro de movimientos.")
+                return
+            detalle = "\n".join(
+                f"- {d['parte']} ({d['motivo']}): según movimientos {d['derivado']}, mostrado {d['mostrado']}"
+                for d in diferencias[:20]
+            )
+            messagebox.showwarning(
+                "Conciliación de Stock",
+                f"{len(diferencias)} de {resultado['partes']} partes no coinciden con el registro de movimientos.\n\n{detalle}"
+            )
         except Exception as e:
-            logger.error(f"Error in predecir_necesidades: {str(e)}", exc_info=True)
-            messagebox.showerror("Error de Predicción", f"Ocurrió un error al predecir necesidades: {e}")
-            raise
+            logger.error(f"Error in conciliar: {str(e)}", exc_info=True)
+            messagebox.showerror("Error de Conciliación", f"Ocurrió un error al conciliar el stock: {e}")
 
     def generar_reporte(self):
-        """Generates a complete inventory status report."""
         try:
-            wb = self.excel_manager.workbook
-            ws_control = wb['Control de inventarios']
-
-            reporte = {
-                "total_items": 0,
-                "agotados": 0,
-                "alertas": 0,
-                "advertencias": 0,
-                "sugerencias_reabastecimiento": []
-            }
-
-            for row in range(3, ws_control.max_row + 1):
-                part = ws_control.cell(row=row, column=1).value
-                if not part:
-                    continue
-
-                reporte["total_items"] += 1
-                estado = ws_control.cell(row=row, column=6).value or ""
-
-                if "AGOTADO" in estado or "URGENTE" in estado:
-                    reporte["agotados"] += 1
-                elif "ALERTA" in estado:
-                    reporte["alertas"] += 1
-                elif "ADVERTENCIA" in estado:
-                    reporte["advertencias"] += 1
-
-                stock_actual = ws_control.cell(row=row, column=3).value or 0
-                stock_minimo = ws_control.cell(row=row, column=4).value or 0
-
-                if stock_actual < stock_minimo:
-                    reporte["sugerencias_reabastecimiento"].append({
-                        "parte": part,
-                        "nombre": ws_control.cell(row=row, column=2).value,
-                        "actual": stock_actual,
-                        "minimo": stock_minimo,
-                        "cantidad_sugerida": max(stock_minimo - stock_actual + 1, 1) # Suggest to reach at least min + 1
-                    })
-
-            # Display the report in a message box or new window
-            report_str = f"""--- Reporte de Inventario ---
-Total de ítems: {reporte['total_items']}
-Ítems agotados/urgentes: {reporte['agotados']}
-Ítems en alerta: {reporte['alertas']}
-Ítems en advertencia: {reporte['advertencias']}
-
-Sugerencias de Reabastecimiento:
-"""
-            if reporte["sugerencias_reabastecimiento"]:
-                for item in reporte["sugerencias_reabastecimiento"]:
-                    report_str += (f"- N° Parte: {item['parte']}, Nombre: {item['nombre']}, "
-                                   f"Actual: {item['actual']}, Mínimo: {item['minimo']}, "
-                                   f"Sugerido: {item['cantidad_sugerida']}\n")
-            else:
-                report_str += "Ninguna sugerencia de reabastecimiento en este momento."
-
-            messagebox.showinfo("Reporte de Inventario", report_str)
-            logger.info("Inventory report generated.")
-
-            return reporte
-
+            reporte = self.inventario.reporte()
+            messagebox.showinfo("Reporte de Inventario", ControlInventarioManager.formatear_reporte(reporte))
         except Exception as e:
-            logger.error(f"Error generating report: {str(e)}", exc_info=True)
             messagebox.showerror("Error de Reporte", f"Ocurrió un error al generar el reporte: {e}")
-            raise
 
 # --- Main Application Setup ---
-def crear_pestanas(root, archivo_excel: str):
-    """Main function to create the tabs."""
+def crear_pestanas(root, archivo_excel: str, backend: str = "xlsx", inicio: Optional[float] = None,
+                   servidor: Optional[str] = None):
+    """Main function to create the tabs. The workbook loads in the background while the
+    window shows a loading state. `inicio` is the perf_counter() value at launch, used
+    to log the startup times. With `servidor` the tabs work against that inventory
+    server and the workbook is not opened here."""
+    inicio = inicio if inicio is not None else time.perf_counter()
     instructions = (
         "\nSistema de Gestión en Almacén de Equipos y Herramientas\n"
         "📌 Ingreso: Complete campos obligatorios (*) y presione 'Guardar Ingreso'\n"
         "📌 Salida: Complete campos obligatorios (*) y presione 'Guardar Salida'\n"
+        "📌 Importar: Cargue una lista CSV/xlsx de ingresos o salidas desde su pestaña\n"
         "📌 Consulta: Use los botones para visualizar ingresos, salidas e inventario\n"
     )
 
@@ -954,12 +1229,18 @@ def crear_pestanas(root, archivo_excel: str):
     tabControl.add(tabs['consulta'], text='🔍 Consulta de registros')
     tabControl.pack(expand=1, fill="both", padx=10, pady=10)
 
-    # Initialize ExcelManager and tab managers
-    excel_manager = ExcelManager(archivo_excel)
+    # Initialize the inventory (loaded in the background, or the server's) and tab managers
+    if servidor:
+        inventario = ClienteInventario(servidor)
+        storage = save_worker = None # Saved by the server
+    else:
+        inventario = Inventario(archivo_excel, backend, cargar=False)
+        storage = inventario.storage
+        save_worker = storage.start_background_writer() # Saves run off the Tk main loop (xlsx only)
+    carga = inventario.load_async()
 
-    IngresoManager(tabs['ingreso'], excel_manager)
-    SalidaManager(tabs['salida'], excel_manager)
-    consulta_manager = ConsultaManager(tabs['consulta'], excel_manager) # Keep a reference if needed later
+    formularios = [IngresoManager(tabs['ingreso'], inventario), SalidaManager(tabs['salida'], inventario)]
+    consulta_manager = ConsultaManager(tabs['consulta'], inventario) # Keep a reference if needed later
 
     # Add buttons for advanced inventory control
     advanced_btn_frame = tk.Frame(root)
@@ -968,7 +1249,40 @@ def crear_pestanas(root, archivo_excel: str):
     tk.Button(
         advanced_btn_frame,
         text="🔄 Predecir Necesidades",
-        command=lambda: ControlInventarioManager(excel_manager).predecir_necesidades(),
+        command=lambda: AccionesInventario(inventario).predecir_necesidades(),
+        bg="#00796B", # Teal
+        fg="white",
+        padx=10,
+        pady=5,
+        font=('Helvetica', 9, 'bold')
+    ).pack(side='left', padx=5)
+
+    tk.Button(
+        advanced_btn_frame,
+        text="♻️ Recalcular Todo",
+        command=lambda: AccionesInventario(inventario).actualizar_inventario(),
+        bg="#455A64", # Blue grey
+        fg="white",
+        padx=10,
+        pady=5,
+        font=('Helvetica', 9, 'bold')
+    ).pack(side='left', padx=5)
+
+    tk.Button(
+        advanced_btn_frame,
+        text="✅ Verificar Control",
+        command=lambda: AccionesInventario(inventario).mostrar_verificacion(),
+        bg="#388E3C", # Green
+        fg="white",
+        padx=10,
+        pady=5,
+        font=('Helvetica', 9, 'bold')
+    ).pack(side='left', padx=5)
+
+    tk.Button(
+        advanced_btn_frame,
+        text="🧮 Conciliar Stock",
+        command=lambda: AccionesInventario(inventario).mostrar_conciliacion(),
         bg="#00796B", # Teal
         fg="white",
         padx=10,
@@ -979,7 +1293,7 @@ def crear_pestanas(root, archivo_excel: str):
     tk.Button(
         advanced_btn_frame,
         text="📋 Generar Reporte",
-        command=lambda: ControlInventarioManager(excel_manager).generar_reporte(),
+        command=lambda: AccionesInventario(inventario).generar_reporte(),
         bg="#5D4037", # Brown
         fg="white",
         padx=10,
@@ -987,23 +1301,119 @@ def crear_pestanas(root, archivo_excel: str):
         font=('Helvetica', 9, 'bold')
     ).pack(side='left', padx=5)
 
+    tk.Button(
+        advanced_btn_frame,
+        text="📈 Rendimiento",
+        command=lambda: PanelRendimiento(root),
+        bg="#546E7A", # Blue grey
+        fg="white",
+        padx=10,
+        pady=5,
+        font=('Helvetica', 9, 'bold')
+    ).pack(side='left', padx=5)
+
+    if isinstance(storage, SQLiteManager):
+        def exportar_excel():
+            """Exports the database to a workbook with the usual three sheets."""
+            destino = filedialog.asksaveasfilename(
+                title="Exportar a Excel",
+                defaultextension=".xlsx",
+                filetypes=[("Libro de Excel", "*.xlsx")]
+            )
+            if not destino:
+                return
+            try:
+                storage.export_to_excel(destino)
+                messagebox.showinfo("Éxito", f"Datos exportados a:\n{destino}")
+            except Exception as e:
+                logger.error(f"Error exporting to Excel: {str(e)}", exc_info=True)
+                messagebox.showerror("Error", f"No se pudo exportar a Excel: {e}")
+
+        tk.Button(
+            advanced_btn_frame,
+            text="📤 Exportar a Excel",
+            command=exportar_excel,
+            bg="#1565C0", # Blue
+            fg="white",
+            padx=10,
+            pady=5,
+            font=('Helvetica', 9, 'bold')
+        ).pack(side='left', padx=5)
+
 
     # Exit button with better style
     btn_frame = tk.Frame(root)
     btn_frame.pack(pady=10)
 
+    def salir():
+        """Records pending scans and waits for pending background saves before closing the application."""
+        for formulario in formularios:
+            formulario.cerrar_modo_escaner()
+        inventario.close(timeout=60)
+        metricas.log_resumen()
+        root.quit()
+
     tk.Button(
         btn_frame,
         text="🚪 Salir",
-        command=root.quit,
+        command=salir,
         bg="#f44336",
         fg="white",
         padx=20,
         pady=5,
         font=('Helvetica', 10, 'bold')
     ).pack()
+    root.protocol("WM_DELETE_WINDOW", salir)
+
+    # Save status of the background writer
+    if save_worker is not None:
+        SaveStatusIndicator(btn_frame, save_worker)
+
+    # Loading state: the tabs are covered and the inventory actions disabled until the
+    # workbook is ready, so nothing waits on the loader from the Tk main loop
+    cargando = tk.Label(
+        tabControl,
+        text=f"⏳ Conectando con el servidor {servidor}..." if servidor else "⏳ Cargando el libro de Excel...",
+        font=('Helvetica', 12, 'italic'),
+        bg="#ECEFF1",
+        fg="#455A64"
+    )
+    cargando.place(relx=0, rely=0, relwidth=1, relheight=1)
+    botones_avanzados = advanced_btn_frame.winfo_children()
+    for boton in botones_avanzados:
+        boton.config(state='disabled')
+
+    root.after_idle(lambda: logger.info(f"Window shown {time.perf_counter() - inicio:.2f}s after launch."))
+
+    def verificar_carga():
+        """Polls the background load from the Tk main loop."""
+        if not carga.done():
+            root.after(100, verificar_carga)
+            return
+        try:
+            carga.result()
+        except Exception as e:
+            logger.error(f"Error loading the workbook: {str(e)}")
+            origen = f"conectar con el servidor {servidor}" if servidor else "cargar el libro de Excel"
+            cargando.config(text=f"❌ No se pudo {origen}", fg="#c62828")
+            messagebox.showerror("Error al Cargar", f"No se pudo {origen}: {e}")
+            return
+        cargando.destroy()
+        for boton in botones_avanzados:
+            boton.config(state='normal')
+        logger.info(f"Workbook ready {time.perf_counter() - inicio:.2f}s after launch.")
+
+    root.after(100, verificar_carga)
+
+    def registrar_metricas():
+        """Writes the operation timings to the log periodically."""
+        metricas.log_resumen()
+        root.after(METRICAS_LOG_MS, registrar_metricas)
+
+    root.after(METRICAS_LOG_MS, registrar_metricas)
 
 def main():
+    inicio = time.perf_counter()
     root = tk.Tk()
     root.title("Sistema de Gestión en Almacén de Equipos y Herramientas")
     root.geometry("1100x700")
@@ -1034,50 +1444,7 @@ def main():
     # Check if the default excel file exists, if not, create a blank one
     if not os.path.exists(default_excel_path):
         try:
-            from openpyxl import Workbook
-            wb_new = Workbook()
-            if 'Sheet' in wb_new.sheetnames:
-                del wb_new['Sheet']
-
-            ws_ingresos = wb_new.create_sheet('Ingresos de almacén')
-            ws_ingresos['A1'] = "REGISTRO DE INGRESOS EN ALMACÉN"
-            ws_ingresos['A2'] = "Fecha"
-            ws_ingresos['B2'] = "N° de parte"
-            ws_ingresos['C2'] = "Nombre"
-            ws_ingresos['D2'] = "Descripción"
-            ws_ingresos['E2'] = " "
-            ws_ingresos['F2'] = "Unidad"
-            ws_ingresos['G2'] = "Cantidad"
-            ws_ingresos['H2'] = "Almacén"
-            ws_ingresos['I2'] = "Ubicación"
-            ws_ingresos['J2'] = "Encargado"
-            ws_ingresos['K2'] = "Comentarios"
-
-            ws_salidas = wb_new.create_sheet('Salidas de almacén')
-            ws_salidas['A1'] = "REGISTRO DE SALIDAS EN ALMACÉN"
-            ws_salidas['A2'] = "Fecha"
-            ws_salidas['B2'] = "N° de parte"
-            ws_salidas['C2'] = "Nombre"
-            ws_salidas['D2'] = "Descripción"
-            ws_salidas['E2'] = " "
-            ws_salidas['F2'] = "Unidad"
-            ws_salidas['G2'] = "Cantidad"
-            ws_salidas['H2'] = "Almacén"
-            ws_salidas['I2'] = "Ubicación"
-            ws_salidas['J2'] = "Encargado"
-            ws_salidas['K2'] = "Comentarios"
-
-            ws_control = wb_new.create_sheet('Control de inventarios')
-            ws_control['A1'] = "CONTROL DE INVENTARIOS"
-            ws_control['A2'] = "N° de parte"
-            ws_control['B2'] = "Nombre"
-            ws_control['C2'] = "Stock actual"
-            ws_control['D2'] = "Stock mínimo"
-            ws_control['E2'] = "Stock máximo"
-            ws_control['F2'] = "Estado"
-
-            wb_new.save(default_excel_path)
-            logger.info(f"Created new blank Excel file at: {default_excel_path}")
+            crear_libro(default_excel_path)
             messagebox.showinfo("Archivo Excel Creado", f"Se ha creado un nuevo archivo Excel en:\n{default_excel_path}\nPor favor, configure los encabezados en las hojas 'Ingresos de almacén', 'Salidas de almacén' y 'Control de inventarios' si desea personalizarlos más allá de los valores predeterminados.")
         except Exception as e:
             logger.error(f"Error creating new Excel file: {str(e)}")
@@ -1086,7 +1453,7 @@ def main():
 
     archivo_excel = default_excel_path
 
-    crear_pestanas(root, archivo_excel)
+    crear_pestanas(root, archivo_excel, BACKEND, inicio=inicio, servidor=SERVIDOR)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -1,3 +1,7 @@
+import time
+INICIO = time.perf_counter() # Launch reference for the startup times in almacen.log
+
+import os
 import tkinter as tk
 from gui.pestanas import crear_pestanas
 
@@ -6,8 +10,12 @@ def main():
     root.title("Sistema de Gestión en Almacén de Equipos y Herramientas")
     root.geometry("1000x600")
 
+    backend = "xlsx"  # o "sqlite" para usar la base de datos junto al archivo Excel
     archivo_excel = r"C:\Users\Paulo\Documents\DOCUMENTS EPCOMM\Proyectos de automatización\P-6. Administración a Almacén de equipos\data\Sistema de Gestion en Almacén de Equipos y Herramientas.xlsx"  # Ajusta la ruta según tu archivo
-    crear_pestanas(root, archivo_excel)
+    # Inventory server ("127.0.0.1:8765", see `python -m almacen ARCHIVO servir`): with
+    # ALMACEN_SERVIDOR set, the tabs work against it and the workbook is not opened here
+    servidor = os.environ.get("ALMACEN_SERVIDOR") or None
+    crear_pestanas(root, archivo_excel, backend, inicio=INICIO, servidor=servidor)
 
     root.mainloop()
 
@@ -0,0 +1 @@
+"""Tests of the inventory, run with `python -m pytest` from the repository root."""
@@ -0,0 +1,34 @@
+import pytest
+
+from almacen import ExcelManager, Inventario
+from benchmarks.generador import generar_libro
+
+
+@pytest.fixture
+def libro(tmp_path):
+    """A synthetic workbook of 200 movements over 20 parts (see generar_libro)."""
+    return generar_libro(str(tmp_path / "inventario.xlsx"), movimientos=200, partes=20)
+
+
+@pytest.fixture
+def manager(libro):
+    manager = ExcelManager(libro, estacion="pruebas")
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def inventario(libro):
+    inventario = Inventario(libro, estacion="pruebas")
+    yield inventario
+    inventario.close()
+
+
+@pytest.fixture
+def datos():
+    """Builds the form fields of a movement, as the tabs send them."""
+    def crear(parte, cantidad, **campos):
+        return {'N° de parte': parte, 'Nombre': f"Artículo {parte}", 'Descripción': "", 'Unidad': "pza",
+                'Cantidad': cantidad, 'Almacén': "Almacén 1", 'Ubicación': "E-1", 'Encargado': "Pruebas",
+                'Comentarios': "", **campos}
+    return crear
@@ -0,0 +1,30 @@
+from almacen import backend_excel
+from almacen.almacenamiento import SHEET_CONTROL, SHEET_HEADERS, SHEET_INGRESOS, SHEET_SALIDAS
+
+HOJAS = (SHEET_INGRESOS, SHEET_SALIDAS, SHEET_CONTROL)
+
+
+def _lecturas(manager):
+    resultado = {}
+    for hoja in HOJAS:
+        columnas = [chr(ord('A') + i) for i in range(len(SHEET_HEADERS[hoja]))]
+        filas = list(range(1, manager.get_max_row(hoja) + 2))
+        resultado[hoja] = (list(manager.iter_values(hoja)),
+                           manager.column_values(hoja, columnas),
+                           manager.row_values(hoja, filas))
+    return resultado
+
+
+def test_mapa_celdas_de_openpyxl(manager):
+    # The pinned openpyxl keeps the cell map the fast readers use; a version without it
+    # makes this fail before the readers silently fall back to iter_rows
+    for hoja in HOJAS:
+        celdas = backend_excel._mapa_celdas(manager.get_sheet(hoja))
+        assert celdas is not None
+        assert celdas[(1, 1)].value == manager.get_sheet(hoja)['A1'].value
+
+
+def test_lecturas_sin_mapa_de_celdas(manager, monkeypatch):
+    rapidas = _lecturas(manager)
+    monkeypatch.setattr(backend_excel, '_mapa_celdas', lambda ws: None)
+    assert _lecturas(manager) == rapidas
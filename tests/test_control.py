@@ -0,0 +1,23 @@
+from almacen.almacenamiento import SHEET_CONTROL
+
+
+def test_verificar_consistencia(inventario, datos):
+    # The synthetic workbook leaves the status empty, which the check reports
+    assert {diferencia['campo'] for diferencia in inventario.verificar()} == {'estado'}
+    inventario.recalcular()
+    assert inventario.verificar() == []
+
+    inventario.registrar_ingreso(datos("P-0000002", 7))
+    inventario.registrar_salida(datos("P-0000002", 3))
+    assert inventario.verificar() == []
+
+    em = inventario.storage
+    fila = em.find_part(SHEET_CONTROL, "P-0000002")
+    esperado = em.get_cell_value(SHEET_CONTROL, fila, 'C')
+    with em.transaction():
+        em.update_cell(SHEET_CONTROL, fila, 'C', esperado + 10)
+    assert inventario.verificar() == [
+        {'parte': "P-0000002", 'campo': 'stock_actual', 'esperado': esperado, 'actual': esperado + 10}]
+
+    inventario.recalcular()
+    assert inventario.verificar() == []
@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+from almacen.almacenamiento import SHEET_INGRESOS, SHEET_SALIDAS
+from almacen.historial import HistorialStock, dia
+
+HOY = date.today()
+FECHAS = [HOY - timedelta(days=dias) for dias in (400, 300, 200, 120, 60, 30, 7, 1, 0)]
+
+
+def _stock_recalculado(storage, fecha):
+    """Stock of every part as of the end of `fecha`, adding up every movement row."""
+    limite = dia(fecha)
+    stock = {}
+    for sheet_name, signo in ((SHEET_INGRESOS, 1), (SHEET_SALIDAS, -1)):
+        for fecha_fila, parte, cantidad in storage.iter_values(sheet_name, ['A', 'B', 'G']):
+            if parte and dia(fecha_fila) <= limite:
+                stock[str(parte).strip()] = stock.get(str(parte).strip(), 0) + signo * int(cantidad)
+    return {parte: cantidad for parte, cantidad in stock.items() if cantidad}
+
+
+def _comprobar(historial, storage):
+    for fecha in FECHAS:
+        assert historial.stock_al(fecha) == _stock_recalculado(storage, fecha), fecha
+
+
+def test_stock_al(inventario):
+    historial = HistorialStock(inventario.storage, intervalo=25)
+    _comprobar(historial, inventario.storage)
+    assert len(historial.instantaneas) > 1
+    assert historial.stock_al(HOY, ["P-0000001", "NO-EXISTE"])["NO-EXISTE"] == 0
+
+
+def test_stock_al_con_movimientos_atrasados(inventario, datos, caplog):
+    historial = HistorialStock(inventario.storage, intervalo=25)
+    historial.stock_al(HOY)
+    # Rows recorded now but dated before the snapshots already cut
+    for i, dias in enumerate((250, 90, 15, 3)):
+        inventario.registrar_ingreso(datos(f"P-{i:07d}", 6, Fecha=str(HOY - timedelta(days=dias))))
+    inventario.registrar_salida(datos("P-0000001", 1, Fecha=str(HOY - timedelta(days=45))))
+    inventario.registrar_ingreso(datos("P-NUEVA", 2))
+    _comprobar(historial, inventario.storage)
+
+    # The next cut adds them to the snapshots
+    historial.revisar(hoy=HOY + timedelta(days=2))
+    assert not any(historial._tardias.values())
+    _comprobar(historial, inventario.storage)
+
+    # Saved snapshots that still match the data are reused
+    recargado = HistorialStock(inventario.storage, intervalo=25)
+    recargado.stock_al(HOY)
+    assert "no longer match" not in caplog.text
+    assert len(recargado.instantaneas) == len(historial.instantaneas)
+    _comprobar(recargado, inventario.storage)
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from almacen import ControlInventarioManager, Inventario
+from almacen.almacenamiento import SHEET_INGRESOS, SHEET_SALIDAS
+
+PARTE = "P-0000001"
+
+
+def _stock(inventario, parte):
+    return ControlInventarioManager(inventario.storage).stock_parte(parte)
+
+
+def test_registrar_lote_rechazos(inventario, datos):
+    inventario.recalcular()
+    disponible = _stock(inventario, PARTE)
+    filas = inventario.storage.get_max_row(SHEET_SALIDAS)
+    resultado = inventario.registrar_lote('salida', [
+        (2, datos(PARTE, disponible - 1)),
+        (3, datos(PARTE, 2)), # Fits the stock alone, not after row 2
+        (4, datos("NO-EXISTE", 1)),
+        (5, datos(PARTE, 0)),
+        (6, datos(PARTE, 1, Encargado="")),
+        (7, datos(PARTE, 1)),
+    ])
+
+    assert resultado['aplicados'] == 2
+    motivos = {rechazo['fila']: rechazo['motivo'] for rechazo in resultado['rechazos']}
+    assert sorted(motivos) == [3, 4, 5, 6]
+    assert motivos[3] == "Cantidad insuficiente. Disponible: 1, Solicitado: 2"
+    assert "no existe" in motivos[4]
+    assert motivos[5] == "Cantidad debe ser un número entero positivo."
+    assert motivos[6] == "El campo 'Encargado' es obligatorio."
+    assert _stock(inventario, PARTE) == 0
+    assert inventario.storage.get_max_row(SHEET_SALIDAS) == filas + 2
+    assert inventario.verificar() == []
+
+
+def test_registrar_lote_tipo_desconocido(inventario, datos):
+    with pytest.raises(ValueError):
+        inventario.registrar_lote('traspaso', [(2, datos(PARTE, 1))])
+
+
+def test_salida_sin_stock_no_cambia_nada(inventario, datos):
+    disponible = _stock(inventario, PARTE)
+    generacion = inventario.generacion
+    with pytest.raises(ValueError, match="Cantidad insuficiente"):
+        inventario.registrar_salida(datos(PARTE, disponible + 1))
+    assert _stock(inventario, PARTE) == disponible
+    assert inventario.generacion == generacion
+
+
+def test_journal_recupera_movimientos_sin_guardar(libro, datos, monkeypatch):
+    inventario = Inventario(libro, estacion="pruebas")
+    inventario.recalcular()
+    disponible = _stock(inventario, PARTE)
+    filas = inventario.storage.get_max_row(SHEET_INGRESOS)
+    # The station stops before the workbook is written: only the journal holds the movements
+    monkeypatch.setattr(inventario.storage, 'save', lambda: None)
+    inventario.registrar_ingreso(datos(PARTE, 5))
+    inventario.registrar_lote('ingreso', [(2, datos(PARTE, 3)), (3, datos("P-NUEVA", 4))])
+    assert len(inventario.storage.journal.pending(0)) == 3
+
+    recuperado = Inventario(libro, estacion="pruebas")
+    try:
+        assert recuperado.storage.get_max_row(SHEET_INGRESOS) == filas + 3
+        assert _stock(recuperado, PARTE) == disponible + 8
+        assert _stock(recuperado, "P-NUEVA") == 4
+        assert recuperado.verificar() == []
+    finally:
+        recuperado.close()
+
+    # Replayed once: the recovered movements were saved and are not applied again
+    assert not os.path.exists(recuperado.storage.journal.path)
+    reabierto = Inventario(libro, estacion="pruebas")
+    try:
+        assert reabierto.storage.get_max_row(SHEET_INGRESOS) == filas + 3
+        assert _stock(reabierto, PARTE) == disponible + 8
+    finally:
+        reabierto.close()